@@ -0,0 +1,86 @@
+from contextlib import contextmanager
+from functools import lru_cache
+from io import StringIO
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import DateField
+
+# Characters escaped in the text format of COPY
+COPY_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+
+def copy_supported():
+    return connection.vendor == 'postgresql' and getattr(settings, 'BULK_LOAD_COPY', True)
+
+
+@contextmanager
+def bulk_loader(model, fields, unique_fields, update_fields):
+    # Yields load(rows), rows being tuples of fields values. Later rows win over earlier ones with the same unique
+    # fields. On PostgreSQL rows are streamed into a temporary table with COPY and merged in one INSERT ... ON CONFLICT
+    # when the block exits, other databases write each call with bulk_create
+    model_fields = [model._meta.get_field(name) for name in fields]
+
+    # No savepoint, a rollback requested by the caller inside the block must reach the enclosing transaction
+    with transaction.atomic(savepoint=False):
+        if not copy_supported():
+            def load(rows):
+                model.objects.bulk_create(
+                    [model(**{field.attname: value for field, value in zip(model_fields, row)}) for row in rows],
+                    update_conflicts=True,
+                    unique_fields=unique_fields,
+                    update_fields=update_fields,
+                )
+
+            yield load
+            return
+
+        quote_name = connection.ops.quote_name
+        table = quote_name(model._meta.db_table)
+        temp_table = quote_name('bulk_' + model._meta.db_table)
+        columns = ', '.join(quote_name(field.column) for field in model_fields)
+        converters = [copy_converter(field) for field in model_fields]
+
+        with connection.cursor() as cursor:
+            # Only the loaded columns, without the NOT NULL constraints CREATE TABLE LIKE would copy.
+            # seq keeps the upload order so duplicates resolve the same way as separate statements
+            cursor.execute('CREATE TEMPORARY TABLE {} AS SELECT {} FROM {} WITH NO DATA'.format(
+                temp_table, columns, table))
+            cursor.execute('ALTER TABLE {} ADD COLUMN seq bigint GENERATED ALWAYS AS IDENTITY'.format(temp_table))
+
+            def load(rows):
+                buffer = StringIO()
+                buffer.writelines('\t'.join([convert(value) for convert, value in zip(converters, row)]) + '\n'
+                                  for row in rows)
+                buffer.seek(0)
+                cursor.copy_expert('COPY {} ({}) FROM STDIN'.format(temp_table, columns), buffer)
+
+            yield load
+
+            # Nothing to merge when the caller is rolling back, the rollback also drops the temporary table
+            if not transaction.get_rollback():
+                keys = ', '.join(quote_name(model._meta.get_field(name).column) for name in unique_fields)
+                cursor.execute(
+                    'INSERT INTO {table} ({columns}) SELECT DISTINCT ON ({keys}) {columns} FROM {temp_table} '
+                    'ORDER BY {keys}, seq DESC ON CONFLICT ({keys}) DO UPDATE SET {updates}'.format(
+                        table=table, columns=columns, keys=keys, temp_table=temp_table,
+                        updates=', '.join('{0} = EXCLUDED.{0}'.format(
+                            quote_name(model._meta.get_field(name).column)) for name in update_fields)))
+                cursor.execute('DROP TABLE {}'.format(temp_table))
+
+
+# **************************************************************************************************** HELPER FUNCTIONS
+
+def copy_converter(field):
+    # value -> COPY text of one column. Dates and times go through the field like ORM writes do, naive times are
+    # read in TIME_ZONE, and are memoized since uploads repeat the same few
+    def convert(value):
+        if value is None:
+            return '\\N'
+        if isinstance(value, str):
+            return value.translate(COPY_ESCAPES)
+        return str(value)
+
+    if isinstance(field, DateField):
+        return lru_cache(maxsize=4096)(lambda value: convert(field.get_db_prep_value(value, connection)))
+    return convert
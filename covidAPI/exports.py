@@ -0,0 +1,49 @@
+import msgpack
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from django.http import HttpResponse
+
+# Binary formats of GET responses and their content types
+TABLE_FORMATS = {
+    'parquet': 'application/vnd.apache.parquet',
+    'arrow': 'application/vnd.apache.arrow.stream',
+    'msgpack': 'application/msgpack',
+}
+
+
+def table_response(format, table):
+    # table is a pyarrow Table, msgpack sends it as a map of column name to array of values
+    if format == 'msgpack':
+        body = msgpack.packb({name: msgpack_column(column) for name, column in zip(table.column_names, table.columns)})
+    else:
+        sink = pa.BufferOutputStream()
+        if format == 'parquet':
+            pq.write_table(table, sink)
+        else:
+            with pa.ipc.new_stream(sink, table.schema) as writer:
+                writer.write_table(table)
+        body = sink.getvalue().to_pybytes()
+    return HttpResponse(body, content_type=TABLE_FORMATS[format])
+
+
+def dictionary_column(indices, values):
+    # Strings repeated on many rows, each stored once and referenced by its index in values
+    return pa.DictionaryArray.from_arrays(pa.array(indices, type=pa.int32()), pa.array(values, type=pa.string()))
+
+
+# **************************************************************************************************** HELPER FUNCTIONS
+
+def msgpack_column(column):
+    # msgpack has no date types, dates and times are sent as the same text as the JSON formats. Values go through
+    # numpy, to_pylist builds a Python scalar per value and is several times slower
+    column = column.combine_chunks()
+    if pa.types.is_dictionary(column.type):
+        return column.dictionary.to_numpy(zero_copy_only=False)[column.indices.to_numpy(zero_copy_only=False)].tolist()
+    if pa.types.is_date(column.type):
+        column = pc.strftime(column, format='%Y-%m-%d')
+    elif pa.types.is_timestamp(column.type):
+        column = pc.strftime(column, format='%Y-%m-%d %H:%M:%S')
+    if column.null_count:
+        return column.to_pylist()
+    return column.to_numpy(zero_copy_only=False).tolist()
@@ -0,0 +1,114 @@
+import gzip
+import re
+import zlib
+from itertools import chain
+
+import zstandard
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+# Encodings in order of preference when a client accepts several with the same weight
+ENCODINGS = ['zstd', 'gzip']
+
+# Content types already compressed, compressing them again costs time and saves nothing
+COMPRESSED_CONTENT_TYPES = {'application/vnd.apache.parquet'}
+
+ACCEPT_ENCODING_ITEM = re.compile(r'^\s*([^\s;]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?\s*$')
+
+
+class CompressionMiddleware:
+    # Compresses responses with zstd or gzip according to Accept-Encoding. Bodies under COMPRESSION_MIN_SIZE are
+    # sent as they are, streamed bodies are compressed chunk by chunk as they are sent once their first chunks reach
+    # it
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        if response.has_header('Content-Encoding'):
+            return response
+        if response.get('Content-Type', '').split(';')[0].strip() in COMPRESSED_CONTENT_TYPES:
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        encoding = accepted_encoding(request.headers.get('Accept-Encoding', ''))
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            # The headers are sent before the body, its first chunks are read to know if it reaches the threshold
+            chunks = iter(response.streaming_content)
+            head, complete = read_ahead(chunks, settings.COMPRESSION_MIN_SIZE)
+            if complete:
+                response.streaming_content = head
+                return response
+            response.streaming_content = compress_sequence(encoding, chain(head, chunks))
+            del response['Content-Length']
+        else:
+            if len(response.content) < settings.COMPRESSION_MIN_SIZE:
+                return response
+            content = compress(encoding, response.content)
+            if len(content) >= len(response.content):
+                return response
+            response.content = content
+            response['Content-Length'] = str(len(content))
+
+        # The compressed body is a different representation, same as django.middleware.gzip
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = encoding
+        return response
+
+
+# **************************************************************************************************** HELPER FUNCTIONS
+
+def accepted_encoding(accept_encoding):
+    # Preferred supported encoding of an Accept-Encoding header, None if the client accepts none of them
+    weights = {}
+    for item in accept_encoding.split(','):
+        match = ACCEPT_ENCODING_ITEM.match(item)
+        if match is None:
+            continue
+        try:
+            weights[match[1].lower()] = float(match[2]) if match[2] is not None else 1.0
+        except ValueError:
+            continue
+
+    candidates = [(weights.get(encoding, weights.get('*', 0.0)), -index, encoding)
+                  for index, encoding in enumerate(ENCODINGS)]
+    weight, _, encoding = max(candidates)
+    return encoding if weight > 0 else None
+
+
+def read_ahead(chunks, size):
+    # (head, complete) of the chunks read from chunks until they hold size bytes, complete if it ended before
+    head = []
+    length = 0
+    for chunk in chunks:
+        head.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            return head, False
+    return head, True
+
+
+def compress(encoding, content):
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor(level=settings.COMPRESSION_ZSTD_LEVEL).compress(content)
+    return gzip.compress(content, compresslevel=settings.COMPRESSION_GZIP_LEVEL, mtime=0)
+
+
+def compress_sequence(encoding, chunks):
+    if encoding == 'zstd':
+        compressor = zstandard.ZstdCompressor(level=settings.COMPRESSION_ZSTD_LEVEL).compressobj()
+    else:
+        # wbits 31 writes the gzip header and trailer around the deflate stream
+        compressor = zlib.compressobj(settings.COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,69 @@
+import base64
+import binascii
+
+import orjson
+from django.core.exceptions import ValidationError
+from django.db.models import F, Field, Func, Value
+from django.db.models.lookups import GreaterThan, LessThanOrEqual
+
+# Largest page a client can ask for
+MAX_PAGE_LIMIT = 10000
+
+# Response header carrying the cursor of the next page, absent on the last page
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
+
+class Row(Func):
+    # Row value compared column by column, (a, b) > (x, y) is answered by a range scan of an index on (a, b)
+    function = 'ROW'
+    output_field = Field()
+
+
+def parse_limit(value):
+    # Page size of the limit parameter, None if invalid
+    try:
+        limit = int(value)
+    except ValueError:
+        return None
+    if limit < 1 or limit > MAX_PAGE_LIMIT:
+        return None
+    return limit
+
+
+def decode_cursor(cursor, model, keys):
+    # Values of keys from a cursor sent back by a client, None if it was not issued for these keys
+    try:
+        values = orjson.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (UnicodeEncodeError, binascii.Error, orjson.JSONDecodeError):
+        return None
+    if not isinstance(values, list) or len(values) != len(keys):
+        return None
+    try:
+        return [model._meta.get_field(key).to_python(value) for key, value in zip(keys, values)]
+    except ValidationError:
+        return None
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(orjson.dumps(list(values))).decode('ascii')
+
+
+def paginate(queryset, keys, limit, after=None):
+    # (page, keys values of its last row or None on the last page), the page being queryset narrowed to the limit
+    # rows following after in keys order. keys must be unique within queryset. Both ends are seeks on an index over
+    # keys, a deep page costs the same as the first
+    model = queryset.model
+    key = Row(*[F(name) for name in keys])
+
+    def bound(values):
+        return Row(*[Value(value, output_field=model._meta.get_field(name)) for name, value in zip(keys, values)])
+
+    queryset = queryset.order_by(*keys)
+    if after is not None:
+        queryset = queryset.filter(GreaterThan(key, bound(after)))
+
+    # The last row of the page and the first of the next one
+    edge = list(queryset.values_list(*keys)[limit - 1:limit + 1])
+    if len(edge) < 2:
+        return queryset, None
+    return queryset.filter(LessThanOrEqual(key, bound(edge[0]))), edge[0]
@@ -33,6 +33,8 @@ ALLOWED_HOSTS = []
 INSTALLED_APPS = [
     'time_series.apps.TimeSeriesConfig',
     'daily_reports.apps.DailyReportsConfig',
+    'jobs.apps.JobsConfig',
+    'datasets.apps.DatasetsConfig',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -43,6 +45,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'covidAPI.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -130,8 +133,59 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Caches
+# https://docs.djangoproject.com/en/4.0/topics/cache/
+
+# GET responses are cached per process and evicted least recently used first, entries are keyed on dataset versions.
+# A process holds at most RESPONSE_CACHE_MAX_SIZE of cached responses, plus up to RESPONSE_CACHE_MAX_ENTRY_SIZE per
+# streamed response being collected
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'responses': {
+        'BACKEND': 'datasets.cache.ResponseCache',
+        'LOCATION': 'responses',
+        'TIMEOUT': None,
+        'OPTIONS': {
+            'MAX_ENTRIES': 256,
+        },
+    },
+}
+
+RESPONSE_CACHE = 'responses'
+RESPONSE_CACHE_MAX_ENTRY_SIZE = 4 * 1024 * 1024
+RESPONSE_CACHE_MAX_SIZE = 64 * 1024 * 1024
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.0/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 django_heroku.settings(locals())
+
+# Asynchronous uploads
+# Job progress is written through a second connection to the same database so it is visible mid-upload
+DATABASES['jobs'] = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
+JOBS_MAX_WORKERS = 2
+# Queued jobs only live in the process that accepted them, which refreshes their heartbeat every
+# JOBS_HEARTBEAT_INTERVAL seconds. Jobs not refreshed for JOBS_HEARTBEAT_TIMEOUT seconds were lost to a restart and
+# are failed
+JOBS_HEARTBEAT_INTERVAL = 30
+JOBS_HEARTBEAT_TIMEOUT = 120
+
+# Time series case storage, 'rows' keeps one TimeSeriesData row per date and 'array' one packed TimeSeriesArray
+# row per series. Existing data is moved between layouts with manage.py convert_timeseries_storage
+TIME_SERIES_STORAGE = 'rows'
+
+# Uploads are copied into a temporary table and merged in one statement on PostgreSQL, False writes each batch with
+# bulk_create as on other databases
+BULK_LOAD_COPY = True
+
+# Responses are compressed with zstd or gzip when the client accepts it, bodies smaller than COMPRESSION_MIN_SIZE
+# bytes are sent as they are. Levels trade CPU for size, 1-22 for zstd and 1-9 for gzip
+COMPRESSION_MIN_SIZE = 1024
+COMPRESSION_ZSTD_LEVEL = 3
+COMPRESSION_GZIP_LEVEL = 6
+
+# DELETE marks the dataset as deleted and purges its rows in the background instead of deleting them in the request
+SOFT_DELETE = False
@@ -0,0 +1,170 @@
+import codecs
+import csv
+import zlib
+
+import zstandard
+
+# Bytes read from the request stream at a time
+CHUNK_SIZE = 64 * 1024
+
+# Compressed bytes given to the zstd decompressor at a time. A 4 byte block can expand to 128 KiB, so one slice
+# decompresses to at most about 4 MiB
+ZSTD_SLICE_SIZE = 128
+
+
+def iter_lines(stream, chunk_size=CHUNK_SIZE):
+    # Decoding incrementally so multi-byte characters split across chunks are handled
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    pending = ''
+
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        pending += decoder.decode(chunk)
+        lines = pending.split('\n')
+        pending = lines.pop()
+        for line in lines:
+            # Keeping the newline lets csv.reader join quoted fields spanning lines
+            yield line + '\n'
+
+    pending += decoder.decode(b'', final=True)
+    if pending:
+        yield pending
+
+
+def csv_reader(stream, chunk_size=CHUNK_SIZE):
+    return csv.reader(iter_lines(stream, chunk_size), delimiter=',')
+
+
+class CorruptUpload(Exception):
+    # Raised while reading a compressed body that cannot be decompressed
+    pass
+
+
+class Decompressed:
+    # File-like object decompressing stream as it is read. Concatenated gzip members and zstd frames each get a new
+    # decompressor, a body ending inside one raises CorruptUpload instead of reading as a shorter upload. Each fill
+    # decompresses about CHUNK_SIZE bytes, a small body expanding to gigabytes is read in pieces like any other
+    def __init__(self, stream, decompressor, errors):
+        self.stream = stream
+        self.decompressor = decompressor
+        self.errors = errors
+        self.current = None
+        self.pending = b''
+        self.buffer = bytearray()
+        self.finished = False
+
+    def read(self, size=-1):
+        while not self.finished and (size < 0 or len(self.buffer) < size):
+            self.fill()
+        if size < 0:
+            size = len(self.buffer)
+        # Deleting from the front of a bytearray does not copy the rest
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+
+    def fill(self):
+        # Input held back by the output limit goes first, bytes left over after the end of a member are the start of
+        # the next one
+        if self.current is not None and self.current.unconsumed_tail:
+            data = self.current.unconsumed_tail
+        else:
+            data = self.pending or self.stream.read(CHUNK_SIZE)
+            self.pending = b''
+
+        try:
+            if not data:
+                # Output the limit held back after the last input, the member must end with it
+                if self.current is not None and not self.current.eof:
+                    self.buffer += self.current.flush()
+                    if not self.current.eof:
+                        raise CorruptUpload('Compressed body ended before the end of the stream')
+                self.finished = True
+                return
+
+            if self.current is None or self.current.eof:
+                self.current = self.decompressor()
+            self.buffer += self.current.decompress(data, CHUNK_SIZE)
+        except self.errors as error:
+            raise CorruptUpload(str(error)) from error
+        if self.current.eof:
+            self.pending = self.current.unused_data
+
+
+class ZstdDecompressobj:
+    # zstd counterpart of zlib.decompressobj with an output limit, which zstandard does not have. The input is fed in
+    # slices of ZSTD_SLICE_SIZE bytes, one slice completes a few blocks of at most 128 KiB each
+    def __init__(self):
+        self.decompressobj = zstandard.ZstdDecompressor().decompressobj()
+        self.unconsumed_tail = b''
+        self.unused_data = b''
+
+    @property
+    def eof(self):
+        return self.decompressobj.eof
+
+    def decompress(self, data, max_length):
+        output = bytearray()
+        offset = 0
+        while offset < len(data) and len(output) < max_length and not self.eof:
+            output += self.decompressobj.decompress(data[offset:offset + ZSTD_SLICE_SIZE])
+            offset += ZSTD_SLICE_SIZE
+
+        if self.eof:
+            self.unconsumed_tail = b''
+            self.unused_data = self.decompressobj.unused_data + data[offset:]
+        else:
+            self.unconsumed_tail = data[offset:]
+        return bytes(output)
+
+    def flush(self):
+        # Every complete block has been returned by decompress
+        return b''
+
+
+def decompressed(stream, content_encoding):
+    # stream without the Content-Encoding of the upload, decompressed as it is read. None if the encoding is not
+    # supported
+    content_encoding = (content_encoding or 'identity').strip().lower()
+    if content_encoding == 'identity':
+        return stream
+    if content_encoding in ('gzip', 'x-gzip'):
+        # wbits 31 expects the gzip header and trailer around the deflate stream
+        return Decompressed(stream, lambda: zlib.decompressobj(31), zlib.error)
+    if content_encoding == 'zstd':
+        return Decompressed(stream, ZstdDecompressobj, zstandard.ZstdError)
+    return None
+
+
+def batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class Echo:
+    # File-like object for csv.writer that hands each row back instead of storing it
+    def write(self, value):
+        return value
+
+
+def buffered(fragments, size=CHUNK_SIZE):
+    # Joins small string fragments into chunks of about size characters before they are sent
+    chunk = []
+    length = 0
+    for fragment in fragments:
+        chunk.append(fragment)
+        length += len(fragment)
+        if length >= size:
+            yield ''.join(chunk)
+            chunk = []
+            length = 0
+    if chunk:
+        yield ''.join(chunk)
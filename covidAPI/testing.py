@@ -0,0 +1,78 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+# Upload bodies shared by the tests of several apps
+TIMESERIES_BODY = """Province/State,Country/Region,Lat,Long,1/22/20,1/23/20
+                  ,Afghanistan,33.93911,67.709953,0,0
+                  Australian Capital Territory,Australia,-35.4735,149.0124,0,0"""
+
+DAILYREPORTS_BODY = """FIPS,Admin2,Province_State,Country_Region,Last_Update,Lat,Long_,Confirmed,Deaths,Recovered,Active,Combined_Key,Incidence_Rate,Case-Fatality_Ratio
+                45001,Abbeville,South Carolina,US,2020-06-06 02:33:00,34.22333378,-82.46170658,47,0,0,47,"Abbeville, South Carolina, US",191.625555510254,0"""
+
+
+def plan_node_types(plan):
+    node_types = [plan['Node Type']]
+    for subplan in plan.get('Plans', []):
+        node_types += plan_node_types(subplan)
+    return node_types
+
+
+def explained_sql(sql):
+    # Streamed querysets run through a server-side cursor, the statement to explain follows FOR
+    if sql.startswith('DECLARE'):
+        return sql[sql.index(' FOR ') + len(' FOR '):]
+    return sql
+
+
+def plan_relations(plan):
+    relations = [plan['Relation Name']] if 'Relation Name' in plan else []
+    for subplan in plan.get('Plans', []):
+        relations += plan_relations(subplan)
+    return relations
+
+
+class QueryPlanMixin:
+    # Statements whose plans are checked, inserts and savepoints have nothing to scan
+    EXPLAINED_STATEMENTS = ('SELECT', 'UPDATE', 'DELETE')
+
+    def assertNoSeqScan(self, request):
+        # Runs request() and fails if any statement it issued cannot be answered from an index
+        if connection.vendor != 'postgresql':
+            self.skipTest('Query plans are only checked on PostgreSQL')
+
+        with CaptureQueriesContext(connection) as context:
+            request()
+
+        with connection.cursor() as cursor:
+            # Tiny test tables are always cheapest to scan, disabling seq scans leaves them only where no index applies
+            cursor.execute('SET enable_seqscan = off')
+            try:
+                for query in context.captured_queries:
+                    sql = explained_sql(query['sql'])
+                    if not sql.startswith(self.EXPLAINED_STATEMENTS):
+                        continue
+                    cursor.execute('EXPLAIN (FORMAT JSON) ' + sql)
+                    plan = cursor.fetchone()[0][0]['Plan']
+                    self.assertNotIn('Seq Scan', plan_node_types(plan), sql)
+            finally:
+                cursor.execute('RESET enable_seqscan')
+
+    def assertPrunedTo(self, request, table, partition):
+        # Runs request() and fails if a statement reading table would read any partition other than partition
+        if connection.vendor != 'postgresql':
+            self.skipTest('Partitions only exist on PostgreSQL')
+
+        with CaptureQueriesContext(connection) as context:
+            request()
+
+        checked = 0
+        with connection.cursor() as cursor:
+            for query in context.captured_queries:
+                sql = explained_sql(query['sql'])
+                if not sql.startswith('SELECT') or '"{}"'.format(table) not in sql:
+                    continue
+                cursor.execute('EXPLAIN (FORMAT JSON) ' + sql)
+                relations = plan_relations(cursor.fetchone()[0][0]['Plan'])
+                self.assertEqual({relation for relation in relations if relation.startswith(table)}, {partition}, sql)
+                checked += 1
+        self.assertTrue(checked, 'request() did not read {}'.format(table))
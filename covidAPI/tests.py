@@ -0,0 +1,181 @@
+import gzip
+import tracemalloc
+import zlib
+from datetime import datetime, timezone
+from io import BytesIO
+from unittest import mock
+
+import zstandard
+
+from django.db import transaction
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+
+from datasets.models import Dataset
+from .bulk import bulk_loader
+from .middleware import CompressionMiddleware, accepted_encoding
+from .pagination import decode_cursor, encode_cursor, paginate, parse_limit
+from .streaming import CorruptUpload, batched, csv_reader, decompressed, iter_lines
+
+
+class StreamingHelpers(SimpleTestCase):
+
+    def test_iter_lines_chunk_boundaries(self):
+        # multi-byte characters and lines split across 3 byte chunks
+        stream = BytesIO('Québec,Canada\nÎle,France\n'.encode('utf-8'))
+        self.assertEqual(list(iter_lines(stream, chunk_size=3)), ['Québec,Canada\n', 'Île,France\n'])
+
+    def test_iter_lines_no_trailing_newline(self):
+        stream = BytesIO(b'a,b\nc,d')
+        self.assertEqual(list(iter_lines(stream)), ['a,b\n', 'c,d'])
+
+    def test_csv_reader_quoted_newline(self):
+        stream = BytesIO(b'a,"b\nc"\nd,e')
+        self.assertEqual(list(csv_reader(stream, chunk_size=2)), [['a', 'b\nc'], ['d', 'e']])
+
+    def test_batched(self):
+        self.assertEqual(list(batched(range(5), 2)), [[0, 1], [2, 3], [4]])
+        self.assertEqual(list(batched([], 2)), [])
+
+
+class Compression(SimpleTestCase):
+
+    def test_decompressed_gzip_members(self):
+        body = gzip.compress(b'a,b\n') + gzip.compress(b'c,d\n')
+        self.assertEqual(list(csv_reader(decompressed(BytesIO(body), 'gzip'), chunk_size=3)), [['a', 'b'], ['c', 'd']])
+
+    def test_decompressed_invalid(self):
+        self.assertIsNone(decompressed(BytesIO(b''), 'br'))
+        for body in [b'not gzip', gzip.compress(b'a,b\n' * 100)[:-8]]:
+            with self.assertRaises(CorruptUpload):
+                decompressed(BytesIO(body), 'gzip').read()
+        with self.assertRaises(CorruptUpload):
+            decompressed(BytesIO(zstandard.ZstdCompressor().compress(b'a,b\n' * 100)[:-4]), 'zstd').read()
+
+    def test_decompressed_bounded(self):
+        # bodies of a few KB expanding to 256 MiB are read without holding more than a few chunks
+        zstd = zstandard.ZstdCompressor().compressobj()
+        deflate = zlib.compressobj(9, zlib.DEFLATED, 31)
+        bodies = {
+            'zstd': b''.join(zstd.compress(bytes(1 << 20)) for _ in range(256)) + zstd.flush(),
+            'gzip': b''.join(deflate.compress(bytes(1 << 20)) for _ in range(256)) + deflate.flush(),
+        }
+        for encoding, body in bodies.items():
+            tracemalloc.start()
+            try:
+                stream = decompressed(BytesIO(body), encoding)
+                size = 0
+                while True:
+                    chunk = stream.read(64 * 1024)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+            self.assertEqual(size, 256 << 20, encoding)
+            self.assertLess(peak, 16 << 20, encoding)
+
+    def test_accepted_encoding(self):
+        self.assertEqual(accepted_encoding('gzip, deflate, br, zstd'), 'zstd')
+        self.assertEqual(accepted_encoding('gzip;q=1.0, zstd;q=0.5'), 'gzip')
+        self.assertEqual(accepted_encoding('*'), 'zstd')
+        self.assertEqual(accepted_encoding('*, zstd;q=0'), 'gzip')
+        self.assertIsNone(accepted_encoding(''))
+        self.assertIsNone(accepted_encoding('br, gzip;q=0'))
+
+    @override_settings(COMPRESSION_MIN_SIZE=100)
+    def test_middleware_threshold(self):
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip')
+        small = CompressionMiddleware(lambda request: HttpResponse(b'a' * 99))(request)
+        self.assertFalse(small.has_header('Content-Encoding'))
+        self.assertEqual(small['Vary'], 'Accept-Encoding')
+
+        large = CompressionMiddleware(lambda request: HttpResponse(b'a' * 100, headers={'ETag': '"1"'}))(request)
+        self.assertEqual(large['Content-Encoding'], 'gzip')
+        self.assertEqual(large['ETag'], 'W/"1"')
+        self.assertEqual(gzip.decompress(large.content), b'a' * 100)
+
+    @override_settings(COMPRESSION_MIN_SIZE=100)
+    def test_middleware_threshold_streaming(self):
+        # streamed bodies are measured on their first chunks, and sent whole either way
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip')
+        small = CompressionMiddleware(lambda request: StreamingHttpResponse([b'a' * 50, b'a' * 49]))(request)
+        self.assertFalse(small.has_header('Content-Encoding'))
+        self.assertEqual(small['Vary'], 'Accept-Encoding')
+        self.assertEqual(small.getvalue(), b'a' * 99)
+
+        empty = CompressionMiddleware(lambda request: StreamingHttpResponse([]))(request)
+        self.assertFalse(empty.has_header('Content-Encoding'))
+        self.assertEqual(empty.getvalue(), b'')
+
+        large = CompressionMiddleware(lambda request: StreamingHttpResponse([b'a' * 60] * 3))(request)
+        self.assertEqual(large['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(large.getvalue()), b'a' * 180)
+
+    def test_middleware_skips_compressed_types(self):
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip')
+        response = CompressionMiddleware(lambda request: StreamingHttpResponse(
+            [b'PAR1'] * 1000, content_type='application/vnd.apache.parquet'))(request)
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+
+class PaginationHelpers(TestCase):
+
+    def test_cursor_round_trip(self):
+        values = [datetime(2020, 6, 6, 2, 33, tzinfo=timezone.utc), 7]
+        self.assertEqual(decode_cursor(encode_cursor(values), Dataset, ['last_modified', 'id']), values)
+
+    def test_cursor_invalid(self):
+        for cursor in ['', '!!', 'é', encode_cursor([1]), encode_cursor(['not a date', 1]), encode_cursor({'id': 1})]:
+            self.assertIsNone(decode_cursor(cursor, Dataset, ['last_modified', 'id']), cursor)
+
+    def test_parse_limit(self):
+        self.assertEqual(parse_limit('10'), 10)
+        self.assertEqual([parse_limit(value) for value in ['0', '10001', '1.5', '']], [None] * 4)
+
+    def test_paginate(self):
+        names = ['d{}'.format(index) for index in range(5)]
+        Dataset.objects.bulk_create([Dataset(kind=Dataset.KindChoice.TIME_SERIES, name=name) for name in names])
+
+        pages = []
+        after = None
+        while True:
+            page, after = paginate(Dataset.objects.all(), ['name'], 2, after)
+            pages.append(list(page.values_list('name', flat=True)))
+            if after is None:
+                break
+        self.assertEqual(pages, [['d0', 'd1'], ['d2', 'd3'], ['d4']])
+
+
+class BulkLoader(TestCase):
+    modified = datetime(2020, 1, 22, tzinfo=timezone.utc)
+
+    def load(self, *batches):
+        with bulk_loader(Dataset, ['kind', 'name', 'version', 'last_modified'],
+                         unique_fields=['kind', 'name'], update_fields=['version']) as load:
+            for batch in batches:
+                load(batch)
+
+    def test_later_rows_win(self):
+        # within a batch, across batches and over stored rows, names that need escaping in COPY are kept as is
+        Dataset.objects.create(kind='T', name='a', version=1)
+        self.load([('T', 'a', 2, self.modified), ('T', 'tab\tnew\nline\\', 3, self.modified),
+                   ('T', 'a', 4, self.modified)],
+                  [('T', 'tab\tnew\nline\\', 5, self.modified), ('D', 'a', 6, self.modified)])
+        self.assertEqual(dict(Dataset.objects.values_list('name', 'version').filter(kind='T')),
+                         {'a': 4, 'tab\tnew\nline\\': 5})
+        self.assertEqual(Dataset.objects.get(kind='D').version, 6)
+
+    def test_orm_fallback(self):
+        with mock.patch('covidAPI.bulk.copy_supported', return_value=False):
+            self.load([('T', 'a', 2, self.modified)], [('T', 'a', 3, self.modified)])
+        self.assertEqual(Dataset.objects.get().version, 3)
+
+    def test_rollback(self):
+        with transaction.atomic():
+            with bulk_loader(Dataset, ['kind', 'name', 'version', 'last_modified'],
+                             unique_fields=['kind', 'name'], update_fields=['version']) as load:
+                load([('T', 'a', 2, self.modified)])
+                transaction.set_rollback(True)
+        self.assertEqual(Dataset.objects.count(), 0)
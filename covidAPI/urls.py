@@ -19,5 +19,7 @@ from django.urls import include, path
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('time_series/', include('time_series.urls')),
-    path('daily_reports/', include('daily_reports.urls'))
+    path('daily_reports/', include('daily_reports.urls')),
+    path('jobs/', include('jobs.urls')),
+    path('datasets/', include('datasets.urls')),
 ]
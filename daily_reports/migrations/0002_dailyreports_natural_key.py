@@ -0,0 +1,28 @@
+# Generated by Django 4.1.13 on 2026-10-18 09:17
+
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def remove_duplicates(apps, schema_editor):
+    # Keeping the lowest id per key, it is the row earlier uploads updated
+    DailyReports = apps.get_model('daily_reports', 'DailyReports')
+    keep = DailyReports.objects.values(
+        'dailyreport_name', 'admin2', 'province_state', 'country_region', 'last_update'
+    ).annotate(keep_id=Min('id')).values('keep_id')
+    DailyReports.objects.exclude(id__in=keep).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('daily_reports', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='dailyreports',
+            constraint=models.UniqueConstraint(fields=('dailyreport_name', 'admin2', 'province_state', 'country_region', 'last_update'), name='dailyreports_natural_key'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.1.13 on 2026-10-18 09:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('daily_reports', '0002_dailyreports_natural_key'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='dailyreports',
+            index=models.Index(fields=['dailyreport_name', 'last_update'], name='dailyreports_name_update'),
+        ),
+        migrations.AddIndex(
+            model_name='dailyreports',
+            index=models.Index(fields=['dailyreport_name', 'country_region', 'province_state'], name='dailyreports_name_location'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def set_datasets(apps, schema_editor):
+    # Every report name becomes a dataset, rows need one to be placed in a partition
+    Dataset = apps.get_model('datasets', 'Dataset')
+    DailyReports = apps.get_model('daily_reports', 'DailyReports')
+
+    for name in DailyReports.objects.values_list('dailyreport_name', flat=True).distinct():
+        dataset, _ = Dataset.objects.get_or_create(kind='D', name=name)
+        DailyReports.objects.filter(dailyreport_name=name).update(dataset=dataset)
+
+    # Pending deferred foreign key checks would block the ALTER TABLE statements that follow
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datasets', '0002_dataset_deleted_at'),
+        ('daily_reports', '0003_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailyreports',
+            name='dataset',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, to='datasets.dataset'),
+        ),
+        migrations.RunPython(set_datasets, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='dailyreports',
+            name='dataset',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='datasets.dataset'),
+        ),
+        migrations.RemoveConstraint(
+            model_name='dailyreports',
+            name='dailyreports_natural_key',
+        ),
+        migrations.AddConstraint(
+            model_name='dailyreports',
+            constraint=models.UniqueConstraint(fields=('dataset', 'admin2', 'province_state', 'country_region', 'last_update'), name='dailyreports_dataset_natural_key'),
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations
+
+from datasets.partitions import partition_table, unpartition_table
+
+
+class Migration(migrations.Migration):
+    # List partitions DailyReports by dataset on PostgreSQL, a no-op on other databases
+
+    dependencies = [
+        ('daily_reports', '0004_dailyreports_dataset'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_table('daily_reports_dailyreports'),
+                             unpartition_table('daily_reports_dailyreports')),
+    ]
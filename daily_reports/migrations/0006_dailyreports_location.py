@@ -0,0 +1,129 @@
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+
+
+def set_locations(apps, schema_editor):
+    # Reports reference their location instead of repeating the names, the dataset already stands for the name
+    Location = apps.get_model('datasets', 'Location')
+    DailyReports = apps.get_model('daily_reports', 'DailyReports')
+
+    Location.objects.bulk_create(
+        [Location(country_region=country_region, province_state=province_state, admin2=admin2,
+                  combined_key=combined_key)
+         for country_region, province_state, admin2, combined_key in DailyReports.objects.values_list(
+            'country_region', 'province_state', 'admin2', 'combined_key').distinct()],
+        ignore_conflicts=True)
+
+    DailyReports.objects.update(location=Subquery(Location.objects.filter(
+        country_region=OuterRef('country_region'), province_state=OuterRef('province_state'),
+        admin2=OuterRef('admin2'), combined_key=OuterRef('combined_key')).values('id')[:1]))
+
+    # Pending deferred foreign key checks would block the ALTER TABLE statements that follow
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+
+def set_names(apps, schema_editor):
+    Dataset = apps.get_model('datasets', 'Dataset')
+    Location = apps.get_model('datasets', 'Location')
+    DailyReports = apps.get_model('daily_reports', 'DailyReports')
+
+    locations = Location.objects.filter(id=OuterRef('location'))
+    DailyReports.objects.update(
+        dailyreport_name=Subquery(Dataset.objects.filter(id=OuterRef('dataset')).values('name')),
+        country_region=Subquery(locations.values('country_region')),
+        province_state=Subquery(locations.values('province_state')),
+        admin2=Subquery(locations.values('admin2')),
+        combined_key=Subquery(locations.values('combined_key')))
+
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datasets', '0003_location'),
+        ('daily_reports', '0005_partition_dailyreports'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailyreports',
+            name='location',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, to='datasets.location'),
+        ),
+        # Nullable before they are removed so the migration can be reversed with rows in place
+        migrations.AlterField(
+            model_name='dailyreports',
+            name='dailyreport_name',
+            field=models.CharField(max_length=1000, null=True),
+        ),
+        migrations.AlterField(
+            model_name='dailyreports',
+            name='admin2',
+            field=models.CharField(max_length=1000, null=True),
+        ),
+        migrations.AlterField(
+            model_name='dailyreports',
+            name='province_state',
+            field=models.CharField(max_length=1000, null=True),
+        ),
+        migrations.AlterField(
+            model_name='dailyreports',
+            name='country_region',
+            field=models.CharField(max_length=1000, null=True),
+        ),
+        migrations.AlterField(
+            model_name='dailyreports',
+            name='combined_key',
+            field=models.CharField(max_length=1000, null=True),
+        ),
+        migrations.RunPython(set_locations, set_names),
+        migrations.AlterField(
+            model_name='dailyreports',
+            name='location',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, to='datasets.location'),
+        ),
+        migrations.RemoveConstraint(
+            model_name='dailyreports',
+            name='dailyreports_dataset_natural_key',
+        ),
+        migrations.RemoveIndex(
+            model_name='dailyreports',
+            name='dailyreports_name_update',
+        ),
+        migrations.RemoveIndex(
+            model_name='dailyreports',
+            name='dailyreports_name_location',
+        ),
+        migrations.AddConstraint(
+            model_name='dailyreports',
+            constraint=models.UniqueConstraint(fields=('dataset', 'location', 'last_update'), name='dailyreports_dataset_natural_key'),
+        ),
+        migrations.AddIndex(
+            model_name='dailyreports',
+            index=models.Index(fields=['dataset', 'last_update'], name='dailyreports_dataset_update'),
+        ),
+        migrations.RemoveField(
+            model_name='dailyreports',
+            name='dailyreport_name',
+        ),
+        migrations.RemoveField(
+            model_name='dailyreports',
+            name='admin2',
+        ),
+        migrations.RemoveField(
+            model_name='dailyreports',
+            name='province_state',
+        ),
+        migrations.RemoveField(
+            model_name='dailyreports',
+            name='country_region',
+        ),
+        migrations.RemoveField(
+            model_name='dailyreports',
+            name='combined_key',
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.1.13 on 2026-10-18 10:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('daily_reports', '0006_dailyreports_location'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='dailyreports',
+            name='dailyreports_dataset_update',
+        ),
+        migrations.AddIndex(
+            model_name='dailyreports',
+            index=models.Index(fields=['dataset', 'last_update', 'location'], name='dailyreports_dataset_update'),
+        ),
+    ]
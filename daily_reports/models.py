@@ -1,16 +1,18 @@
 from django.db import models
 
+from datasets.models import Dataset, Location
+
 # Create your models here.
 # FIPS,Admin2,Province_State,Country_Region,Last_Update,Lat,Long_,Confirmed,
 # Deaths,Recovered,Active,Combined_Key,Incident_Rate,Case_Fatality_Ratio
 
 
 class DailyReports(models.Model):
-    dailyreport_name = models.CharField(max_length=1000)
+    # Partition key on PostgreSQL, the dataset the report was uploaded to
+    dataset = models.ForeignKey(Dataset, on_delete=models.CASCADE, db_index=False)
     fips = models.IntegerField()
-    admin2 = models.CharField(max_length=1000)
-    province_state = models.CharField(max_length=1000)
-    country_region = models.CharField(max_length=1000)
+    # Admin2, Province_State, Country_Region and Combined_Key, indexed through dailyreports_dataset_natural_key
+    location = models.ForeignKey(Location, on_delete=models.PROTECT, db_index=False)
     last_update = models.DateTimeField()
     lat = models.FloatField()
     long = models.FloatField()
@@ -18,6 +20,17 @@ class DailyReports(models.Model):
     deaths = models.IntegerField()
     recovered = models.IntegerField()
     active = models.IntegerField()
-    combined_key = models.CharField(max_length=1000)
     incidence_rate = models.FloatField()
     case_fatality_ratio = models.FloatField()
+
+    class Meta:
+        constraints = [
+            # The location includes Admin2, county level reports share Province_State and Last_Update.
+            # Unique keys of a partitioned table must contain the dataset
+            models.UniqueConstraint(fields=['dataset', 'location', 'last_update'],
+                                    name='dailyreports_dataset_natural_key'),
+        ]
+        indexes = [
+            # Also the order of paginated queries, the location makes each position unique
+            models.Index(fields=['dataset', 'last_update', 'location'], name='dailyreports_dataset_update'),
+        ]
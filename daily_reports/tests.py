@@ -1,8 +1,21 @@
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.test.utils import setup_test_environment
 from django.test import Client
+from covidAPI.pagination import encode_cursor
+from covidAPI.testing import QueryPlanMixin
+from datasets.locations import ensure_location
+from datasets.models import Dataset, Location
+from datasets.versions import ensure_dataset
 from .models import DailyReports
-from datetime import datetime
+from datetime import datetime, timezone
+import json
+import msgpack
+import zstandard
+import pyarrow as pa
+import pyarrow.parquet as pq
+from unittest import mock
 
 
 class DailyReportsViewsPost(TestCase):
@@ -25,8 +38,21 @@ class DailyReportsViewsPost(TestCase):
         self.assertEqual(response.status_code, 200)
 
         response = self.client.get('/daily_reports/test1')
-        self.assertIs(b"999999" in response.content, True)
-        self.assertIs(b"999998" in response.content, True)
+        content = response.getvalue()
+        self.assertIs(b"999999" in content, True)
+        self.assertIs(b"999998" in content, True)
+
+    def test_post_compressed(self):
+        body = """FIPS,Admin2,Province_State,Country_Region,Last_Update,Lat,Long_,Confirmed,Deaths,Recovered,Active,Combined_Key,Incidence_Rate,Case-Fatality_Ratio
+                45001,Abbeville,South Carolina,US,2020-06-06 02:33:00,34.22333378,-82.46170658,47,0,0,47,"Abbeville, South Carolina, US",191.625555510254,0"""
+
+        # a body of several zstd frames decompresses as their concatenation
+        compressor = zstandard.ZstdCompressor()
+        compressed = b''.join(compressor.compress(part) for part in [body[:100].encode(), body[100:].encode()])
+        response = self.client.post('/daily_reports/test1', compressed, content_type='application/csv',
+                                    HTTP_CONTENT_ENCODING='zstd')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(DailyReports.objects.count(), 1)
 
     def test_post_invalid_header(self):
         body = """qwfqwfwfafsfafasfasf,Admin2,Province_State,Country_Region,Last_Update,Lat,Long_,Confirmed,Deaths,Recovered,Active,Combined_Key,Incidence_Rate,Case-Fatality_Ratio
@@ -44,17 +70,82 @@ class DailyReportsViewsPost(TestCase):
         response = self.client.post('/daily_reports/test1', body, content_type='application/csv')
         self.assertEqual(response.status_code, 400)
 
+    def test_post_invalid_row_rolls_back(self):
+        # the invalid row is in the second batch, the first batch must not be kept
+        body = """FIPS,Admin2,Province_State,Country_Region,Last_Update,Lat,Long_,Confirmed,Deaths,Recovered,Active,Combined_Key,Incidence_Rate,Case-Fatality_Ratio
+                45001,Abbeville,South Carolina,US,2020-06-06 02:33:00,34.22333378,-82.46170658,47,0,0,47,"Abbeville, South Carolina, US",191.625555510254,0
+                22001,Acadia,Louisiana,US,2020-06-06 02:33:00,30.2950649,-92.41419698,abc,26,0,441,"Acadia, Louisiana, US",752.6795068095737,5.56745182012848"""
+
+        with mock.patch('daily_reports.views.UPSERT_BATCH_SIZE', 1):
+            response = self.client.post('/daily_reports/test1', body, content_type='application/csv')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(DailyReports.objects.count(), 0)
+
+    def test_post_duplicate_across_batches(self):
+        # the later row wins even when the two are in different batches of one upload
+        body = """FIPS,Admin2,Province_State,Country_Region,Last_Update,Lat,Long_,Confirmed,Deaths,Recovered,Active,Combined_Key,Incidence_Rate,Case-Fatality_Ratio
+                45001,Abbeville,South Carolina,US,2020-06-06 02:33:00,34.22333378,-82.46170658,47,1,0,47,"Abbeville, South Carolina, US",191.625555510254,0
+                45001,Abbeville,South Carolina,US,2020-06-06 02:33:00,34.22333378,-82.46170658,47,3,0,47,"Abbeville, South Carolina, US",191.625555510254,0"""
+
+        with mock.patch('daily_reports.views.UPSERT_BATCH_SIZE', 1):
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.post('/daily_reports/test1', body, content_type='application/csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(DailyReports.objects.values_list('deaths', flat=True)), [3])
+
+        # on PostgreSQL both batches are copied and merged by a single INSERT
+        inserts = [query['sql'] for query in context.captured_queries
+                   if query['sql'].startswith('INSERT INTO "daily_reports_dailyreports"')]
+        self.assertEqual(len(inserts), 1 if connection.vendor == 'postgresql' else 2)
+
+    def test_post_same_province(self):
+        # counties of one province share Province_State and Last_Update and must be kept apart
+        body = """FIPS,Admin2,Province_State,Country_Region,Last_Update,Lat,Long_,Confirmed,Deaths,Recovered,Active,Combined_Key,Incidence_Rate,Case-Fatality_Ratio
+                45001,Abbeville,South Carolina,US,2020-06-06 02:33:00,34.22333378,-82.46170658,47,1,0,47,"Abbeville, South Carolina, US",191.625555510254,0
+                45003,Aiken,South Carolina,US,2020-06-06 02:33:00,33.54338026,-81.63645384,183,2,0,181,"Aiken, South Carolina, US",108.08,2.18"""
+
+        self.client.post('/daily_reports/test1', body, content_type='application/csv')
+        response = self.client.post('/daily_reports/test1', body.replace(',1,0,47,', ',5,0,47,'),
+                                    content_type='application/csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(dict(DailyReports.objects.values_list('location__admin2', 'deaths')),
+                         {'Abbeville': 5, 'Aiken': 2})
+
+    def test_post_locations_shared(self):
+        # locations are stored once and referenced by every dataset
+        body = """FIPS,Admin2,Province_State,Country_Region,Last_Update,Lat,Long_,Confirmed,Deaths,Recovered,Active,Combined_Key,Incidence_Rate,Case-Fatality_Ratio
+                45001,Abbeville,South Carolina,US,2020-06-06 02:33:00,34.22333378,-82.46170658,47,1,0,47,"Abbeville, South Carolina, US",191.625555510254,0
+                45001,Abbeville,South Carolina,US,2020-06-07 02:33:00,34.22333378,-82.46170658,48,1,0,47,"Abbeville, South Carolina, US",191.625555510254,0"""
+
+        self.client.post('/daily_reports/test1', body, content_type='application/csv')
+        self.client.post('/daily_reports/test2', body, content_type='application/csv')
+        self.assertEqual(DailyReports.objects.count(), 4)
+        self.assertEqual(Location.objects.count(), 1)
+
+    def test_post_constant_queries(self):
+        # number of queries must not grow with the number of rows, each upload creates a new dataset
+        def count_queries(rows):
+            header = 'FIPS,Admin2,Province_State,Country_Region,Last_Update,Lat,Long_,Confirmed,Deaths,' \
+                     'Recovered,Active,Combined_Key,Incidence_Rate,Case-Fatality_Ratio'
+            body = '\n'.join([header] + [
+                '1,County{},State,US,2020-06-06 02:33:00,10.0,10.0,5,1,0,4,Key,1.0,1.0'.format(index)
+                for index in range(rows)])
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.post('/daily_reports/count{}'.format(rows), body, content_type='application/csv')
+            self.assertEqual(response.status_code, 200)
+            return len(context.captured_queries)
+
+        self.assertEqual(count_queries(2), count_queries(500))
+
 
 class DailyReportsViewsGet(TestCase):
 
     @classmethod
     def setUpTestData(cls):
         params = {
-            "dailyreport_name": "test1",
+            "dataset_id": ensure_dataset(Dataset.KindChoice.DAILY_REPORTS, "test1"),
             "fips": 1,
-            "admin2": "admin1",
-            "province_state": "BC",
-            "country_region": "Canada",
+            "location_id": ensure_location("Canada", "BC", "admin1", "BC, Canada"),
             "last_update": datetime(2021, 11, 21, 16, 30),
             "lat": 12.02,
             "long": 13.04,
@@ -62,16 +153,13 @@ class DailyReportsViewsGet(TestCase):
             "deaths": 10,
             "recovered": 300,
             "active": 190,
-            "combined_key": "BC, Canada",
             "incidence_rate": 4.324,
             "case_fatality_ratio": 5.237,
         }
         params2 = {
-            "dailyreport_name": "test1",
+            "dataset_id": ensure_dataset(Dataset.KindChoice.DAILY_REPORTS, "test1"),
             "fips": 2,
-            "admin2": "admin2",
-            "province_state": "ON",
-            "country_region": "Toronto",
+            "location_id": ensure_location("Toronto", "ON", "admin2", "ON, Canada"),
             "last_update": datetime(2022, 10, 25, 13, 32),
             "lat": 42.02,
             "long": 23.04,
@@ -79,7 +167,6 @@ class DailyReportsViewsGet(TestCase):
             "deaths": 120,
             "recovered": 80,
             "active": 500,
-            "combined_key": "ON, Canada",
             "incidence_rate": 7.323,
             "case_fatality_ratio": 2.254,
         }
@@ -90,7 +177,7 @@ class DailyReportsViewsGet(TestCase):
     def test_get_available(self):
         response = self.client.get('/daily_reports/test1')
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(response.content.strip(),
+        self.assertEqual(response.getvalue().strip(),
                          b'Province_State,'
                          b'Country_Region,'
                          b'Last_Update,Active,'
@@ -105,29 +192,57 @@ class DailyReportsViewsGet(TestCase):
     def test_get_available_json(self):
         response = self.client.get('/daily_reports/test1', {'format': 'json'})
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(response.content.strip(),
-                         b'{"0": {'
-                         b'"Province_State": "BC", '
-                         b'"Country_Region": "Canada", '
-                         b'"Last_Update": "2021-11-21 21:30:00", '
-                         b'"Combined_Key": "BC, Canada", '
-                         b'"Incidence_Rate": 4.324, '
-                         b'"Case-Fatality_Ratio": 5.237, '
-                         b'"Active": 190, '
-                         b'"Confirmed": 500, '
-                         b'"Deaths": 10, '
-                         b'"Recovered": 300}, '
-                         b'"1": {'
-                         b'"Province_State": "ON", '
-                         b'"Country_Region": "Toronto", '
-                         b'"Last_Update": "2022-10-25 18:32:00", '
-                         b'"Combined_Key": "ON, Canada", '
-                         b'"Incidence_Rate": 7.323, '
-                         b'"Case-Fatality_Ratio": 2.254, '
-                         b'"Active": 500, '
-                         b'"Confirmed": 700, '
-                         b'"Deaths": 120, '
-                         b'"Recovered": 80}}')
+        self.assertEqual(response.getvalue().strip(),
+                         b'{"0":{'
+                         b'"Province_State":"BC",'
+                         b'"Country_Region":"Canada",'
+                         b'"Last_Update":"2021-11-21 21:30:00",'
+                         b'"Combined_Key":"BC, Canada",'
+                         b'"Incidence_Rate":4.324,'
+                         b'"Case-Fatality_Ratio":5.237,'
+                         b'"Active":190,'
+                         b'"Confirmed":500,'
+                         b'"Deaths":10,'
+                         b'"Recovered":300},'
+                         b'"1":{'
+                         b'"Province_State":"ON",'
+                         b'"Country_Region":"Toronto",'
+                         b'"Last_Update":"2022-10-25 18:32:00",'
+                         b'"Combined_Key":"ON, Canada",'
+                         b'"Incidence_Rate":7.323,'
+                         b'"Case-Fatality_Ratio":2.254,'
+                         b'"Active":500,'
+                         b'"Confirmed":700,'
+                         b'"Deaths":120,'
+                         b'"Recovered":80}}')
+
+    def test_get_available_json_columnar(self):
+        response = self.client.get('/daily_reports/test1', {'format': 'json-columnar', 'data_type': 'deaths,active'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.getvalue().strip(),
+                         b'{"columns":["Province_State","Country_Region","Last_Update","Combined_Key",'
+                         b'"Incidence_Rate","Case-Fatality_Ratio","Deaths","Active"],'
+                         b'"rows":['
+                         b'["BC","Canada","2021-11-21 21:30:00","BC, Canada",4.324,5.237,10,190],'
+                         b'["ON","Toronto","2022-10-25 18:32:00","ON, Canada",7.323,2.254,120,500]]}')
+
+    def test_get_available_binary(self):
+        query = {'countries': 'Toronto', 'data_type': 'deaths,confirmed'}
+        response = self.client.get('/daily_reports/test1', {**query, 'format': 'msgpack'})
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertEqual(msgpack.unpackb(response.content), {
+            'Province_State': ['ON'], 'Country_Region': ['Toronto'], 'Last_Update': ['2022-10-25 18:32:00'],
+            'Combined_Key': ['ON, Canada'], 'Incidence_Rate': [7.323], 'Case-Fatality_Ratio': [2.254],
+            'Deaths': [120], 'Confirmed': [700]})
+
+        for format, read in [('parquet', lambda body: pq.read_table(pa.BufferReader(body))),
+                             ('arrow', lambda body: pa.ipc.open_stream(body).read_all())]:
+            response = self.client.get('/daily_reports/test1', {**query, 'format': format})
+            self.assertEqual(response.status_code, 200)
+            table = read(response.content)
+            self.assertEqual(table.column('Combined_Key').to_pylist(), ['ON, Canada'])
+            self.assertEqual(table.column('Last_Update').to_pylist(),
+                             [datetime(2022, 10, 25, 18, 32, tzinfo=timezone.utc)])
 
     def test_get_available_specific(self):
         response = self.client.get('/daily_reports/test1', {
@@ -139,7 +254,7 @@ class DailyReportsViewsGet(TestCase):
             'data_type': 'deaths',
         })
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(response.content.strip(),
+        self.assertEqual(response.getvalue().strip(),
                          b'Province_State,'
                          b'Country_Region,'
                          b'Last_Update,'
@@ -149,10 +264,50 @@ class DailyReportsViewsGet(TestCase):
                          b'Case-Fatality_Ratio\r\n'
                          b'BC,Canada,2021-11-21 21:30:00+00:00,10,"BC, Canada",4.324,5.237')
 
+    def test_get_filters_resolved_once(self):
+        # dataset version, matching locations and the reports filtered on their ids
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/daily_reports/test1', {'countries': 'Toronto', 'format': 'json'})
+            self.assertEqual(list(json.loads(response.getvalue()).values())[0]['Province_State'], 'ON')
+        self.assertEqual(len(context.captured_queries), 3)
+        self.assertNotIn('"country_region"', context.captured_queries[-1]['sql'].split('WHERE')[-1])
+
+    def test_get_paginated(self):
+        # reports follow each other by update time, the cursor of the next page is sent while there is one
+        response = self.client.get('/daily_reports/test1', {'limit': 1, 'format': 'json'})
+        self.assertEqual(list(json.loads(response.getvalue()).values())[0]['Province_State'], 'BC')
+        cursor = response['X-Next-Cursor']
+
+        response = self.client.get('/daily_reports/test1', {'limit': 1, 'after': cursor, 'format': 'json'})
+        self.assertEqual([row['Province_State'] for row in json.loads(response.getvalue()).values()], ['ON'])
+        self.assertFalse(response.has_header('X-Next-Cursor'))
+
+        response = self.client.get('/daily_reports/test1', {'limit': 2, 'format': 'json'})
+        self.assertEqual(len(json.loads(response.getvalue())), 2)
+        self.assertFalse(response.has_header('X-Next-Cursor'))
+
+    def test_get_paginated_filtered(self):
+        response = self.client.get('/daily_reports/test1', {'limit': 1, 'countries': 'Toronto', 'format': 'json'})
+        self.assertEqual([row['Province_State'] for row in json.loads(response.getvalue()).values()], ['ON'])
+        self.assertFalse(response.has_header('X-Next-Cursor'))
+
+    def test_get_invalid_pagination(self):
+        cursor = self.client.get('/daily_reports/test1', {'limit': 1})['X-Next-Cursor']
+        for params in [{'limit': 0}, {'limit': 10001}, {'limit': 'a'}, {'limit': 1, 'after': 'abc'},
+                       {'limit': 1, 'after': 'WzFd'}, {'after': cursor}]:
+            response = self.client.get('/daily_reports/test1', params)
+            self.assertEqual(response.status_code, 400, params)
+
+    def test_get_streaming(self):
+        for format in ['csv', 'json']:
+            response = self.client.get('/daily_reports/test1', {'format': format})
+            self.assertTrue(response.streaming)
+            self.assertEqual(response['Content-Type'], 'application/' + format)
+
     def test_get_unavailable(self):
         response = self.client.get('/daily_reports/sfafasgasgasgasgagsa')
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(response.content.strip(),
+        self.assertEqual(response.getvalue().strip(),
                          b'Province_State,'
                          b'Country_Region,'
                          b'Last_Update,'
@@ -169,16 +324,83 @@ class DailyReportsViewsGet(TestCase):
         self.assertEqual(response.status_code, 400)
 
 
+class DailyReportsViewsAggregate(TestCase):
+    # Allen has no cases and is left out of the weighted Incidence_Rate, populations are 25,000, 300,000 and 100,000
+    body = """FIPS,Admin2,Province_State,Country_Region,Last_Update,Lat,Long_,Confirmed,Deaths,Recovered,Active,Combined_Key,Incidence_Rate,Case-Fatality_Ratio
+45001,Abbeville,South Carolina,US,2020-06-06 02:33:00,34.22333378,-82.46170658,100,2,0,98,"Abbeville, South Carolina, US",400,2
+22001,Acadia,Louisiana,US,2020-06-06 02:33:00,30.2950649,-92.41419698,300,6,0,294,"Acadia, Louisiana, US",100,2
+22003,Allen,Louisiana,US,2020-06-06 03:33:00,30.65,-92.82,0,0,0,0,"Allen, Louisiana, US",100,2
+,,Ontario,Canada,2020-06-06 02:33:00,51.2538,-85.3232,50,5,10,35,"Ontario, Canada",50,10
+45001,Abbeville,South Carolina,US,2020-06-07 02:33:00,34.22333378,-82.46170658,150,3,0,147,"Abbeville, South Carolina, US",600,2"""
+
+    def setUp(self):
+        response = self.client.post('/daily_reports/test1', self.body, content_type='application/csv')
+        self.assertEqual(response.status_code, 200)
+
+    def get(self, query):
+        return self.client.get('/daily_reports/test1', {'format': 'json-columnar', **query})
+
+    def test_get_group_by_country(self):
+        # one GROUP BY after the dataset version
+        with self.assertNumQueries(2):
+            response = self.get({'group_by': 'country_region'})
+            self.assertEqual(json.loads(response.getvalue()), {
+                'columns': ['Province_State', 'Country_Region', 'Last_Update', 'Combined_Key', 'Incidence_Rate',
+                            'Case-Fatality_Ratio', 'Active', 'Confirmed', 'Deaths', 'Recovered'],
+                'rows': [['', 'Canada', '2020-06-06 07:33:00', 'Canada', 50.0, 10.0, 35, 50, 5, 10],
+                         ['', 'US', '2020-06-06 08:33:00', 'US', 200.0, 2.0, 392, 400, 8, 0],
+                         ['', 'US', '2020-06-07 07:33:00', 'US', 600.0, 2.0, 147, 150, 3, 0]]})
+
+    def test_get_group_by_province(self):
+        response = self.get({'group_by': 'province_state', 'data_type': 'confirmed', 'format': 'csv'})
+        self.assertEqual(response.getvalue().strip(),
+                         b'Province_State,Country_Region,Last_Update,Confirmed,Combined_Key,Incidence_Rate,'
+                         b'Case-Fatality_Ratio\r\n'
+                         b'Ontario,Canada,2020-06-06 07:33:00+00:00,50,"Ontario, Canada",50.0,10.0\r\n'
+                         b'Louisiana,US,2020-06-06 08:33:00+00:00,300,"Louisiana, US",100.0,2.0\r\n'
+                         b'South Carolina,US,2020-06-06 07:33:00+00:00,100,"South Carolina, US",400.0,2.0\r\n'
+                         b'South Carolina,US,2020-06-07 07:33:00+00:00,150,"South Carolina, US",600.0,2.0')
+
+    def test_get_group_by_weighted(self):
+        # 400 cases over 325,000 people
+        response = self.get({'group_by': 'country_region', 'incidence_rate': 'weighted', 'countries': 'US',
+                             'end_date': '2020-06-06', 'format': 'json'})
+        row = json.loads(response.getvalue())['0']
+        self.assertAlmostEqual(row.pop('Incidence_Rate'), 400 / 325000 * 100000)
+        self.assertEqual(row, {'Province_State': '', 'Country_Region': 'US', 'Last_Update': '2020-06-06 08:33:00',
+                               'Combined_Key': 'US', 'Case-Fatality_Ratio': 2.0, 'Active': 392, 'Confirmed': 400,
+                               'Deaths': 8, 'Recovered': 0})
+
+    def test_get_group_by_filtered(self):
+        response = self.get({'group_by': 'province_state', 'regions': 'Louisiana,Ontario',
+                             'incidence_rate': 'weighted', 'data_type': 'deaths'})
+        self.assertEqual(json.loads(response.getvalue())['rows'],
+                         [['Ontario', 'Canada', '2020-06-06 07:33:00', 'Ontario, Canada', 50.0, 10.0, 5],
+                          ['Louisiana', 'US', '2020-06-06 08:33:00', 'Louisiana, US', 100.0, 2.0, 6]])
+
+    def test_get_group_by_binary(self):
+        response = self.get({'group_by': 'country_region', 'start_date': '2020-06-07', 'format': 'parquet'})
+        self.assertEqual(pq.read_table(pa.BufferReader(response.content)).to_pydict(), {
+            'Province_State': [''], 'Country_Region': ['US'],
+            'Last_Update': [datetime(2020, 6, 7, 7, 33, tzinfo=timezone.utc)], 'Combined_Key': ['US'],
+            'Incidence_Rate': [600.0], 'Case-Fatality_Ratio': [2.0], 'Active': [147], 'Confirmed': [150],
+            'Deaths': [3], 'Recovered': [0]})
+
+    def test_get_group_by_invalid(self):
+        for query in [{'group_by': 'admin2'}, {'incidence_rate': 'weighted'},
+                      {'group_by': 'country_region', 'incidence_rate': 'median'},
+                      {'group_by': 'country_region', 'limit': 10}]:
+            self.assertEqual(self.get(query).status_code, 400, query)
+
+
 class DailyReportsViewsDelete(TestCase):
 
     @classmethod
     def setUp(cls):
         params = {
-            "dailyreport_name": "test1",
+            "dataset_id": ensure_dataset(Dataset.KindChoice.DAILY_REPORTS, "test1"),
             "fips": 1,
-            "admin2": "admin1",
-            "province_state": "BC",
-            "country_region": "Canada",
+            "location_id": ensure_location("Canada", "BC", "admin1", "BC, Canada"),
             "last_update": datetime(2021, 11, 21, 16, 30),
             "lat": 12.02,
             "long": 13.04,
@@ -186,7 +408,6 @@ class DailyReportsViewsDelete(TestCase):
             "deaths": 10,
             "recovered": 300,
             "active": 190,
-            "combined_key": "BC, Canada",
             "incidence_rate": 4.324,
             "case_fatality_ratio": 5.237,
         }
@@ -199,3 +420,68 @@ class DailyReportsViewsDelete(TestCase):
     def test_delete_unavailable(self):
         response = self.client.delete('/daily_reports/sfafasgasgasgasgagsa')
         self.assertEqual(response.status_code, 404)
+
+    def test_delete_set_based(self):
+        # the rows go with their partition or in one DELETE, they are never selected
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.delete('/daily_reports/test1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(DailyReports.objects.count(), 0)
+        statements = [query['sql'] for query in context.captured_queries]
+        self.assertEqual([sql for sql in statements if '"daily_reports_dailyreports"."id"' in sql], [])
+
+
+class DailyReportsQueryPlans(QueryPlanMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        DailyReports.objects.create(
+            dataset_id=ensure_dataset(Dataset.KindChoice.DAILY_REPORTS, "test1"),
+            fips=1,
+            location_id=ensure_location("Canada", "BC", "admin1", "BC, Canada"),
+            last_update=datetime(2021, 11, 21, 16, 30),
+            lat=12.02,
+            long=13.04,
+            confirmed=500,
+            deaths=10,
+            recovered=300,
+            active=190,
+            incidence_rate=4.324,
+            case_fatality_ratio=5.237,
+        )
+
+    def test_get_plan(self):
+        self.assertNoSeqScan(lambda: self.client.get('/daily_reports/test1'))
+
+    def test_get_specific_plan(self):
+        self.assertNoSeqScan(lambda: self.client.get('/daily_reports/test1', {
+            'start_date': '2021-11-21',
+            'end_date': '2021-11-21',
+            'countries': 'Canada',
+            'regions': 'BC',
+            'format': 'json',
+        }))
+
+    def test_get_countries_plan(self):
+        self.assertNoSeqScan(lambda: self.client.get('/daily_reports/test1', {'countries': 'Canada'}))
+
+    def test_get_paginated_plan(self):
+        self.assertNoSeqScan(lambda: self.client.get('/daily_reports/test1', {
+            'limit': 1,
+            'after': encode_cursor([datetime(2021, 11, 21, 21, 30, tzinfo=timezone.utc), 1]),
+        }))
+
+    def test_get_group_by_plan(self):
+        self.assertNoSeqScan(lambda: self.client.get('/daily_reports/test1', {
+            'group_by': 'province_state',
+            'incidence_rate': 'weighted',
+            'countries': 'Canada',
+        }).getvalue())
+
+    def test_delete_plan(self):
+        self.assertNoSeqScan(lambda: self.client.delete('/daily_reports/test1'))
+
+    def test_plan_check_detects_seq_scan(self):
+        # fips is not indexed so this query can only be answered by a sequential scan
+        with self.assertRaises(AssertionError):
+            self.assertNoSeqScan(lambda: list(DailyReports.objects.filter(fips=1)))
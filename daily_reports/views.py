@@ -1,12 +1,54 @@
 from datetime import datetime, date, timedelta
+from functools import lru_cache
 from django.shortcuts import render
 
 # Create your views here.
 from io import StringIO
-from django.http import HttpResponse, JsonResponse
+from django.http import HttpResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
+from django.db import transaction
+from django.db.models import Avg, ExpressionWrapper, F, FloatField, Max, Q, Sum
+from django.db.models.functions import TruncDate
 import csv
+import numpy as np
+import orjson
+import pyarrow as pa
+from covidAPI.bulk import bulk_loader
+from covidAPI.exports import TABLE_FORMATS, dictionary_column, table_response
+from covidAPI.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor, paginate, parse_limit
+from covidAPI.streaming import CorruptUpload, Echo, batched, buffered, csv_reader, decompressed
 from daily_reports.models import DailyReports
+from datasets.cache import cache_response
+from datasets.conditional import conditional_get
+from datasets.models import Dataset, Location
+from datasets.deletion import delete_dataset, open_dataset, write_dataset
+from datasets.locations import ensure_locations, resolve_locations
+from datasets.partitions import drop_partition, partitioned
+from datasets.versions import bump_version, is_deleted, request_dataset_id
+from jobs.models import Job
+from jobs.worker import queue_upload
+
+# Rows written per batch
+UPSERT_BATCH_SIZE = 1000
+
+# Columns of an uploaded row stored on DailyReports, the location columns are stored once in Location
+UPLOAD_FIELDS = ["fips", "last_update", "lat", "long", "confirmed", "deaths", "recovered", "active", "incidence_rate",
+                 "case_fatality_ratio"]
+
+# Rows fetched per round trip when streaming responses
+STREAM_CHUNK_SIZE = 2000
+
+# Order of paginated reports, unique within a dataset and indexed through dailyreports_dataset_update
+PAGE_KEYS = ["last_update", "location_id"]
+
+# Location columns of each group_by value, provinces are grouped within their country
+GROUP_BYS = {
+    "country_region": ["location__country_region"],
+    "province_state": ["location__country_region", "location__province_state"],
+}
+
+# Aggregates of Incidence_Rate in grouped reports, see aggregate_dailyreports
+INCIDENCE_RATES = ["mean", "weighted"]
 
 
 @csrf_exempt
@@ -21,158 +63,332 @@ def dailyreports(request, dailyreport_name):
 
 
 def dailyreports_post(request, dailyreport_name):
-    body = request.body.decode('utf-8')
-    reader = csv.reader(body.split('\n'), delimiter=',')
+    # gzip and zstd bodies are decompressed while they are parsed
+    body = decompressed(request, request.headers.get('Content-Encoding'))
+    if body is None:
+        return HttpResponse('Unsupported content encoding', status=415)
+
+    try:
+        # Large uploads can be processed in the background, progress is reported under /jobs
+        if request.GET.get('async') == 'true':
+            return queue_upload(body, Job.KindChoice.DAILY_REPORTS, dailyreport_name, '',
+                                validate_header,
+                                lambda stream, progress: ingest_dailyreports(stream, dailyreport_name, progress))
+
+        return ingest_dailyreports(body, dailyreport_name)
+    except CorruptUpload:
+        return HttpResponse('Malformed request', status=400)
+
+
+def ingest_dailyreports(stream, dailyreport_name, progress=None):
+    # Processing body as a stream so memory stays flat regardless of upload size
+    reader = csv_reader(stream)
 
     # Validating header
-    header = next(reader)
+    header = next(reader, None)
     if not validate_header(header):
         return HttpResponse('Malformed request', status=400)
 
-    create_queue = []
-    update_queue = []
-
-    for row in reader:
-        data = parse_post_row(header, row)
-
-        # Validating row
-        if not data:
-            return HttpResponse('Malformed request', status=400)
-
-        data['dailyreport_name'] = dailyreport_name
-
-        dailyreports_entry = DailyReports.objects.filter(dailyreport_name=data["dailyreport_name"],
-                                                         province_state=data["province_state"],
-                                                         country_region=data["country_region"],
-                                                         last_update=data["last_update"]).first()
-        if not dailyreports_entry:
-            dailyreports_entry = DailyReports(**data)
-            create_queue.append(dailyreports_entry)
-        else:
-            dailyreports_entry.confirmed = data["confirmed"]
-            dailyreports_entry.deaths = data["deaths"]
-            dailyreports_entry.recovered = data["recovered"]
-            dailyreports_entry.active = data["active"]
-            dailyreports_entry.incidence_rate = data["incidence_rate"]
-            dailyreports_entry.case_fatality_ratio = data["case_fatality_ratio"]
-            update_queue.append(dailyreports_entry)
-
-    # Bulk update or create
-    DailyReports.objects.bulk_create(create_queue)
-    DailyReports.objects.bulk_update(update_queue, [
-        "confirmed",
-        "deaths",
-        "recovered",
-        "active",
-        "incidence_rate",
-        "case_fatality_ratio"
-    ])
-
-    return HttpResponse('Upload successful', status=200)
+    # Partitions are created outside the upload transaction, see prepare_dataset
+    return write_dataset(Dataset.KindChoice.DAILY_REPORTS, dailyreport_name, purge_dailyreports,
+                         lambda: write_dailyreports(reader, header, dailyreport_name, progress))
 
 
+@conditional_get(Dataset.KindChoice.DAILY_REPORTS)
+@cache_response(Dataset.KindChoice.DAILY_REPORTS)
 def dailyreports_get(request, dailyreport_name):
     # validating params
     params = parse_get_params(request, dailyreport_name)
     if not params:
         return HttpResponse('Malformed request', status=400)
 
+    # Filtering on the dataset lets PostgreSQL read only its partition
+    dataset_id = request_dataset_id(request, Dataset.KindChoice.DAILY_REPORTS, dailyreport_name)
     query = {
-        "dailyreport_name": params["dailyreport_name"],
+        "dataset_id": dataset_id,
         "last_update__range": [params["start_date"], params["end_date"]]
     }
-    if params["countries"]:
-        query["country_region__in"] = params["countries"]
-    if params["regions"]:
-        query["province_state__in"] = params["regions"]
-    if params["combined_key"]:
-        query["combined_key__exact"] = params["combined_key"]
 
-    dailyreports_list = DailyReports.objects.filter(**query)
+    # Location filters are resolved to ids once so reports are filtered on integers
+    location_ids = resolve_locations(params["countries"] or None, params["regions"] or None,
+                                     params["combined_key"] or None)
+    if location_ids is not None:
+        query["location__in"] = location_ids
 
-    if params["format"] == "json":
-        return get_response_json(dailyreports_list, params["data_type"])
-    return get_response_csv(dailyreports_list, params["data_type"])
+    dailyreports_list = DailyReports.objects.filter(**query).select_related('location')
 
+    # Every row references its dataset, soft deleted datasets read as empty until their rows are purged
+    if dataset_id is None or is_deleted(request, Dataset.KindChoice.DAILY_REPORTS, dailyreport_name):
+        dailyreports_list = DailyReports.objects.none()
 
-def dailyreports_delete(request, dailyreport_name):
-    dailyreports_entries = DailyReports.objects.filter(
-        dailyreport_name=dailyreport_name)
+    # Pages follow each other in PAGE_KEYS order, the cursor of the next one is sent in a header
+    last = None
+    if params["limit"] is not None:
+        dailyreports_list, last = paginate(dailyreports_list, PAGE_KEYS, params["limit"], params["after"])
+
+    # One report per group and day summed by the database, the response scales with the number of groups
+    if params["group_by"] is not None:
+        dailyreports_list = aggregate_dailyreports(dailyreports_list, params["group_by"], params["data_type"],
+                                                   params["incidence_rate"])
 
-    if dailyreports_entries:
-        dailyreports_entries.delete()
+    response = get_response(params["format"], dailyreports_list, params["data_type"])
+    if last is not None:
+        response[NEXT_CURSOR_HEADER] = encode_cursor(last)
+    return response
+
+
+def dailyreports_delete(request, dailyreport_name):
+    if delete_dataset(Dataset.KindChoice.DAILY_REPORTS, dailyreport_name,
+                      lambda name: DailyReports.objects.filter(dataset__kind=Dataset.KindChoice.DAILY_REPORTS,
+                                                               dataset__name=name).exists(),
+                      purge_dailyreports):
         return HttpResponse('Successfully deleted', status=200)
     return HttpResponse('Dailyreports not found', status=404)
 
 
 # **************************************************************************************************** HELPER FUNCTIONS
 
-def get_response_json(dailyreports_list, data_type):
-    data = {}
+def write_dailyreports(reader, header, dailyreport_name, progress):
+    # Rows are flushed in batches, any bad row rolls back the whole upload
+    with transaction.atomic():
+        dataset_id = open_dataset(Dataset.KindChoice.DAILY_REPORTS, dailyreport_name, purge_dailyreports)
+
+        # Copied into a temporary table and merged when the block exits on PostgreSQL, one INSERT ... ON CONFLICT
+        # DO UPDATE per batch elsewhere
+        with bulk_loader(DailyReports, ['dataset', 'location'] + UPLOAD_FIELDS,
+                         unique_fields=['dataset', 'location', 'last_update'],
+                         update_fields=[
+                             "confirmed",
+                             "deaths",
+                             "recovered",
+                             "active",
+                             "incidence_rate",
+                             "case_fatality_ratio"
+                         ]) as load:
+            for rows in batched(reader, UPSERT_BATCH_SIZE):
+                # Later rows win on duplicates, ON CONFLICT cannot touch a row twice in one statement
+                entries = {}
+
+                for row in rows:
+                    data = parse_post_row(header, row)
+
+                    # Validating row
+                    if not data:
+                        transaction.set_rollback(True)
+                        return HttpResponse('Malformed request', status=400)
+
+                    location = (data["country_region"], data["province_state"], data["admin2"], data["combined_key"])
+                    entries[(location, data["last_update"])] = data
+
+                # Location ids of the batch, new locations are created
+                location_ids = ensure_locations(location for location, _ in entries)
+
+                load([(dataset_id, location_ids[location]) + tuple(data[field] for field in UPLOAD_FIELDS)
+                      for (location, _), data in entries.items()])
+
+                if progress:
+                    progress(len(rows))
+
+        bump_version(Dataset.KindChoice.DAILY_REPORTS, dailyreport_name)
 
-    for index, dailyreport in enumerate(dailyreports_list):
-        row = {
-            'Province_State': dailyreport.province_state,
-            'Country_Region': dailyreport.country_region,
-            'Last_Update': dailyreport.last_update.strftime("%Y-%m-%d %H:%M:%S"),
-            'Combined_Key': dailyreport.combined_key,
-            'Incidence_Rate': dailyreport.incidence_rate,
-            'Case-Fatality_Ratio': dailyreport.case_fatality_ratio,
-        }
+    return HttpResponse('Upload successful', status=200)
 
-        if "active" in data_type:
-            row["Active"] = dailyreport.active
-        if "confirmed" in data_type:
-            row["Confirmed"] = dailyreport.confirmed
-        if "deaths" in data_type:
-            row["Deaths"] = dailyreport.deaths
-        if "recovered" in data_type:
-            row["Recovered"] = dailyreport.recovered
 
-        data[index] = row
+def purge_dailyreports(dailyreport_name):
+    # Drops the dataset partition or runs one DELETE, QuerySet.delete() would load every row first to look for cascades
+    dataset_id = Dataset.objects.filter(kind=Dataset.KindChoice.DAILY_REPORTS, name=dailyreport_name).values_list(
+        'id', flat=True).first()
+    if dataset_id is None:
+        return 0
+
+    dailyreports_entries = DailyReports.objects.filter(dataset_id=dataset_id)
+    if partitioned():
+        exists = dailyreports_entries.exists()
+        drop_partition(Dataset.KindChoice.DAILY_REPORTS, dataset_id)
+        return exists
+    return dailyreports_entries._raw_delete(dailyreports_entries.db)
+
+
+def aggregate_dailyreports(dailyreports_list, group_by, data_type, incidence_rate):
+    # Unsaved reports of the groups of dailyreports_list on each day of update from one GROUP BY, ordered by group
+    # then day. Counts are summed, rates averaged and Last_Update is the latest of the group. The weighted
+    # Incidence_Rate is cases per 100,000 people over the population of the group, each population being
+    # Confirmed / Incidence_Rate * 100,000, so reports without cases or rate are left out of it
+    fields = GROUP_BYS[group_by]
+
+    if incidence_rate == "weighted":
+        counted = Q(confirmed__gt=0, incidence_rate__gt=0)
+        rate = ExpressionWrapper(
+            Sum('confirmed', filter=counted) /
+            Sum(ExpressionWrapper(F('confirmed') / F('incidence_rate'), output_field=FloatField()), filter=counted),
+            output_field=FloatField())
+    else:
+        rate = Avg('incidence_rate')
+
+    groups = dailyreports_list.values(*fields, day=TruncDate('last_update')).annotate(
+        latest_update=Max('last_update'),
+        rate=rate,
+        fatality_ratio=Avg('case_fatality_ratio'),
+        **{x + '_total': Sum(x) for x in data_type},
+    ).order_by(*fields, 'day')
+
+    dailyreports = []
+    for group in groups:
+        country_region = group['location__country_region']
+        province_state = group.get('location__province_state', '')
+        dailyreports.append(DailyReports(
+            location=Location(country_region=country_region, province_state=province_state,
+                              combined_key=', '.join(name for name in [province_state, country_region] if name)),
+            last_update=group['latest_update'],
+            incidence_rate=group['rate'],
+            case_fatality_ratio=group['fatality_ratio'],
+            **{x: group[x + '_total'] for x in data_type},
+        ))
+    return dailyreports
+
+
+def stream(dailyreports_list):
+    # Reports a chunk at a time, aggregated reports are already in memory
+    if isinstance(dailyreports_list, list):
+        return iter(dailyreports_list)
+    return dailyreports_list.iterator(chunk_size=STREAM_CHUNK_SIZE)
+
+
+def get_response(format, dailyreports_list, data_type):
+    if format == "json":
+        return get_response_json(dailyreports_list, data_type)
+    if format == "json-columnar":
+        return get_response_json_columnar(dailyreports_list, data_type)
+    if format in TABLE_FORMATS:
+        return get_response_table(format, dailyreports_list, data_type)
+    return get_response_csv(dailyreports_list, data_type)
+
+
+@lru_cache(maxsize=4096)
+def last_update_label(last_update):
+    # Reports of one upload share a few update times
+    return last_update.strftime("%Y-%m-%d %H:%M:%S")
 
-    return JsonResponse(data)
+
+def get_response_json(dailyreports_list, data_type):
+    # Streams the same document orjson would build, one report at a time
+    def fragments():
+        yield '{'
+        for index, dailyreport in enumerate(stream(dailyreports_list)):
+            row = {
+                'Province_State': dailyreport.location.province_state,
+                'Country_Region': dailyreport.location.country_region,
+                'Last_Update': last_update_label(dailyreport.last_update),
+                'Combined_Key': dailyreport.location.combined_key,
+                'Incidence_Rate': dailyreport.incidence_rate,
+                'Case-Fatality_Ratio': dailyreport.case_fatality_ratio,
+            }
+
+            if "active" in data_type:
+                row["Active"] = dailyreport.active
+            if "confirmed" in data_type:
+                row["Confirmed"] = dailyreport.confirmed
+            if "deaths" in data_type:
+                row["Deaths"] = dailyreport.deaths
+            if "recovered" in data_type:
+                row["Recovered"] = dailyreport.recovered
+
+            yield '{}"{}":{}'.format(',' if index else '', index, orjson.dumps(row).decode())
+        yield '}'
+
+    return StreamingHttpResponse(buffered(fragments()), content_type='application/json')
+
+
+def get_response_json_columnar(dailyreports_list, data_type):
+    # Column names are sent once, then one array of values per report in the same order
+    columns = ['Province_State', 'Country_Region', 'Last_Update', 'Combined_Key', 'Incidence_Rate',
+               'Case-Fatality_Ratio'] + [x.title() for x in data_type]
+
+    def fragments():
+        yield '{{"columns":{},"rows":['.format(orjson.dumps(columns).decode())
+        for index, dailyreport in enumerate(stream(dailyreports_list)):
+            row = [
+                dailyreport.location.province_state,
+                dailyreport.location.country_region,
+                last_update_label(dailyreport.last_update),
+                dailyreport.location.combined_key,
+                dailyreport.incidence_rate,
+                dailyreport.case_fatality_ratio,
+            ]
+            yield (',' if index else '') + orjson.dumps(row + [getattr(dailyreport, x) for x in data_type]).decode()
+        yield ']}'
+
+    return StreamingHttpResponse(buffered(fragments()), content_type='application/json')
+
+
+def get_response_table(format, dailyreports_list, data_type):
+    # Built column by column from one values query, locations are fetched once and dictionary encoded
+    fields = ['location_id', 'last_update', 'incidence_rate', 'case_fatality_ratio'] + data_type
+    if isinstance(dailyreports_list, list):
+        # Aggregated reports each hold their own unsaved location
+        columns = {field: [getattr(dailyreport, field) for dailyreport in dailyreports_list] for field in fields[1:]}
+        positions = np.arange(len(dailyreports_list))
+        locations = [dailyreport.location for dailyreport in dailyreports_list]
+    else:
+        rows = list(dailyreports_list.values_list(*fields))
+        columns = dict(zip(fields, zip(*rows))) if rows else {field: () for field in fields}
+
+        location_ids, positions = np.unique(np.array(columns['location_id'], dtype=np.int64), return_inverse=True)
+        locations = Location.objects.in_bulk(location_ids.tolist())
+        locations = [locations[location_id] for location_id in location_ids.tolist()]
+
+    table = pa.table({
+        'Province_State': dictionary_column(positions, [location.province_state for location in locations]),
+        'Country_Region': dictionary_column(positions, [location.country_region for location in locations]),
+        'Last_Update': pa.array(columns['last_update'], type=pa.timestamp('s', tz='UTC')),
+        'Combined_Key': dictionary_column(positions, [location.combined_key for location in locations]),
+        'Incidence_Rate': pa.array(columns['incidence_rate'], type=pa.float64()),
+        'Case-Fatality_Ratio': pa.array(columns['case_fatality_ratio'], type=pa.float64()),
+        **{x.title(): pa.array(columns[x], type=pa.int32()) for x in data_type},
+    })
+    return table_response(format, table)
 
 
 def get_response_csv(dailyreports_list, data_type):
-    response = HttpResponse(content_type='application/csv')
-
-    writer = csv.writer(response)
-    writer.writerow(
-        ['Province_State', 'Country_Region', 'Last_Update'] +
-        [x.title() for x in data_type] +
-        ['Combined_Key', 'Incidence_Rate', 'Case-Fatality_Ratio']
-    )
-    for dailyreport in dailyreports_list:
-        prefix = [
-            dailyreport.province_state,
-            dailyreport.country_region,
-            dailyreport.last_update,
-        ]
-
-        middle = []
-
-        if "active" in data_type:
-            middle.append(dailyreport.active)
-        if "confirmed" in data_type:
-            middle.append(dailyreport.confirmed)
-        if "deaths" in data_type:
-            middle.append(dailyreport.deaths)
-        if "recovered" in data_type:
-            middle.append(dailyreport.recovered)
-
-        suffix = [
-            dailyreport.combined_key,
-            dailyreport.incidence_rate,
-            dailyreport.case_fatality_ratio,
-        ]
-        writer.writerow(prefix + middle + suffix)
-    return response
+    writer = csv.writer(Echo())
+
+    def fragments():
+        yield writer.writerow(
+            ['Province_State', 'Country_Region', 'Last_Update'] +
+            [x.title() for x in data_type] +
+            ['Combined_Key', 'Incidence_Rate', 'Case-Fatality_Ratio']
+        )
+        for dailyreport in stream(dailyreports_list):
+            prefix = [
+                dailyreport.location.province_state,
+                dailyreport.location.country_region,
+                dailyreport.last_update,
+            ]
+
+            middle = []
+
+            if "active" in data_type:
+                middle.append(dailyreport.active)
+            if "confirmed" in data_type:
+                middle.append(dailyreport.confirmed)
+            if "deaths" in data_type:
+                middle.append(dailyreport.deaths)
+            if "recovered" in data_type:
+                middle.append(dailyreport.recovered)
+
+            suffix = [
+                dailyreport.location.combined_key,
+                dailyreport.incidence_rate,
+                dailyreport.case_fatality_ratio,
+            ]
+            yield writer.writerow(prefix + middle + suffix)
+
+    return StreamingHttpResponse(buffered(fragments()), content_type='application/csv')
 
 
 def validate_header(header):
     # Not enough columns
-    if len(header) < 14:
+    if header is None or len(header) < 14:
         return False
 
     # Invalid Column Headers
@@ -274,6 +490,10 @@ def parse_get_params(request, dailyreport_name):
         "start_date": date.min,
         "end_date": date.max,
         "format": 'csv',
+        "limit": None,
+        "after": None,
+        "group_by": None,
+        "incidence_rate": 'mean',
     }
 
     if 'countries' in request.GET:
@@ -299,8 +519,26 @@ def parse_get_params(request, dailyreport_name):
         except ValueError:
             return None
     if 'format' in request.GET:
-        if request.GET['format'] not in ["csv", "json"]:
+        if request.GET['format'] not in ["csv", "json", "json-columnar"] + list(TABLE_FORMATS):
             return None
         params["format"] = request.GET['format']
+    if 'limit' in request.GET:
+        params["limit"] = parse_limit(request.GET['limit'])
+        if params["limit"] is None:
+            return None
+    if 'after' in request.GET:
+        # A cursor continues a paginated query
+        params["after"] = decode_cursor(request.GET['after'], DailyReports, PAGE_KEYS)
+        if params["after"] is None or params["limit"] is None:
+            return None
+    if 'group_by' in request.GET:
+        # Pages would split the reports of a group
+        if request.GET['group_by'] not in GROUP_BYS or params["limit"] is not None:
+            return None
+        params["group_by"] = request.GET['group_by']
+    if 'incidence_rate' in request.GET:
+        if request.GET['incidence_rate'] not in INCIDENCE_RATES or params["group_by"] is None:
+            return None
+        params["incidence_rate"] = request.GET['incidence_rate']
 
     return params
@@ -0,0 +1,113 @@
+import hashlib
+import threading
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.locmem import LocMemCache
+from django.http import HttpResponse
+
+from covidAPI.pagination import NEXT_CURSOR_HEADER
+from datasets.versions import request_version
+
+# Counters are per process, like the local memory cache itself
+stats = {
+    "hits": 0,
+    "misses": 0,
+}
+stats_lock = threading.Lock()
+
+# Response headers stored with the body, they describe it and must be sent again on a hit
+CACHED_HEADERS = [NEXT_CURSOR_HEADER]
+
+
+class ResponseCache(LocMemCache):
+    # Local memory cache bounded by the total size of its pickled entries as well as by their number, least recently
+    # used entries are evicted first until the others fit in RESPONSE_CACHE_MAX_SIZE
+
+    def _set(self, key, value, timeout=DEFAULT_TIMEOUT):
+        super()._set(key, value, timeout)
+        # Called with the lock held, the entry just set is the most recently used and is kept
+        size = sum(len(stored) for stored in self._cache.values())
+        while size > settings.RESPONSE_CACHE_MAX_SIZE and len(self._cache) > 1:
+            evicted, stored = self._cache.popitem()
+            del self._expire_info[evicted]
+            size -= len(stored)
+
+
+def count(counter):
+    with stats_lock:
+        stats[counter] += 1
+
+
+def request_digest(request):
+    # Parameters are sorted so the same query in a different order shares an entry
+    params = sorted(request.GET.lists())
+    return hashlib.sha256(repr((request.path, params)).encode('utf-8')).hexdigest()
+
+
+def cache_key(kind, name, version, request):
+    return 'response:{}:{}:{}:{}:{}'.format(kind, hashlib.sha256(name.encode('utf-8')).hexdigest(),
+                                            version[0], version[1].timestamp(), request_digest(request))
+
+
+def cache_response(kind):
+    # Caches successful GET responses of a view taking the dataset name as its first argument
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, name, *args):
+            version = request_version(request, kind, name)
+
+            # Datasets never written through the API have no version to invalidate with
+            if version is None or version[0] == 0:
+                return view(request, name, *args)
+
+            response_cache = caches[settings.RESPONSE_CACHE]
+            key = cache_key(kind, name, version, request)
+            cached = response_cache.get(key)
+            if cached is not None:
+                count("hits")
+                content_type, content, headers = cached
+                response = HttpResponse(content, content_type=content_type, headers=headers)
+                response['X-Cache'] = 'HIT'
+                return response
+
+            count("misses")
+            response = view(request, name, *args)
+            if response.status_code == 200:
+                store(response_cache, key, response)
+            response['X-Cache'] = 'MISS'
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def store(response_cache, key, response):
+    max_size = settings.RESPONSE_CACHE_MAX_ENTRY_SIZE
+    content_type = response['Content-Type']
+    headers = {header: response[header] for header in CACHED_HEADERS if response.has_header(header)}
+
+    if not response.streaming:
+        if len(response.content) <= max_size:
+            response_cache.set(key, (content_type, response.content, headers))
+        return
+
+    # Streamed bodies are collected while they are sent and stored once complete, unless they grow too large
+    def collect(chunks):
+        collected = []
+        size = 0
+        for chunk in chunks:
+            if collected is not None:
+                size += len(chunk)
+                if size <= max_size:
+                    collected.append(chunk)
+                else:
+                    collected = None
+            yield chunk
+        if collected is not None:
+            response_cache.set(key, (content_type, b''.join(collected), headers))
+
+    response.streaming_content = collect(response.streaming_content)
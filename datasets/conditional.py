@@ -0,0 +1,22 @@
+from django.views.decorators.http import condition
+
+from datasets.cache import request_digest
+from datasets.versions import request_version
+
+
+def conditional_get(kind):
+    # Answers If-None-Match and If-Modified-Since from the dataset version alone, so a 304 never reads the data tables
+    def etag(request, name, *args):
+        version = request_version(request, kind, name)
+        if version is None or version[0] == 0:
+            return None
+        # The query string is part of the tag since each filter combination is a different representation
+        return '{}-{}'.format(version[0], request_digest(request)[:16])
+
+    def last_modified(request, name, *args):
+        version = request_version(request, kind, name)
+        if version is None or version[0] == 0:
+            return None
+        return version[1]
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
@@ -0,0 +1,93 @@
+from django.conf import settings
+from django.db import transaction
+
+from datasets.models import Dataset
+from datasets.partitions import create_partition, drop_partition
+from datasets.versions import bump_version, ensure_dataset
+from jobs.worker import run_in_background
+
+
+def delete_dataset(kind, name, exists, purge):
+    # False if there is nothing to delete. exists(name) tests for rows, purge(name) deletes them and returns a count
+    if not getattr(settings, 'SOFT_DELETE', False):
+        with transaction.atomic():
+            if not purge(name):
+                return False
+            bump_version(kind, name)
+        return True
+
+    # Soft delete only marks the dataset, rows are purged after the response is sent
+    if Dataset.objects.filter(kind=kind, name=name, deleted_at__isnull=False).exists() or not exists(name):
+        return False
+
+    with transaction.atomic():
+        bump_version(kind, name, deleted=True)
+        transaction.on_commit(lambda: run_in_background(purge_deleted, kind, name, purge))
+    return True
+
+
+def prepare_dataset(kind, name, purge):
+    # Called before a writing transaction. Creating or dropping a partition locks the whole partitioned table until
+    # commit, every other dataset included, so the old rows of a soft deleted name are purged and the partition is
+    # created here in short transactions of their own instead of for the length of the upload. Returns the dataset if
+    # it was created or revived here, for discard_dataset
+    with transaction.atomic():
+        dataset, created = Dataset.objects.get_or_create(kind=kind, name=name)
+        dataset = Dataset.objects.select_for_update().get(id=dataset.id)
+        revived = dataset.deleted_at is not None
+        if revived:
+            purge(name)
+            Dataset.objects.filter(id=dataset.id).update(deleted_at=None)
+    ensure_dataset(kind, name)
+    return dataset if created or revived else None
+
+
+def discard_dataset(kind, dataset):
+    # Undoes prepare_dataset after a failed upload so the name does not read as an existing empty dataset. A created
+    # dataset is dropped with its partition and a revived one is deleted again, unless an upload wrote to it since
+    if dataset is None:
+        return
+    with transaction.atomic():
+        if not Dataset.objects.select_for_update().filter(
+                id=dataset.id, version=dataset.version, deleted_at__isnull=True).exists():
+            return
+        if dataset.deleted_at is None:
+            drop_partition(kind, dataset.id)
+            Dataset.objects.filter(id=dataset.id).delete()
+        else:
+            Dataset.objects.filter(id=dataset.id).update(deleted_at=dataset.deleted_at)
+
+
+def write_dataset(kind, name, purge, write):
+    # Runs write(), an upload returning its response, between prepare_dataset and discard_dataset if it fails
+    dataset = prepare_dataset(kind, name, purge)
+    try:
+        response = write()
+    except Exception:
+        discard_dataset(kind, dataset)
+        raise
+    if response.status_code != 200:
+        discard_dataset(kind, dataset)
+    return response
+
+
+def open_dataset(kind, name, purge):
+    # Called at the start of a writing transaction after prepare_dataset, returns the dataset id rows are written
+    # under. The row lock orders writers to the same dataset and the background purge. A name deleted again since
+    # prepare_dataset is purged here, and the partition is only created if that dropped it, creating an existing
+    # one does not lock the partitioned table
+    Dataset.objects.bulk_create([Dataset(kind=kind, name=name)], ignore_conflicts=True)
+    dataset_id, deleted_at = Dataset.objects.select_for_update().filter(kind=kind, name=name).values_list(
+        'id', 'deleted_at').get()
+    if deleted_at is not None:
+        purge(name)
+    create_partition(kind, dataset_id)
+    return dataset_id
+
+
+def purge_deleted(kind, name, purge):
+    with transaction.atomic():
+        # Skipped if an upload revived the name since it was deleted
+        if Dataset.objects.select_for_update().filter(kind=kind, name=name, deleted_at__isnull=False).exists():
+            purge(name)
+            Dataset.objects.filter(kind=kind, name=name).update(deleted_at=None)
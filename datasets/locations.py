@@ -0,0 +1,52 @@
+from datasets.models import Location
+
+
+def ensure_locations(keys):
+    # {(country_region, province_state, admin2, combined_key): id} of every key, missing locations are created
+    keys = set(keys)
+    location_ids = find_locations(keys)
+
+    # Uploads mostly repeat known locations, only the new ones are inserted
+    missing = keys - location_ids.keys()
+    if missing:
+        Location.objects.bulk_create([Location(country_region=country_region, province_state=province_state,
+                                               admin2=admin2, combined_key=combined_key)
+                                      for country_region, province_state, admin2, combined_key in missing],
+                                     ignore_conflicts=True)
+        # bulk_create does not return ids on conflict so they are fetched again
+        location_ids.update(find_locations(missing))
+    return location_ids
+
+
+def ensure_location(country_region, province_state, admin2='', combined_key=''):
+    key = (country_region, province_state, admin2, combined_key)
+    return ensure_locations([key])[key]
+
+
+def resolve_locations(countries=None, regions=None, combined_key=None):
+    # Ids of the locations matching the request filters in one query, None when nothing is filtered
+    query = {}
+    if countries is not None:
+        query["country_region__in"] = countries
+    if regions is not None:
+        query["province_state__in"] = regions
+    if combined_key is not None:
+        query["combined_key"] = combined_key
+    if not query:
+        return None
+    return list(Location.objects.filter(**query).values_list('id', flat=True))
+
+
+# **************************************************************************************************** HELPER FUNCTIONS
+
+def find_locations(keys):
+    # Ids of the stored locations among keys in one query
+    if not keys:
+        return {}
+    locations = Location.objects.filter(
+        country_region__in={key[0] for key in keys},
+        province_state__in={key[1] for key in keys},
+        admin2__in={key[2] for key in keys},
+        combined_key__in={key[3] for key in keys},
+    ).values_list('country_region', 'province_state', 'admin2', 'combined_key', 'id')
+    return {location[:4]: location[4] for location in locations if location[:4] in keys}
@@ -0,0 +1,91 @@
+import json
+import random
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+
+from daily_reports.views import get_response_json, get_response_json_columnar
+from time_series.views import gen_response_json, gen_response_json_columnar, group_cases
+
+
+class Command(BaseCommand):
+    help = 'Compares payload size and encode time of the JSON formats on synthetic series and reports, no database used'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--locations', type=int, default=3000)
+        parser.add_argument('--dates', type=int, default=800)
+        parser.add_argument('--reports', type=int, default=100000)
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        dates = [datetime(2020, 1, 22).date() + timedelta(days=day) for day in range(options['dates'])]
+        timeseries_list = [
+            SimpleNamespace(id=index, lat=random.uniform(-90, 90), long=random.uniform(-180, 180),
+                            location=SimpleNamespace(province_state='Region{}'.format(index),
+                                                     country_region='Country{}'.format(index % 200)))
+            for index in range(options['locations'])
+        ]
+        points = [(timeseries.id, date, random.randint(0, 100000)) for timeseries in timeseries_list for date in dates]
+
+        data_type = ['active', 'confirmed', 'deaths', 'recovered']
+        reports = [
+            SimpleNamespace(location=SimpleNamespace(province_state='State{}'.format(index % 50), country_region='US',
+                                                     combined_key='County{}, State{}, US'.format(index, index % 50)),
+                            last_update=datetime(2020, 6, 1) + timedelta(days=index // 3000),
+                            incidence_rate=random.uniform(0, 1000), case_fatality_ratio=random.uniform(0, 10),
+                            active=random.randint(0, 100000), confirmed=random.randint(0, 100000),
+                            deaths=random.randint(0, 1000), recovered=random.randint(0, 1000))
+            for index in range(options['reports'])
+        ]
+        reports_list = SimpleNamespace(iterator=lambda chunk_size: iter(reports))
+
+        formats = [
+            ('time series', 'json stdlib', lambda: stdlib_timeseries(timeseries_list, points)),
+            ('time series', 'json', lambda: gen_response_json(timeseries_list, points)),
+            ('time series', 'json-columnar', lambda: gen_response_json_columnar(timeseries_list, points, dates)),
+            ('daily reports', 'json stdlib', lambda: stdlib_dailyreports(reports, data_type)),
+            ('daily reports', 'json', lambda: get_response_json(reports_list, data_type)),
+            ('daily reports', 'json-columnar', lambda: get_response_json_columnar(reports_list, data_type)),
+        ]
+        for label, format, respond in formats:
+            timings = []
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                size = sum(len(chunk) for chunk in respond())
+                timings.append(time.perf_counter() - start)
+            self.stdout.write('{:<14} {:<14} {:8.3f}s  {:14,} bytes'.format(label, format, min(timings), size))
+
+
+# **************************************************************************************************** HELPER FUNCTIONS
+
+def stdlib_timeseries(timeseries_list, points):
+    # The documents gen_response_json built with json and DjangoJSONEncoder before orjson
+    for index, (timeseries, cases) in enumerate(group_cases(timeseries_list, points)):
+        row = {
+            "Province/State": timeseries.location.province_state,
+            "Country/Region": timeseries.location.country_region,
+            "Lat": timeseries.lat,
+            "Long": timeseries.long,
+        }
+        for date in sorted(cases):
+            row[date.strftime("%m/%d/%y")] = cases[date]
+        yield '{}"{}": {}'.format(', ' if index else '', index, json.dumps(row, cls=DjangoJSONEncoder))
+
+
+def stdlib_dailyreports(reports, data_type):
+    # The documents get_response_json built with json and DjangoJSONEncoder before orjson
+    for index, dailyreport in enumerate(reports):
+        row = {
+            'Province_State': dailyreport.location.province_state,
+            'Country_Region': dailyreport.location.country_region,
+            'Last_Update': dailyreport.last_update.strftime("%Y-%m-%d %H:%M:%S"),
+            'Combined_Key': dailyreport.location.combined_key,
+            'Incidence_Rate': dailyreport.incidence_rate,
+            'Case-Fatality_Ratio': dailyreport.case_fatality_ratio,
+        }
+        for x in data_type:
+            row[x.title()] = getattr(dailyreport, x)
+        yield '{}"{}": {}'.format(', ' if index else '', index, json.dumps(row, cls=DjangoJSONEncoder))
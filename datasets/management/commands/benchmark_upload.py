@@ -0,0 +1,59 @@
+import random
+import time
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from django.test.utils import override_settings
+
+from daily_reports.views import dailyreports, purge_dailyreports
+from time_series.views import purge_timeseries, timeseries
+
+
+class Command(BaseCommand):
+    help = 'Compares upload throughput of the COPY and bulk_create loaders on synthetic time series and daily reports'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--locations', type=int, default=1000)
+        parser.add_argument('--dates', type=int, default=500)
+        parser.add_argument('--reports', type=int, default=100000)
+        parser.add_argument('--name', default='benchmark_upload')
+
+    def handle(self, *args, **options):
+        dates = [datetime(2020, 1, 22) + timedelta(days=day) for day in range(options['dates'])]
+        timeseries_body = '\n'.join(
+            ['Province/State,Country/Region,Lat,Long,' + ','.join(date.strftime('%m/%d/%y') for date in dates)] +
+            ['Region{},Country{},10.0,10.0,'.format(index, index % 200) +
+             ','.join(str(random.randint(0, 100000)) for _ in dates)
+             for index in range(options['locations'])])
+        dailyreports_body = '\n'.join(
+            ['FIPS,Admin2,Province_State,Country_Region,Last_Update,Lat,Long_,Confirmed,Deaths,Recovered,Active,'
+             'Combined_Key,Incidence_Rate,Case-Fatality_Ratio'] +
+            ['{0},County{0},State{1},US,{2},10.0,10.0,{3},1,0,0,"County{0}, State{1}, US",1.5,0.5'.format(
+                index % 3000, index % 50, (datetime(2020, 6, 1) + timedelta(days=index // 3000)).strftime(
+                    '%Y-%m-%d %H:%M:%S'), random.randint(0, 100000))
+             for index in range(options['reports'])])
+
+        uploads = [
+            ('time series', options['locations'] * options['dates'], purge_timeseries,
+             lambda name: timeseries(RequestFactory().post('/time_series/{}/deaths'.format(name), timeseries_body,
+                                                           content_type='application/csv'), name, 'deaths')),
+            ('daily reports', options['reports'], purge_dailyreports,
+             lambda name: dailyreports(RequestFactory().post('/daily_reports/{}'.format(name), dailyreports_body,
+                                                             content_type='application/csv'), name)),
+        ]
+
+        for label, rows, purge, post in uploads:
+            results = {}
+            for loader, copy in [('bulk_create', False), ('COPY', True)]:
+                name = '{}_{}'.format(options['name'], loader)
+                try:
+                    with override_settings(BULK_LOAD_COPY=copy):
+                        start = time.perf_counter()
+                        response = post(name)
+                        results[loader] = time.perf_counter() - start
+                finally:
+                    purge(name)
+                self.stdout.write('{:<14} {:<12} status {}  {:8.2f}s  {:10,.0f} rows/s'.format(
+                    label, loader, response.status_code, results[loader], rows / results[loader]))
+            self.stdout.write('{:<14} speedup      {:8.1f}x'.format(label, results['bulk_create'] / results['COPY']))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from daily_reports.views import purge_dailyreports
+from datasets.deletion import purge_deleted
+from datasets.models import Dataset
+from time_series.views import purge_timeseries
+
+PURGES = {
+    Dataset.KindChoice.TIME_SERIES: purge_timeseries,
+    Dataset.KindChoice.DAILY_REPORTS: purge_dailyreports,
+}
+
+
+class Command(BaseCommand):
+    help = 'Purges soft deleted datasets whose background purge did not run, e.g. after a restart'
+
+    def handle(self, *args, **options):
+        deleted = list(Dataset.objects.filter(deleted_at__isnull=False).values_list('kind', 'name'))
+        for kind, name in deleted:
+            purge_deleted(kind, name, PURGES[kind])
+            self.stdout.write('purged {} {}'.format(Dataset.KindChoice(kind).label, name))
@@ -0,0 +1,27 @@
+# Generated by Django 4.1.13 on 2026-10-18 14:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datasets', '0002_dataset_deleted_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Location',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('country_region', models.CharField(max_length=1000)),
+                ('province_state', models.CharField(max_length=1000)),
+                ('admin2', models.CharField(blank=True, default='', max_length=1000)),
+                ('combined_key', models.CharField(blank=True, default='', max_length=1000)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='location',
+            constraint=models.UniqueConstraint(fields=('country_region', 'province_state', 'admin2', 'combined_key'), name='location_natural_key'),
+        ),
+    ]
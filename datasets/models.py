@@ -0,0 +1,45 @@
+from django.db import models
+
+
+class Dataset(models.Model):
+    class KindChoice(models.TextChoices):
+        TIME_SERIES = 'T'
+        DAILY_REPORTS = 'D'
+
+    kind = models.CharField(max_length=1, choices=KindChoice.choices)
+    name = models.CharField(max_length=1000)
+
+    # Bumped by every write to the dataset, cached responses are keyed on it
+    version = models.PositiveBigIntegerField(default=0)
+    last_modified = models.DateTimeField(auto_now=True)
+
+    # Set by a soft delete, the dataset reads as empty until its rows are purged in the background
+    deleted_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'name'], name='dataset_kind_name'),
+        ]
+
+    def __str__(self):
+        return "kind: {}, name: {}, version: {}".format(self.kind, self.name, self.version)
+
+
+class Location(models.Model):
+    # Shared by every dataset of both kinds, rows reference it by id instead of repeating the names.
+    # Time series locations leave admin2 and combined_key empty
+    country_region = models.CharField(max_length=1000)
+    province_state = models.CharField(max_length=1000)
+    admin2 = models.CharField(max_length=1000, blank=True, default='')
+    combined_key = models.CharField(max_length=1000, blank=True, default='')
+
+    class Meta:
+        constraints = [
+            # Country first so the index also serves filters on countries alone
+            models.UniqueConstraint(fields=['country_region', 'province_state', 'admin2', 'combined_key'],
+                                    name='location_natural_key'),
+        ]
+
+    def __str__(self):
+        return "country_region: {}, province_state: {}, admin2: {}, combined_key: {}".format(
+            self.country_region, self.province_state, self.admin2, self.combined_key)
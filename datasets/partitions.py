@@ -0,0 +1,109 @@
+from django.db import connection
+
+from datasets.models import Dataset
+
+# Tables list-partitioned by dataset on PostgreSQL, other databases keep them as plain tables
+PARTITIONED_TABLES = {
+    Dataset.KindChoice.TIME_SERIES: 'time_series_timeseriesdata',
+    Dataset.KindChoice.DAILY_REPORTS: 'daily_reports_dailyreports',
+}
+
+
+def partitioned():
+    return connection.vendor == 'postgresql'
+
+
+def partition_name(kind, dataset_id):
+    return table_partition_name(PARTITIONED_TABLES[kind], dataset_id)
+
+
+def table_partition_name(table, dataset_id):
+    return '{}_{}'.format(table, int(dataset_id))
+
+
+def create_partition(kind, dataset_id):
+    if not partitioned():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('CREATE TABLE IF NOT EXISTS {} PARTITION OF {} FOR VALUES IN ({})'.format(
+            connection.ops.quote_name(partition_name(kind, dataset_id)),
+            connection.ops.quote_name(PARTITIONED_TABLES[kind]),
+            int(dataset_id)))
+
+
+def drop_partition(kind, dataset_id):
+    # Dropping a partition detaches it, the rows go without being scanned
+    if not partitioned():
+        return
+    with connection.cursor() as cursor:
+        # Foreign key checks of rows written earlier in the transaction must run before their table goes,
+        # Django declares every foreign key deferred so they are deferred again after
+        cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+        cursor.execute('DROP TABLE IF EXISTS {}'.format(connection.ops.quote_name(partition_name(kind, dataset_id))))
+        cursor.execute('SET CONSTRAINTS ALL DEFERRED')
+
+
+# **************************************************************************************************** MIGRATIONS
+
+def table_definitions(cursor, table):
+    # Constraints and indexes of table as SQL that can be replayed on a table of the same name
+    cursor.execute("""
+        SELECT conname, contype, pg_get_constraintdef(oid) FROM pg_constraint
+        WHERE conrelid = %s::regclass AND contype IN ('p', 'u', 'f', 'c') ORDER BY conname
+    """, [table])
+    constraints = cursor.fetchall()
+
+    # Indexes backing a constraint are recreated with it
+    cursor.execute("""
+        SELECT indexdef FROM pg_indexes WHERE tablename = %s
+        AND indexname NOT IN (SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass)
+    """, [table, table])
+    indexes = [indexdef for indexdef, in cursor.fetchall()]
+
+    return constraints, indexes
+
+
+def rebuild_table(schema_editor, table, partition):
+    # Recreates table as a table partitioned by dataset_id or back as a plain one, rows are copied across
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    quote_name = schema_editor.connection.ops.quote_name
+    old_table = table + '_old'
+
+    with schema_editor.connection.cursor() as cursor:
+        constraints, indexes = table_definitions(cursor, table)
+
+        cursor.execute('ALTER TABLE {} RENAME TO {}'.format(quote_name(table), quote_name(old_table)))
+        cursor.execute('CREATE TABLE {} (LIKE {} INCLUDING DEFAULTS INCLUDING IDENTITY){}'.format(
+            quote_name(table), quote_name(old_table), ' PARTITION BY LIST (dataset_id)' if partition else ''))
+
+        if partition:
+            cursor.execute('SELECT DISTINCT dataset_id FROM {}'.format(quote_name(old_table)))
+            for dataset_id, in cursor.fetchall():
+                cursor.execute('CREATE TABLE {} PARTITION OF {} FOR VALUES IN ({})'.format(
+                    quote_name(table_partition_name(table, dataset_id)), quote_name(table), int(dataset_id)))
+
+        cursor.execute('INSERT INTO {} SELECT * FROM {}'.format(quote_name(table), quote_name(old_table)))
+        cursor.execute("SELECT setval(pg_get_serial_sequence(%s, 'id'), COALESCE(MAX(id), 0) + 1, false) FROM {}"
+                       .format(quote_name(table)), [table])
+
+        # Partitions go with the partitioned table
+        cursor.execute('DROP TABLE {} CASCADE'.format(quote_name(old_table)))
+
+        # Keys of a partitioned table must contain the partition key, unique constraints already start with it
+        for name, contype, definition in constraints:
+            if contype == 'p':
+                definition = 'PRIMARY KEY (id, dataset_id)' if partition else 'PRIMARY KEY (id)'
+            cursor.execute('ALTER TABLE {} ADD CONSTRAINT {} {}'.format(quote_name(table), quote_name(name),
+                                                                        definition))
+        for indexdef in indexes:
+            cursor.execute(indexdef)
+
+
+def partition_table(table):
+    return lambda apps, schema_editor: rebuild_table(schema_editor, table, partition=True)
+
+
+def unpartition_table(table):
+    return lambda apps, schema_editor: rebuild_table(schema_editor, table, partition=False)
@@ -0,0 +1,423 @@
+from io import StringIO
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection, connections
+from django.db.utils import OperationalError
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from covidAPI.testing import DAILYREPORTS_BODY, TIMESERIES_BODY, QueryPlanMixin
+
+from daily_reports.models import DailyReports
+from time_series.models import TimeSeries, TimeSeriesData
+from time_series.views import ingest_timeseries, parse_post_params
+from .models import Dataset
+from .partitions import partition_name, rebuild_table
+
+
+class DatasetsResponseCache(TestCase):
+
+    def setUp(self):
+        caches[settings.RESPONSE_CACHE].clear()
+
+    def test_version_bumped_on_write(self):
+        self.client.post('/time_series/test1/deaths', TIMESERIES_BODY, content_type='application/csv')
+        self.client.post('/time_series/test1/deaths', TIMESERIES_BODY, content_type='application/csv')
+        self.assertEqual(Dataset.objects.get(kind=Dataset.KindChoice.TIME_SERIES, name='test1').version, 2)
+
+        self.client.delete('/time_series/test1')
+        self.assertEqual(Dataset.objects.get(kind=Dataset.KindChoice.TIME_SERIES, name='test1').version, 3)
+
+    def test_timeseries_hit(self):
+        self.client.post('/time_series/test1/deaths', TIMESERIES_BODY, content_type='application/csv')
+
+        response = self.client.get('/time_series/test1/deaths')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        content = response.getvalue()
+
+        # The version lookup is the only query of a hit
+        with self.assertNumQueries(1):
+            response = self.client.get('/time_series/test1/deaths')
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(response.content, content)
+        self.assertEqual(response['Content-Type'], 'application/csv')
+
+    def test_timeseries_params_order(self):
+        self.client.post('/time_series/test1/deaths', TIMESERIES_BODY, content_type='application/csv')
+
+        response = self.client.get('/time_series/test1/deaths?country=Afghanistan&format=json')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        response.getvalue()
+        response = self.client.get('/time_series/test1/deaths?format=json&country=Afghanistan')
+        self.assertEqual(response['X-Cache'], 'HIT')
+        response = self.client.get('/time_series/test1/deaths?format=json')
+        self.assertEqual(response['X-Cache'], 'MISS')
+
+    def test_timeseries_hit_paginated(self):
+        # a page served from the cache still points at the next one
+        self.client.post('/time_series/test1/deaths', TIMESERIES_BODY, content_type='application/csv')
+
+        response = self.client.get('/time_series/test1/deaths', {'limit': 1})
+        self.assertEqual(response['X-Cache'], 'MISS')
+        first = response.getvalue().decode('utf-8')
+        response = self.client.get('/time_series/test1/deaths', {'limit': 1})
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(response.content.decode('utf-8'), first)
+
+        response = self.client.get('/time_series/test1/deaths', {'limit': 1, 'after': response['X-Next-Cursor']})
+        second = response.getvalue().decode('utf-8')
+        self.assertFalse(response.has_header('X-Next-Cursor'))
+        self.assertEqual(sorted(['Afghanistan' in first, 'Afghanistan' in second]), [False, True])
+        self.assertEqual(sorted(['Australia' in first, 'Australia' in second]), [False, True])
+
+    def test_timeseries_invalidated_by_post(self):
+        self.client.post('/time_series/test1/deaths', TIMESERIES_BODY, content_type='application/csv')
+        self.client.get('/time_series/test1/deaths').getvalue()
+
+        self.client.post('/time_series/test1/deaths', TIMESERIES_BODY.replace('0,0\n', '5,7\n', 1),
+                         content_type='application/csv')
+        response = self.client.get('/time_series/test1/deaths')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertIn('5,7', response.getvalue().decode('utf-8'))
+
+    def test_timeseries_invalidated_by_delete(self):
+        self.client.post('/time_series/test1/deaths', TIMESERIES_BODY, content_type='application/csv')
+        self.client.get('/time_series/test1/deaths').getvalue()
+
+        self.client.delete('/time_series/test1')
+        response = self.client.get('/time_series/test1/deaths')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertNotIn('Afghanistan', response.getvalue().decode('utf-8'))
+
+    def test_errors_not_cached(self):
+        self.client.post('/time_series/test1/deaths', TIMESERIES_BODY, content_type='application/csv')
+        self.client.get('/time_series/test1/deaths?format=xml')
+        response = self.client.get('/time_series/test1/deaths?format=xml')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response['X-Cache'], 'MISS')
+
+    def test_dailyreports_hit_and_invalidate(self):
+        self.client.post('/daily_reports/test1', DAILYREPORTS_BODY, content_type='application/csv')
+
+        response = self.client.get('/daily_reports/test1?format=json')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        content = response.getvalue()
+        response = self.client.get('/daily_reports/test1?format=json')
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(response.content, content)
+
+        self.client.delete('/daily_reports/test1')
+        response = self.client.get('/daily_reports/test1?format=json')
+        self.assertEqual(response['X-Cache'], 'MISS')
+
+    def test_unversioned_not_cached(self):
+        response = self.client.get('/time_series/test1/deaths')
+        self.assertNotIn('X-Cache', response)
+
+    def test_stats(self):
+        before = self.client.get('/datasets/cache').json()
+
+        self.client.post('/time_series/test1/deaths', TIMESERIES_BODY, content_type='application/csv')
+        self.client.get('/time_series/test1/deaths').getvalue()
+        self.client.get('/time_series/test1/deaths')
+
+        after = self.client.get('/datasets/cache').json()
+        self.assertEqual(after['hits'] - before['hits'], 1)
+        self.assertEqual(after['misses'] - before['misses'], 1)
+        self.assertEqual(after['entries'], 1)
+        self.assertGreater(after['hit_rate'], 0)
+
+    def test_max_size(self):
+        # entries are evicted least recently used first once their total size exceeds the budget
+        self.client.post('/time_series/test1/deaths', TIMESERIES_BODY, content_type='application/csv')
+        response_cache = caches[settings.RESPONSE_CACHE]
+        self.client.get('/time_series/test1/deaths').getvalue()
+        size = sum(len(stored) for stored in response_cache._cache.values())
+
+        with override_settings(RESPONSE_CACHE_MAX_SIZE=size + 1):
+            self.client.get('/time_series/test1/deaths?format=json').getvalue()
+            self.assertEqual(len(response_cache._cache), 1)
+            self.assertEqual(self.client.get('/time_series/test1/deaths?format=json')['X-Cache'], 'HIT')
+            self.assertEqual(self.client.get('/time_series/test1/deaths')['X-Cache'], 'MISS')
+
+
+class DatasetsConditionalGet(TestCase):
+
+    def setUp(self):
+        caches[settings.RESPONSE_CACHE].clear()
+        self.client.post('/time_series/test1/deaths', TIMESERIES_BODY, content_type='application/csv')
+
+    def test_headers(self):
+        response = self.client.get('/time_series/test1/deaths')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('ETag', response)
+        self.assertIn('Last-Modified', response)
+
+        # Each filter combination is tagged separately
+        other = self.client.get('/time_series/test1/deaths?format=json')
+        self.assertNotEqual(response['ETag'], other['ETag'])
+
+    def test_if_none_match(self):
+        etag = self.client.get('/time_series/test1/deaths')['ETag']
+
+        # The version lookup is the only query of a 304
+        with self.assertNumQueries(1):
+            response = self.client.get('/time_series/test1/deaths', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_if_modified_since(self):
+        last_modified = self.client.get('/time_series/test1/deaths')['Last-Modified']
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/time_series/test1/deaths', HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_changed_after_write(self):
+        etag = self.client.get('/time_series/test1/deaths')['ETag']
+
+        self.client.post('/time_series/test1/deaths', TIMESERIES_BODY, content_type='application/csv')
+        response = self.client.get('/time_series/test1/deaths', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_dailyreports(self):
+        self.client.post('/daily_reports/test1', DAILYREPORTS_BODY, content_type='application/csv')
+        etag = self.client.get('/daily_reports/test1')['ETag']
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/daily_reports/test1', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_unversioned(self):
+        response = self.client.get('/daily_reports/test2')
+        self.assertNotIn('ETag', response)
+        self.assertNotIn('Last-Modified', response)
+
+
+@override_settings(SOFT_DELETE=True, JOBS_RUN_INLINE=True)
+class DatasetsSoftDelete(TestCase):
+
+    def setUp(self):
+        caches[settings.RESPONSE_CACHE].clear()
+        self.client.post('/time_series/test1/deaths', TIMESERIES_BODY, content_type='application/csv')
+        self.client.post('/daily_reports/test1', DAILYREPORTS_BODY, content_type='application/csv')
+
+    def test_delete_marks(self):
+        # the purge is scheduled on commit, rows stay until it runs
+        response = self.client.delete('/time_series/test1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(TimeSeriesData.objects.filter(timeseries__data_type='D').count(), 4)
+        self.assertIsNotNone(Dataset.objects.get(kind=Dataset.KindChoice.TIME_SERIES, name='test1').deleted_at)
+
+        # deleted datasets read as empty and cannot be deleted again
+        response = self.client.get('/time_series/test1/deaths')
+        self.assertNotIn('Afghanistan', response.getvalue().decode('utf-8'))
+        response = self.client.get('/time_series/test1/deaths?format=json')
+        self.assertEqual(response.getvalue(), b'{}')
+        self.assertEqual(self.client.delete('/time_series/test1').status_code, 404)
+
+        self.client.delete('/daily_reports/test1')
+        self.assertEqual(DailyReports.objects.count(), 1)
+        response = self.client.get('/daily_reports/test1?format=json')
+        self.assertEqual(response.getvalue(), b'{}')
+
+    def test_delete_purges(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete('/time_series/test1')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete('/daily_reports/test1')
+
+        self.assertEqual(TimeSeries.objects.count(), 0)
+        self.assertEqual(TimeSeriesData.objects.count(), 0)
+        self.assertEqual(DailyReports.objects.count(), 0)
+        self.assertFalse(Dataset.objects.filter(deleted_at__isnull=False).exists())
+        self.assertEqual(self.client.delete('/time_series/test1').status_code, 404)
+
+    def test_post_after_delete(self):
+        # old rows are purged before the upload so they are not revived
+        self.client.delete('/time_series/test1')
+        self.client.post('/time_series/test1/deaths', """Province/State,Country/Region,Lat,Long,1/24/20
+                         BC,Canada,49.2827,123.1207,5""", content_type='application/csv')
+
+        self.assertEqual(TimeSeriesData.objects.filter(timeseries__data_type='D').count(), 1)
+        self.assertIsNone(Dataset.objects.get(kind=Dataset.KindChoice.TIME_SERIES, name='test1').deleted_at)
+        self.assertIn('01/24/20', self.client.get('/time_series/test1/deaths').getvalue().decode('utf-8'))
+
+    def test_failed_post_after_delete(self):
+        # a rejected upload leaves the name deleted
+        self.client.delete('/time_series/test1')
+        response = self.client.post('/time_series/test1/deaths', """Province/State,Country/Region,Lat,Long,1/24/20
+                                    BC,Canada,49.2827,123.1207,x""", content_type='application/csv')
+        self.assertEqual(response.status_code, 400)
+
+        self.assertIsNotNone(Dataset.objects.get(kind=Dataset.KindChoice.TIME_SERIES, name='test1').deleted_at)
+        self.assertEqual(self.client.get('/time_series/test1/deaths?format=json').getvalue(), b'{}')
+        self.assertEqual(self.client.delete('/time_series/test1').status_code, 404)
+
+    def test_purge_command(self):
+        self.client.delete('/time_series/test1')
+        self.client.delete('/daily_reports/test1')
+
+        call_command('purge_deleted_datasets', stdout=StringIO())
+        self.assertEqual(TimeSeriesData.objects.count(), 0)
+        self.assertEqual(DailyReports.objects.count(), 0)
+        self.assertFalse(Dataset.objects.filter(deleted_at__isnull=False).exists())
+
+
+class DatasetsPartitions(QueryPlanMixin, TestCase):
+
+    def setUp(self):
+        if connection.vendor != 'postgresql':
+            self.skipTest('Partitions only exist on PostgreSQL')
+        caches[settings.RESPONSE_CACHE].clear()
+        self.client.post('/time_series/test1/deaths', TIMESERIES_BODY, content_type='application/csv')
+        self.client.post('/time_series/test1/confirmed', TIMESERIES_BODY, content_type='application/csv')
+        self.client.post('/time_series/test2/deaths', TIMESERIES_BODY, content_type='application/csv')
+        self.client.post('/daily_reports/test1', DAILYREPORTS_BODY, content_type='application/csv')
+        self.client.post('/daily_reports/test2', DAILYREPORTS_BODY, content_type='application/csv')
+
+    def partition(self, kind, name):
+        return partition_name(kind, Dataset.objects.get(kind=kind, name=name).id)
+
+    def partitions(self):
+        # Django's introspection leaves partitions out
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT relname FROM pg_class WHERE relispartition AND relkind = 'r'")
+            return {relname for relname, in cursor.fetchall()}
+
+    def test_created_on_post(self):
+        self.assertEqual(len(self.partitions()), 4)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM {}'.format(self.partition(Dataset.KindChoice.TIME_SERIES, 'test1')))
+            # deaths, confirmed and the active points computed from them
+            self.assertEqual(cursor.fetchone()[0], 12)
+
+    def test_reads_pruned(self):
+        partition = self.partition(Dataset.KindChoice.TIME_SERIES, 'test1')
+        for data_type in ['deaths', 'active']:
+            self.assertPrunedTo(lambda: self.client.get('/time_series/test1/' + data_type).getvalue(),
+                                'time_series_timeseriesdata', partition)
+
+        self.assertPrunedTo(lambda: self.client.get('/daily_reports/test1').getvalue(),
+                            'daily_reports_dailyreports', self.partition(Dataset.KindChoice.DAILY_REPORTS, 'test1'))
+
+    def test_dropped_on_delete(self):
+        partition = self.partition(Dataset.KindChoice.TIME_SERIES, 'test1')
+        self.assertEqual(self.client.delete('/time_series/test1').status_code, 200)
+        self.assertEqual(self.client.delete('/daily_reports/test1').status_code, 200)
+        self.assertEqual(len(self.partitions()), 2)
+        self.assertEqual(TimeSeriesData.objects.count(), 8)
+        self.assertEqual(DailyReports.objects.count(), 1)
+
+        # a later upload under the same name gets a new partition
+        self.client.post('/time_series/test1/deaths', TIMESERIES_BODY, content_type='application/csv')
+        self.assertIn(partition, self.partitions())
+        self.assertEqual(TimeSeriesData.objects.count(), 16)
+
+    def test_dropped_on_failed_upload(self):
+        # a rejected upload to a new name leaves neither a dataset nor a partition behind
+        partitions = self.partitions()
+        response = self.client.post('/time_series/test3/deaths', TIMESERIES_BODY.replace('0,0\n', '0,x\n', 1),
+                                    content_type='application/csv')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post('/daily_reports/test3', DAILYREPORTS_BODY.replace('02:33:00', 'x'),
+                                    content_type='application/csv')
+        self.assertEqual(response.status_code, 400)
+
+        self.assertFalse(Dataset.objects.filter(name='test3').exists())
+        self.assertEqual(self.partitions(), partitions)
+
+        # existing datasets are kept
+        response = self.client.post('/time_series/test1/deaths', TIMESERIES_BODY.replace('0,0\n', '0,x\n', 1),
+                                    content_type='application/csv')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.partitions(), partitions)
+        self.assertEqual(TimeSeriesData.objects.count(), 20)
+
+    @override_settings(SOFT_DELETE=True, JOBS_RUN_INLINE=True)
+    def test_dropped_on_purge(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete('/daily_reports/test1')
+        self.assertNotIn(self.partition(Dataset.KindChoice.DAILY_REPORTS, 'test1'), self.partitions())
+
+    def test_rebuild_table(self):
+        # the migrations convert existing tables in both directions
+        with connection.cursor() as cursor:
+            cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+        with connection.schema_editor() as schema_editor:
+            rebuild_table(schema_editor, 'time_series_timeseriesdata', partition=False)
+        self.assertEqual(len(self.partitions()), 2)
+        self.assertEqual(TimeSeriesData.objects.count(), 20)
+
+        with connection.schema_editor() as schema_editor:
+            rebuild_table(schema_editor, 'time_series_timeseriesdata', partition=True)
+        self.assertEqual(len(self.partitions()), 4)
+        self.assertEqual(TimeSeriesData.objects.count(), 20)
+
+        # keys still work for upserts and new ids do not collide
+        self.client.post('/time_series/test1/deaths', TIMESERIES_BODY.replace('1/23/20', '1/24/20'),
+                         content_type='application/csv')
+        self.assertEqual(TimeSeriesData.objects.count(), 24)
+        self.assertEqual(TimeSeriesData.objects.values('id').distinct().count(), 24)
+
+
+class ProbedUpload:
+    # Upload body whose header is read before the upload transaction and whose rows are read inside it, probe() runs
+    # in between
+    def __init__(self, body, probe):
+        header, rows = body.split('\n', 1)
+        self.chunks = [header.encode() + b'\n', rows.encode()]
+        self.probe = probe
+        self.probed = None
+
+    def read(self, size):
+        if len(self.chunks) == 1:
+            self.probed = self.probe()
+        return self.chunks.pop(0) if self.chunks else b''
+
+
+class DatasetsPartitionLocks(TransactionTestCase):
+    # Creating or dropping a partition locks the partitioned table until commit, uploads must not hold that lock
+    # while they write
+
+    def setUp(self):
+        if connection.vendor != 'postgresql':
+            self.skipTest('Partitions only exist on PostgreSQL')
+        self.client.post('/time_series/other/deaths', TIMESERIES_BODY, content_type='application/csv')
+        self.other_id = Dataset.objects.get(kind=Dataset.KindChoice.TIME_SERIES, name='other').id
+
+    def read_other(self):
+        # Rows of the other dataset read from a second connection, failing instead of waiting on a lock
+        other = connections.create_connection('default')
+        try:
+            with other.cursor() as cursor:
+                cursor.execute("SET lock_timeout = '1s'")
+                cursor.execute('SELECT COUNT(*) FROM time_series_timeseriesdata WHERE dataset_id = %s', [self.other_id])
+                return cursor.fetchone()[0]
+        except OperationalError as error:
+            return error
+        finally:
+            other.close()
+
+    def upload(self, name):
+        params = {**parse_post_params(name, 'deaths'), "mode": "merge"}
+        upload = ProbedUpload(TIMESERIES_BODY, self.read_other)
+        self.assertEqual(ingest_timeseries(upload, params).status_code, 200)
+        return upload.probed
+
+    def test_new_dataset_does_not_block_reads(self):
+        expected = TimeSeriesData.objects.filter(dataset_id=self.other_id).count()
+        self.assertEqual(self.upload('new'), expected)
+
+    def test_revived_dataset_does_not_block_reads(self):
+        # the old rows of a soft deleted name are purged, dropping its partition, before the upload transaction
+        self.client.post('/time_series/new/confirmed', TIMESERIES_BODY, content_type='application/csv')
+        Dataset.objects.filter(kind=Dataset.KindChoice.TIME_SERIES, name='new').update(deleted_at=timezone.now())
+
+        expected = TimeSeriesData.objects.filter(dataset_id=self.other_id).count()
+        self.assertEqual(self.upload('new'), expected)
+        self.assertFalse(TimeSeries.objects.filter(dataset__name='new', data_type='C').exists())
+        self.assertIsNone(Dataset.objects.get(kind=Dataset.KindChoice.TIME_SERIES, name='new').deleted_at)
@@ -0,0 +1,47 @@
+from django.db.models import F
+from django.utils import timezone
+
+from datasets.models import Dataset
+from datasets.partitions import create_partition
+
+
+def bump_version(kind, name, deleted=False):
+    # Called inside the writing transaction so the new version becomes visible together with the data
+    now = timezone.now()
+    Dataset.objects.bulk_create([Dataset(kind=kind, name=name)], ignore_conflicts=True)
+    Dataset.objects.filter(kind=kind, name=name).update(version=F('version') + 1, last_modified=now,
+                                                        deleted_at=now if deleted else None)
+
+
+def ensure_dataset(kind, name):
+    # Id of the dataset, created together with its partitions on first use
+    Dataset.objects.bulk_create([Dataset(kind=kind, name=name)], ignore_conflicts=True)
+    dataset_id = Dataset.objects.filter(kind=kind, name=name).values_list('id', flat=True).get()
+    create_partition(kind, dataset_id)
+    return dataset_id
+
+
+def get_version(kind, name):
+    # (version, last_modified, deleted_at, id) of a dataset or None, version 0 was only written outside the API
+    return Dataset.objects.filter(kind=kind, name=name).values_list(
+        'version', 'last_modified', 'deleted_at', 'id').first()
+
+
+def request_version(request, kind, name):
+    # Looked up once per request, shared by the conditional GET and response cache decorators
+    versions = request.__dict__.setdefault('_dataset_versions', {})
+    if (kind, name) not in versions:
+        versions[(kind, name)] = get_version(kind, name)
+    return versions[(kind, name)]
+
+
+def request_dataset_id(request, kind, name):
+    # None when no row of the dataset can exist, every data row references its dataset
+    version = request_version(request, kind, name)
+    return version[3] if version is not None else None
+
+
+def is_deleted(request, kind, name):
+    # Soft deleted and not yet purged
+    version = request_version(request, kind, name)
+    return version is not None and version[2] is not None
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse, JsonResponse
+
+from datasets.cache import stats, stats_lock
+
+
+def cache(request):
+    if request.method == 'GET':
+        return cache_get(request)
+    return HttpResponse('Internal server error', status=500)
+
+
+def cache_get(request):
+    with stats_lock:
+        data = dict(stats)
+
+    lookups = data["hits"] + data["misses"]
+    data["hit_rate"] = data["hits"] / lookups if lookups else None
+
+    # Only the local memory backend exposes its entry count
+    response_cache = caches[settings.RESPONSE_CACHE]
+    data["entries"] = len(response_cache._cache) if hasattr(response_cache, '_cache') else None
+
+    return JsonResponse(data)
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from jobs.models import Job
+from jobs.worker import fail_abandoned
+
+
+class Command(BaseCommand):
+    help = 'Fails queued or running jobs whose worker stopped, e.g. after a restart'
+
+    def handle(self, *args, **options):
+        failed = fail_abandoned(Job.objects.all())
+        self.stdout.write('failed {} jobs'.format(failed))
@@ -0,0 +1,30 @@
+# Generated by Django 4.1.13 on 2026-10-18 09:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('T', 'Time Series'), ('D', 'Daily Reports')], max_length=1)),
+                ('name', models.CharField(max_length=1000)),
+                ('data_type', models.CharField(blank=True, max_length=1)),
+                ('status', models.CharField(choices=[('Q', 'Queued'), ('R', 'Running'), ('S', 'Succeeded'), ('F', 'Failed')], default='Q', max_length=1)),
+                ('message', models.CharField(blank=True, max_length=1000)),
+                ('total_rows', models.IntegerField(default=0)),
+                ('rows_processed', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(null=True)),
+                ('finished_at', models.DateTimeField(null=True)),
+            ],
+        ),
+    ]
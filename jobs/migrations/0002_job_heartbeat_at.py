@@ -0,0 +1,26 @@
+# Generated by Django 4.1.13 on 2026-10-18 11:19
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def start_heartbeats(apps, schema_editor):
+    # Jobs left unfinished by earlier versions never get a heartbeat, they are failed once it times out
+    Job = apps.get_model('jobs', 'Job')
+    Job.objects.filter(status__in=['Q', 'R']).update(heartbeat_at=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='heartbeat_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.RunPython(start_heartbeats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+from django.db import models
+
+
+class Job(models.Model):
+    class KindChoice(models.TextChoices):
+        TIME_SERIES = 'T'
+        DAILY_REPORTS = 'D'
+
+    class StatusChoice(models.TextChoices):
+        QUEUED = 'Q'
+        RUNNING = 'R'
+        SUCCEEDED = 'S'
+        FAILED = 'F'
+
+    kind = models.CharField(max_length=1, choices=KindChoice.choices)
+    name = models.CharField(max_length=1000)
+    data_type = models.CharField(max_length=1, blank=True)
+    status = models.CharField(max_length=1, choices=StatusChoice.choices, default=StatusChoice.QUEUED)
+    message = models.CharField(max_length=1000, blank=True)
+
+    # total_rows is counted while the body is spooled, quoted newlines can make it an overestimate
+    total_rows = models.IntegerField(default=0)
+    rows_processed = models.IntegerField(default=0)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True)
+    finished_at = models.DateTimeField(null=True)
+    # Refreshed while the worker process holding the job is alive, null for jobs run inline within their request
+    heartbeat_at = models.DateTimeField(null=True)
+
+    def __str__(self):
+        return "kind: {}, name: {}, status: {}".format(self.kind, self.name, self.status)
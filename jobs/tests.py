@@ -0,0 +1,143 @@
+import gzip
+import time
+from datetime import timedelta
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from covidAPI.testing import DAILYREPORTS_BODY, TIMESERIES_BODY
+from daily_reports.models import DailyReports
+from time_series.models import TimeSeriesData
+from . import worker
+from .models import Job
+
+
+@override_settings(JOBS_RUN_INLINE=True)
+class JobsViewsInline(TestCase):
+
+    def test_timeseries_async(self):
+        response = self.client.post('/time_series/abc/deaths?async=true', TIMESERIES_BODY,
+                                    content_type='application/csv')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response['Location'], '/jobs/{}'.format(response.json()['id']))
+        self.assertEqual(TimeSeriesData.objects.filter(timeseries__data_type='D').count(), 4)
+
+        response = self.client.get(response['Location'])
+        self.assertEqual(response.status_code, 200)
+        job = response.json()
+        self.assertEqual(job['status'], 'Succeeded')
+        self.assertEqual(job['message'], 'Upload successful')
+        self.assertEqual(job['rows_processed'], 2)
+        self.assertEqual(job['total_rows'], 2)
+        self.assertEqual(job['progress'], 1.0)
+        self.assertIsNotNone(job['elapsed_seconds'])
+
+    def test_dailyreports_async(self):
+        response = self.client.post('/daily_reports/test1?async=true', DAILYREPORTS_BODY,
+                                    content_type='application/csv')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(DailyReports.objects.count(), 1)
+        self.assertEqual(self.client.get(response['Location']).json()['status'], 'Succeeded')
+
+    def test_async_compressed(self):
+        # rows are counted on the decompressed body spooled for the job
+        response = self.client.post('/time_series/abc/deaths?async=true', gzip.compress(TIMESERIES_BODY.encode()),
+                                    content_type='application/csv', HTTP_CONTENT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['total_rows'], 2)
+        self.assertEqual(TimeSeriesData.objects.filter(timeseries__data_type='D').count(), 4)
+
+    def test_async_corrupt_body(self):
+        response = self.client.post('/time_series/abc/deaths?async=true', gzip.compress(TIMESERIES_BODY.encode())[:-12],
+                                    content_type='application/csv', HTTP_CONTENT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Job.objects.count(), 0)
+
+    def test_async_invalid_header(self):
+        response = self.client.post('/time_series/abc/deaths?async=true', 'Province/State,Country/Region',
+                                    content_type='application/csv')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Job.objects.count(), 0)
+
+    def test_async_invalid_row(self):
+        body = TIMESERIES_BODY.replace('67.709953', 'abc')
+        response = self.client.post('/time_series/abc/deaths?async=true', body, content_type='application/csv')
+        self.assertEqual(response.status_code, 202)
+
+        job = self.client.get(response['Location']).json()
+        self.assertEqual(job['status'], 'Failed')
+        self.assertEqual(job['message'], 'Malformed request')
+        self.assertEqual(TimeSeriesData.objects.count(), 0)
+
+    def test_abandoned_job_failed(self):
+        # jobs whose heartbeat stopped were lost with their worker and read as failed
+        stale = timezone.now() - timedelta(seconds=settings.JOBS_HEARTBEAT_TIMEOUT + 1)
+        abandoned = Job.objects.create(kind=Job.KindChoice.TIME_SERIES, name='abc',
+                                       status=Job.StatusChoice.RUNNING, heartbeat_at=stale)
+        alive = Job.objects.create(kind=Job.KindChoice.TIME_SERIES, name='abc', heartbeat_at=timezone.now())
+
+        job = self.client.get('/jobs/{}'.format(abandoned.id)).json()
+        self.assertEqual(job['status'], 'Failed')
+        self.assertEqual(job['message'], 'Worker stopped before the upload was processed')
+        self.assertIsNotNone(job['finished_at'])
+        self.assertEqual(self.client.get('/jobs/{}'.format(alive.id)).json()['status'], 'Queued')
+
+    def test_fail_abandoned_jobs_command(self):
+        stale = timezone.now() - timedelta(seconds=settings.JOBS_HEARTBEAT_TIMEOUT + 1)
+        Job.objects.create(kind=Job.KindChoice.TIME_SERIES, name='abc', heartbeat_at=stale)
+        Job.objects.create(kind=Job.KindChoice.TIME_SERIES, name='abc', status=Job.StatusChoice.SUCCEEDED,
+                           heartbeat_at=stale)
+        Job.objects.create(kind=Job.KindChoice.TIME_SERIES, name='abc', heartbeat_at=timezone.now())
+
+        out = StringIO()
+        call_command('fail_abandoned_jobs', stdout=out)
+        self.assertEqual(out.getvalue().strip(), 'failed 1 jobs')
+        self.assertEqual(sorted(Job.objects.values_list('status', flat=True)), ['F', 'Q', 'S'])
+
+    def test_job_unavailable(self):
+        response = self.client.get('/jobs/999999')
+        self.assertEqual(response.status_code, 404)
+
+
+class JobsViewsWorker(TransactionTestCase):
+    databases = {'default', 'jobs'}
+
+    def test_timeseries_async_worker(self):
+        response = self.client.post('/time_series/abc/deaths?async=true', TIMESERIES_BODY,
+                                    content_type='application/csv')
+        self.assertEqual(response.status_code, 202)
+
+        # waiting for the worker thread to finish
+        for _ in range(100):
+            job = self.client.get(response['Location']).json()
+            if job['status'] in ['Succeeded', 'Failed']:
+                break
+            time.sleep(0.05)
+
+        self.assertEqual(job['status'], 'Succeeded')
+        self.assertEqual(TimeSeriesData.objects.filter(timeseries__data_type='D').count(), 4)
+
+    @override_settings(JOBS_HEARTBEAT_INTERVAL=0.01)
+    def test_heartbeat(self):
+        # the heartbeat of a pending job is refreshed until it finishes
+        stale = timezone.now() - timedelta(seconds=settings.JOBS_HEARTBEAT_TIMEOUT + 1)
+        job = Job.objects.create(kind=Job.KindChoice.TIME_SERIES, name='abc', heartbeat_at=stale)
+
+        worker.start_heartbeat(job.id)
+        thread = worker.heartbeat_thread
+        try:
+            for _ in range(100):
+                job.refresh_from_db()
+                if job.heartbeat_at > stale:
+                    break
+                time.sleep(0.05)
+        finally:
+            worker.stop_heartbeat(job.id)
+        thread.join(5)
+
+        self.assertGreater(job.heartbeat_at, stale)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(worker.fail_abandoned(Job.objects.all()), 0)
@@ -0,0 +1,21 @@
+from django.http import HttpResponse, JsonResponse
+
+from jobs.models import Job
+from jobs.worker import fail_abandoned, job_json
+
+
+def job(request, job_id):
+    if request.method == 'GET':
+        return job_get(request, job_id)
+    return HttpResponse('Internal server error', status=500)
+
+
+def job_get(request, job_id):
+    # A job lost to a restart reads as failed instead of staying queued or running
+    fail_abandoned(Job.objects.filter(id=job_id))
+
+    job_entry = Job.objects.filter(id=job_id).first()
+    if not job_entry:
+        return HttpResponse('Job not found', status=404)
+
+    return JsonResponse(job_json(job_entry))
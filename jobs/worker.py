@@ -0,0 +1,179 @@
+import logging
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import F
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+
+from covidAPI.streaming import CHUNK_SIZE, CorruptUpload, csv_reader
+from jobs.models import Job
+
+logger = logging.getLogger(__name__)
+
+# Job progress is written through its own connection so it is visible while the ingest transaction is open
+JOBS_DATABASE = 'jobs'
+
+executor = ThreadPoolExecutor(max_workers=getattr(settings, 'JOBS_MAX_WORKERS', 2), thread_name_prefix='jobs')
+
+# Jobs of this process not finished yet, their heartbeat is refreshed while there are any
+pending_jobs = set()
+pending_changed = threading.Condition()
+heartbeat_thread = None
+
+UNFINISHED = [Job.StatusChoice.QUEUED, Job.StatusChoice.RUNNING]
+
+
+def queue_upload(body, kind, name, data_type, validate_header, ingest):
+    # Spooling the decompressed body to disk so the request can return before it is processed
+    upload = tempfile.TemporaryFile()
+    total_rows = 0
+    try:
+        while True:
+            chunk = body.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            upload.write(chunk)
+            total_rows += chunk.count(b'\n')
+    except CorruptUpload:
+        upload.close()
+        raise
+    upload.seek(0)
+
+    # Validating header before accepting the job
+    if not validate_header(next(csv_reader(upload), None)):
+        upload.close()
+        return HttpResponse('Malformed request', status=400)
+    upload.seek(0)
+
+    inline = getattr(settings, 'JOBS_RUN_INLINE', False)
+    job = Job.objects.create(kind=kind, name=name, data_type=data_type, total_rows=total_rows,
+                             heartbeat_at=None if inline else timezone.now())
+
+    if inline:
+        run_job(job.id, upload, ingest)
+    else:
+        start_heartbeat(job.id)
+        executor.submit(run_job, job.id, upload, ingest)
+
+    response = JsonResponse(job_json(job), status=202)
+    response['Location'] = '/jobs/{}'.format(job.id)
+    return response
+
+
+def run_job(job_id, upload, ingest):
+    inline = getattr(settings, 'JOBS_RUN_INLINE', False)
+
+    # Inline jobs finish inside the request so progress can share its connection
+    jobs = Job.objects.using(DEFAULT_DB_ALIAS if inline else JOBS_DATABASE).filter(id=job_id)
+    jobs.update(status=Job.StatusChoice.RUNNING, started_at=timezone.now())
+
+    def progress(rows):
+        jobs.update(rows_processed=F('rows_processed') + rows)
+
+    try:
+        response = ingest(upload, progress)
+        status = Job.StatusChoice.SUCCEEDED if response.status_code == 200 else Job.StatusChoice.FAILED
+        message = response.content.decode('utf-8')
+    except Exception:
+        logger.exception('Job %s failed', job_id)
+        status = Job.StatusChoice.FAILED
+        message = 'Internal server error'
+    finally:
+        upload.close()
+
+    jobs.update(status=status, message=message, finished_at=timezone.now())
+
+    # Worker threads do not go through the request cycle that normally closes connections
+    if not inline:
+        stop_heartbeat(job_id)
+        connections.close_all()
+
+
+def start_heartbeat(job_id):
+    global heartbeat_thread
+    with pending_changed:
+        pending_jobs.add(job_id)
+        if heartbeat_thread is None:
+            heartbeat_thread = threading.Thread(target=heartbeat, name='jobs-heartbeat', daemon=True)
+            heartbeat_thread.start()
+
+
+def stop_heartbeat(job_id):
+    with pending_changed:
+        pending_jobs.discard(job_id)
+        pending_changed.notify_all()
+
+
+def heartbeat():
+    # Refreshes the heartbeat of the pending jobs of this process until none are left
+    global heartbeat_thread
+    try:
+        while True:
+            with pending_changed:
+                pending_changed.wait_for(lambda: not pending_jobs, timeout=settings.JOBS_HEARTBEAT_INTERVAL)
+                if not pending_jobs:
+                    heartbeat_thread = None
+                    return
+                job_ids = list(pending_jobs)
+            Job.objects.using(JOBS_DATABASE).filter(id__in=job_ids).update(heartbeat_at=timezone.now())
+    except Exception:
+        logger.exception('Job heartbeat failed')
+        with pending_changed:
+            heartbeat_thread = None
+    finally:
+        connections.close_all()
+
+
+def fail_abandoned(jobs):
+    # Fails the unfinished jobs whose heartbeat stopped, the process holding them was restarted or recycled and their
+    # spooled body is gone. Returns the number of jobs failed
+    now = timezone.now()
+    return jobs.filter(
+        status__in=UNFINISHED,
+        heartbeat_at__lt=now - timedelta(seconds=settings.JOBS_HEARTBEAT_TIMEOUT),
+    ).update(status=Job.StatusChoice.FAILED, message='Worker stopped before the upload was processed',
+             finished_at=now)
+
+
+def run_in_background(function, *args):
+    # Maintenance work that does not need a Job row, inline when JOBS_RUN_INLINE is set
+    if getattr(settings, 'JOBS_RUN_INLINE', False):
+        function(*args)
+        return
+
+    def run():
+        try:
+            function(*args)
+        except Exception:
+            logger.exception('Background %s failed', function.__name__)
+        finally:
+            connections.close_all()
+
+    executor.submit(run)
+
+
+def job_json(job):
+    elapsed = None
+    if job.started_at:
+        elapsed = ((job.finished_at or timezone.now()) - job.started_at).total_seconds()
+
+    return {
+        "id": job.id,
+        "kind": job.get_kind_display(),
+        "name": job.name,
+        "data_type": job.data_type,
+        "status": job.get_status_display(),
+        "message": job.message,
+        "total_rows": job.total_rows,
+        "rows_processed": job.rows_processed,
+        "progress": min(1.0, job.rows_processed / job.total_rows) if job.total_rows else None,
+        "created_at": job.created_at.isoformat(),
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "elapsed_seconds": elapsed,
+    }
@@ -0,0 +1,90 @@
+from datetime import datetime
+
+from covidAPI.streaming import batched
+from time_series.models import TimeSeries
+from time_series.storage import get_storage
+
+# Data types active cases are computed from, each mapped to the other one
+ACTIVE_SOURCES = {
+    TimeSeries.TypeChoice.CONFIRMED: TimeSeries.TypeChoice.DEATHS,
+    TimeSeries.TypeChoice.DEATHS: TimeSeries.TypeChoice.CONFIRMED,
+}
+
+# Bounds of the cases IntegerField
+CASES_MIN = -2 ** 31 + 1
+CASES_MAX = 2 ** 31 - 1
+
+# Series materialized per batch by materialize_active
+MATERIALIZE_BATCH_SIZE = 500
+
+
+def write_active(dataset_id, data_type, rows, other_ids, active_ids, write=None):
+    # Recomputes the active points of the dates in rows, the cases just written for data_type. rows, other_ids (the
+    # series of the other source type) and active_ids share their keys, only the other type is read back
+    stored = get_storage().load(dataset_id, list(other_ids.values()),
+                                sorted({day(date) for cases_by_date in rows.values() for date in cases_by_date}))
+
+    active_rows = {}
+    for key, cases_by_date in rows.items():
+        other = stored.get(other_ids.get(key), {})
+        active_rows[key] = {
+            date: active_cases(data_type, cases, other.get(day(date)))
+            for date, cases in cases_by_date.items()
+        }
+
+    if write is None:
+        get_storage().write(dataset_id, active_ids, active_rows)
+    else:
+        write(active_ids, active_rows)
+
+
+def materialize_active(dataset_id):
+    # Builds the active series of a dataset from its stored confirmed and deaths series
+    storage = get_storage()
+    for data_type, other_type in ACTIVE_SOURCES.items():
+        sources = TimeSeries.objects.filter(dataset_id=dataset_id, data_type=data_type).order_by('location_id')
+        for batch in batched(sources.iterator(), MATERIALIZE_BATCH_SIZE):
+            location_ids = [timeseries.location_id for timeseries in batch]
+            TimeSeries.objects.bulk_create(
+                [TimeSeries(dataset_id=dataset_id, data_type=TimeSeries.TypeChoice.ACTIVE,
+                            location_id=timeseries.location_id, lat=timeseries.lat, long=timeseries.long)
+                 for timeseries in batch],
+                ignore_conflicts=True,
+            )
+            series = series_by_location(dataset_id, location_ids, [other_type, TimeSeries.TypeChoice.ACTIVE])
+
+            stored = storage.load(dataset_id, [timeseries.id for timeseries in batch])
+            write_active(dataset_id, data_type,
+                         {timeseries.location_id: stored.get(timeseries.id, {}) for timeseries in batch},
+                         series[other_type], series[TimeSeries.TypeChoice.ACTIVE])
+
+
+def series_by_location(dataset_id, location_ids, data_types):
+    # {data_type: {location_id: timeseries_id}} of the series of location_ids in one query
+    series = {data_type: {} for data_type in data_types}
+    for data_type, location_id, timeseries_id in TimeSeries.objects.filter(
+            dataset_id=dataset_id,
+            data_type__in=data_types,
+            location__in=location_ids).values_list('data_type', 'location_id', 'id'):
+        series[data_type][location_id] = timeseries_id
+    return series
+
+
+# **************************************************************************************************** HELPER FUNCTIONS
+
+def active_cases(data_type, cases, other_cases):
+    # Active cases from the cases of data_type and of the other source type on the same date
+    if other_cases is None:
+        return TimeSeries.UNMATCHED
+    confirmed, deaths = (cases, other_cases) if data_type == TimeSeries.TypeChoice.CONFIRMED else (other_cases, cases)
+
+    # Out of range of the column, voided like a negative value
+    active = confirmed - deaths
+    if not CASES_MIN <= active <= CASES_MAX:
+        return TimeSeries.UNMATCHED
+    return active
+
+
+def day(date):
+    # Upload headers hold datetimes, stored points dates
+    return date.date() if isinstance(date, datetime) else date
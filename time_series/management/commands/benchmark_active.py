@@ -0,0 +1,57 @@
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from datasets.models import Dataset
+from datasets.versions import ensure_dataset
+from time_series.models import TimeSeries
+from time_series.views import purge_timeseries, timeseries, upsert_timeseries
+
+
+class Command(BaseCommand):
+    help = 'Measures query count and latency of GET /time_series/{name}/active on a synthetic full-size dataset'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--locations', type=int, default=3000)
+        parser.add_argument('--dates', type=int, default=800)
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--name', default='benchmark_active')
+
+    def handle(self, *args, **options):
+        name = options['name']
+        dates = [datetime(2020, 1, 22) + timedelta(days=day) for day in range(options['dates'])]
+        confirmed = np.random.randint(1000, 100000, size=(options['locations'], options['dates']))
+        parsed_rows = {
+            'Province/State': ['Region{}'.format(index) for index in range(options['locations'])],
+            'Country/Region': ['Country{}'.format(index % 200) for index in range(options['locations'])],
+        }
+
+        self.stdout.write('seeding {:,} points per type'.format(confirmed.size))
+        start = time.perf_counter()
+        dataset_id = ensure_dataset(Dataset.KindChoice.TIME_SERIES, name)
+        for data_type, cases in [('confirmed', confirmed), ('deaths', confirmed // 100)]:
+            params = {"timeseries_name": name, "data_type": TimeSeries.TypeChoice[data_type.upper()]}
+            upsert_timeseries(params, dates, {**parsed_rows, 'CASES': cases}, dataset_id)
+        self.stdout.write('seeded in {:.1f}s'.format(time.perf_counter() - start))
+
+        try:
+            for label, query_string in [('full range', ''),
+                                        ('one month', 'start_date=2020-03-01&end_date=2020-03-31'),
+                                        ('one country', 'countries=Country7')]:
+                timings = []
+                for _ in range(options['repeat']):
+                    request = RequestFactory().get('/time_series/{}/active?{}'.format(name, query_string))
+                    with CaptureQueriesContext(connection) as context:
+                        start = time.perf_counter()
+                        response = timeseries(request, name, 'active')
+                        content = b''.join(response.streaming_content)
+                        timings.append(time.perf_counter() - start)
+                self.stdout.write('{:<12} status {}  {:3} queries  {:8.3f}s  {:12,} bytes'.format(
+                    label, response.status_code, len(context.captured_queries), min(timings), len(content)))
+        finally:
+            purge_timeseries(name)
@@ -0,0 +1,45 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from time_series.views import parse_post_header, parse_post_row, parse_post_rows
+
+
+class Command(BaseCommand):
+    help = 'Compares the row-by-row and vectorized time series CSV parsers on a synthetic wide CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=3000)
+        parser.add_argument('--dates', type=int, default=800)
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        header = parse_post_header(
+            ['Province/State', 'Country/Region', 'Lat', 'Long'] +
+            ['{}/{}/{}'.format(day % 12 + 1, day % 28 + 1, 20 + day // 336) for day in range(options['dates'])])
+        rows = [
+            ['Region{}'.format(index), 'Country{}'.format(index % 200), '{:.4f}'.format(random.uniform(-90, 90)),
+             '{:.4f}'.format(random.uniform(-180, 180))] +
+            [str(random.randint(0, 100000)) for _ in range(options['dates'])]
+            for index in range(options['rows'])
+        ]
+
+        def row_by_row():
+            return [parse_post_row(header, row) for row in rows]
+
+        def vectorized():
+            return parse_post_rows(header, rows)
+
+        cells = options['rows'] * options['dates']
+        results = {}
+        for name, parser in [('row-by-row', row_by_row), ('vectorized', vectorized)]:
+            timings = []
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                parser()
+                timings.append(time.perf_counter() - start)
+            results[name] = min(timings)
+            self.stdout.write('{:<12} {:8.3f}s  {:12,.0f} cells/s'.format(name, results[name], cells / results[name]))
+
+        self.stdout.write('speedup      {:8.1f}x'.format(results['row-by-row'] / results['vectorized']))
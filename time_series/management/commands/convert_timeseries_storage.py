@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from covidAPI.streaming import batched
+from datasets.models import Dataset
+from datasets.partitions import create_partition
+from time_series.models import TimeSeries
+from time_series.storage import STORAGES
+
+
+class Command(BaseCommand):
+    help = 'Moves time series cases between the rows and array storage layouts, set TIME_SERIES_STORAGE to match after'
+
+    def add_arguments(self, parser):
+        parser.add_argument('layout', choices=sorted(STORAGES))
+        parser.add_argument('--batch-size', type=int, default=500, help='series converted per statement')
+
+    def handle(self, *args, **options):
+        target = STORAGES[options['layout']]
+        source = next(storage for layout, storage in STORAGES.items() if layout != options['layout'])
+
+        converted = 0
+        # Either every series is moved or none is
+        with transaction.atomic():
+            dataset_ids = TimeSeries.objects.order_by('dataset_id').values_list('dataset_id', flat=True).distinct()
+            for dataset_id in list(dataset_ids):
+                create_partition(Dataset.KindChoice.TIME_SERIES, dataset_id)
+                timeseries_ids = TimeSeries.objects.filter(dataset_id=dataset_id).order_by('id').values_list(
+                    'id', flat=True)
+                for batch in batched(timeseries_ids, options['batch_size']):
+                    rows = source.load(dataset_id, batch)
+                    if rows:
+                        target.write(dataset_id, {timeseries_id: timeseries_id for timeseries_id in rows}, rows)
+                    converted += len(rows)
+            source.clear()
+
+        self.stdout.write('converted {:,} series to {} storage'.format(converted, options['layout']))
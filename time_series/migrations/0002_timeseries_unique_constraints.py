@@ -0,0 +1,47 @@
+# Generated by Django 4.1.13 on 2026-10-18 09:12
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def remove_duplicates(apps, schema_editor):
+    # Keeping the lowest id per key, it is the row earlier uploads updated
+    TimeSeries = apps.get_model('time_series', 'TimeSeries')
+    TimeSeriesData = apps.get_model('time_series', 'TimeSeriesData')
+
+    # Moving the data of duplicate series to the one kept, its duplicate dates are removed below
+    duplicates = TimeSeries.objects.values(
+        'timeseries_name', 'data_type', 'province_state', 'country_region'
+    ).annotate(keep_id=Min('id'), count=Count('id')).filter(count__gt=1)
+    for duplicate in duplicates:
+        keep_id = duplicate.pop('keep_id')
+        duplicate.pop('count')
+        merged = TimeSeries.objects.filter(**duplicate).exclude(id=keep_id)
+        TimeSeriesData.objects.filter(timeseries__in=merged).update(timeseries_id=keep_id)
+        merged.delete()
+
+    keep = TimeSeriesData.objects.values('timeseries', 'date').annotate(keep_id=Min('id')).values('keep_id')
+    TimeSeriesData.objects.exclude(id__in=keep).delete()
+
+    # Pending deferred foreign key checks would block the ALTER TABLE statements that follow
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('time_series', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='timeseries',
+            constraint=models.UniqueConstraint(fields=('timeseries_name', 'data_type', 'province_state', 'country_region'), name='timeseries_natural_key'),
+        ),
+        migrations.AddConstraint(
+            model_name='timeseriesdata',
+            constraint=models.UniqueConstraint(fields=('timeseries', 'date'), name='timeseriesdata_timeseries_date'),
+        ),
+    ]
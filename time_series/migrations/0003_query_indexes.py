@@ -0,0 +1,27 @@
+# Generated by Django 4.1.13 on 2026-10-18 09:18
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('time_series', '0002_timeseries_unique_constraints'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='timeseries',
+            name='timeseries_natural_key',
+        ),
+        migrations.AlterField(
+            model_name='timeseriesdata',
+            name='timeseries',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='time_series.timeseries'),
+        ),
+        migrations.AddConstraint(
+            model_name='timeseries',
+            constraint=models.UniqueConstraint(fields=('timeseries_name', 'data_type', 'country_region', 'province_state'), name='timeseries_natural_key'),
+        ),
+    ]
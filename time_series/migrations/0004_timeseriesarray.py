@@ -0,0 +1,22 @@
+# Generated by Django 4.1.13 on 2026-10-18 09:35
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('time_series', '0003_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimeSeriesArray',
+            fields=[
+                ('timeseries', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='time_series.timeseries')),
+                ('start_date', models.DateField()),
+                ('cases', models.BinaryField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,47 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def set_datasets(apps, schema_editor):
+    # Every series name becomes a dataset, rows need one to be placed in a partition
+    Dataset = apps.get_model('datasets', 'Dataset')
+    TimeSeries = apps.get_model('time_series', 'TimeSeries')
+    TimeSeriesData = apps.get_model('time_series', 'TimeSeriesData')
+
+    for name in TimeSeries.objects.values_list('timeseries_name', flat=True).distinct():
+        dataset, _ = Dataset.objects.get_or_create(kind='T', name=name)
+        TimeSeriesData.objects.filter(timeseries__timeseries_name=name).update(dataset=dataset)
+
+    # Pending deferred foreign key checks would block the ALTER TABLE statements that follow
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datasets', '0002_dataset_deleted_at'),
+        ('time_series', '0004_timeseriesarray'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='timeseriesdata',
+            name='dataset',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, to='datasets.dataset'),
+        ),
+        migrations.RunPython(set_datasets, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='timeseriesdata',
+            name='dataset',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='datasets.dataset'),
+        ),
+        migrations.RemoveConstraint(
+            model_name='timeseriesdata',
+            name='timeseriesdata_timeseries_date',
+        ),
+        migrations.AddConstraint(
+            model_name='timeseriesdata',
+            constraint=models.UniqueConstraint(fields=('dataset', 'timeseries', 'date'), name='timeseriesdata_dataset_timeseries_date'),
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations
+
+from datasets.partitions import partition_table, unpartition_table
+
+
+class Migration(migrations.Migration):
+    # List partitions TimeSeriesData by dataset on PostgreSQL, a no-op on other databases
+
+    dependencies = [
+        ('time_series', '0005_timeseriesdata_dataset'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_table('time_series_timeseriesdata'),
+                             unpartition_table('time_series_timeseriesdata')),
+    ]
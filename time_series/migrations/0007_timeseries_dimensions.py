@@ -0,0 +1,112 @@
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+
+
+def set_dimensions(apps, schema_editor):
+    # Series reference their dataset and location instead of repeating the names
+    Dataset = apps.get_model('datasets', 'Dataset')
+    Location = apps.get_model('datasets', 'Location')
+    TimeSeries = apps.get_model('time_series', 'TimeSeries')
+
+    Dataset.objects.bulk_create(
+        [Dataset(kind='T', name=name)
+         for name in TimeSeries.objects.values_list('timeseries_name', flat=True).distinct()],
+        ignore_conflicts=True)
+    Location.objects.bulk_create(
+        [Location(country_region=country_region, province_state=province_state)
+         for country_region, province_state in TimeSeries.objects.values_list(
+            'country_region', 'province_state').distinct()],
+        ignore_conflicts=True)
+
+    TimeSeries.objects.update(
+        dataset=Subquery(Dataset.objects.filter(kind='T', name=OuterRef('timeseries_name')).values('id')[:1]),
+        location=Subquery(Location.objects.filter(
+            country_region=OuterRef('country_region'), province_state=OuterRef('province_state'),
+            admin2='', combined_key='').values('id')[:1]))
+
+    # Pending deferred foreign key checks would block the ALTER TABLE statements that follow
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+
+def set_names(apps, schema_editor):
+    Dataset = apps.get_model('datasets', 'Dataset')
+    Location = apps.get_model('datasets', 'Location')
+    TimeSeries = apps.get_model('time_series', 'TimeSeries')
+
+    TimeSeries.objects.update(
+        timeseries_name=Subquery(Dataset.objects.filter(id=OuterRef('dataset')).values('name')),
+        country_region=Subquery(Location.objects.filter(id=OuterRef('location')).values('country_region')),
+        province_state=Subquery(Location.objects.filter(id=OuterRef('location')).values('province_state')))
+
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datasets', '0003_location'),
+        ('time_series', '0006_partition_timeseriesdata'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='timeseries',
+            name='dataset',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, to='datasets.dataset'),
+        ),
+        migrations.AddField(
+            model_name='timeseries',
+            name='location',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, to='datasets.location'),
+        ),
+        # Nullable before they are removed so the migration can be reversed with rows in place
+        migrations.AlterField(
+            model_name='timeseries',
+            name='timeseries_name',
+            field=models.CharField(max_length=1000, null=True),
+        ),
+        migrations.AlterField(
+            model_name='timeseries',
+            name='province_state',
+            field=models.CharField(max_length=1000, null=True),
+        ),
+        migrations.AlterField(
+            model_name='timeseries',
+            name='country_region',
+            field=models.CharField(max_length=1000, null=True),
+        ),
+        migrations.RunPython(set_dimensions, set_names),
+        migrations.AlterField(
+            model_name='timeseries',
+            name='dataset',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='datasets.dataset'),
+        ),
+        migrations.AlterField(
+            model_name='timeseries',
+            name='location',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, to='datasets.location'),
+        ),
+        migrations.RemoveConstraint(
+            model_name='timeseries',
+            name='timeseries_natural_key',
+        ),
+        migrations.AddConstraint(
+            model_name='timeseries',
+            constraint=models.UniqueConstraint(fields=('dataset', 'data_type', 'location'), name='timeseries_natural_key'),
+        ),
+        migrations.RemoveField(
+            model_name='timeseries',
+            name='timeseries_name',
+        ),
+        migrations.RemoveField(
+            model_name='timeseries',
+            name='province_state',
+        ),
+        migrations.RemoveField(
+            model_name='timeseries',
+            name='country_region',
+        ),
+    ]
@@ -0,0 +1,129 @@
+# Generated by Django 4.1.13 on 2026-10-18 10:28
+
+from datetime import date
+from itertools import groupby
+from operator import attrgetter
+
+import numpy as np
+from django.db import migrations, models
+
+# As in the models and time_series.active when this migration was written
+MISSING = -2 ** 31
+UNMATCHED = -1
+CASES_MIN = -2 ** 31 + 1
+CASES_MAX = 2 ** 31 - 1
+
+# Locations materialized per batch
+MATERIALIZE_BATCH_SIZE = 500
+
+
+def materialize(apps, schema_editor):
+    # Active series of the datasets uploaded before they were written at ingest. Confirmed sorts before deaths, its
+    # position is the one copied
+    TimeSeries = apps.get_model('time_series', 'TimeSeries')
+    sources = TimeSeries.objects.filter(data_type__in=['C', 'D']).order_by('dataset_id', 'location_id', 'data_type')
+    for dataset_id, series in groupby(sources.iterator(), attrgetter('dataset_id')):
+        locations = [list(group) for _, group in groupby(series, attrgetter('location_id'))]
+        for start in range(0, len(locations), MATERIALIZE_BATCH_SIZE):
+            materialize_locations(apps, dataset_id, locations[start:start + MATERIALIZE_BATCH_SIZE])
+
+
+def materialize_locations(apps, dataset_id, locations):
+    # locations holds the confirmed and deaths series of each location, the active points are written in the
+    # storage layout their points are in
+    TimeSeries = apps.get_model('time_series', 'TimeSeries')
+    TimeSeriesData = apps.get_model('time_series', 'TimeSeriesData')
+    TimeSeriesArray = apps.get_model('time_series', 'TimeSeriesArray')
+
+    TimeSeries.objects.bulk_create(
+        [TimeSeries(dataset_id=dataset_id, data_type='A', location_id=group[0].location_id,
+                    lat=group[0].lat, long=group[0].long)
+         for group in locations],
+        ignore_conflicts=True,
+    )
+    active_ids = dict(TimeSeries.objects.filter(
+        dataset_id=dataset_id, data_type='A',
+        location__in=[group[0].location_id for group in locations]).values_list('location_id', 'id'))
+    sources = {timeseries.id: timeseries for group in locations for timeseries in group}
+
+    # {location_id: {data_type: {date: cases}}} of each layout
+    rows = {}
+    for timeseries_id, day, cases in TimeSeriesData.objects.filter(
+            dataset_id=dataset_id,
+            timeseries__in=list(sources)).values_list('timeseries_id', 'date', 'cases').iterator():
+        timeseries = sources[timeseries_id]
+        rows.setdefault(timeseries.location_id, {}).setdefault(timeseries.data_type, {})[day] = cases
+
+    arrays = {}
+    for timeseries_id, start_date, cases in TimeSeriesArray.objects.filter(
+            timeseries__in=list(sources)).values_list('timeseries_id', 'start_date', 'cases'):
+        timeseries = sources[timeseries_id]
+        cases = np.frombuffer(cases, dtype='<i4')
+        first = start_date.toordinal()
+        arrays.setdefault(timeseries.location_id, {})[timeseries.data_type] = {
+            date.fromordinal(first + offset): int(cases[offset])
+            for offset in np.flatnonzero(cases != MISSING).tolist()
+        }
+
+    TimeSeriesData.objects.bulk_create(
+        [TimeSeriesData(dataset_id=dataset_id, timeseries_id=active_ids[location_id], date=day, cases=cases)
+         for location_id, points in rows.items()
+         for day, cases in active_points(points).items()],
+        batch_size=10000,
+    )
+
+    packed = []
+    for location_id, points in arrays.items():
+        active = active_points(points)
+        if not active:
+            continue
+        ordinals = np.array([day.toordinal() for day in active], dtype=np.int64)
+        first = int(ordinals.min())
+        cases = np.full(int(ordinals.max()) - first + 1, MISSING, dtype='<i4')
+        cases[ordinals - first] = list(active.values())
+        packed.append(TimeSeriesArray(timeseries_id=active_ids[location_id], start_date=date.fromordinal(first),
+                                      cases=cases.tobytes()))
+    TimeSeriesArray.objects.bulk_create(packed)
+
+
+def active_points(points):
+    # {date: active cases} on every date confirmed or deaths has a value, unmatched where the other one has none or
+    # the difference is out of range of the column
+    confirmed, deaths = points.get('C', {}), points.get('D', {})
+    active = {}
+    for day in confirmed.keys() | deaths.keys():
+        if day not in confirmed or day not in deaths:
+            active[day] = UNMATCHED
+            continue
+        cases = confirmed[day] - deaths[day]
+        active[day] = cases if CASES_MIN <= cases <= CASES_MAX else UNMATCHED
+    return active
+
+
+def remove(apps, schema_editor):
+    TimeSeries = apps.get_model('time_series', 'TimeSeries')
+    TimeSeriesData = apps.get_model('time_series', 'TimeSeriesData')
+    TimeSeriesArray = apps.get_model('time_series', 'TimeSeriesArray')
+    TimeSeriesData.objects.filter(timeseries__data_type='A').delete()
+    TimeSeriesArray.objects.filter(timeseries__data_type='A').delete()
+    TimeSeries.objects.filter(data_type='A').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('time_series', '0007_timeseries_dimensions'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='timeseries',
+            name='data_type',
+            field=models.CharField(choices=[('D', 'Deaths'), ('C', 'Confirmed'), ('R', 'Recovered'), ('A', 'Active')], max_length=1),
+        ),
+        migrations.AddIndex(
+            model_name='timeseriesdata',
+            index=models.Index(condition=models.Q(('cases__lt', 0)), fields=['dataset', 'timeseries', 'date'], name='timeseriesdata_negative'),
+        ),
+        migrations.RunPython(materialize, remove),
+    ]
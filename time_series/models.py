@@ -1,5 +1,6 @@
 from django.db import models
-import datetime
+
+from datasets.models import Dataset, Location
 
 
 class TimeSeries(models.Model):
@@ -7,24 +8,69 @@ class TimeSeries(models.Model):
         DEATHS = 'D'
         CONFIRMED = 'C'
         RECOVERED = 'R'
+        # confirmed - deaths, written with either of them and never uploaded
+        ACTIVE = 'A'
+
+    # Active cases of a date where confirmed or deaths has no value, any negative active value voids a read
+    UNMATCHED = -1
 
+    # Both indexed through timeseries_natural_key
+    dataset = models.ForeignKey(Dataset, on_delete=models.CASCADE, db_index=False)
     data_type = models.CharField(max_length=1, choices=TypeChoice.choices)
-    timeseries_name = models.CharField(max_length=1000)
+    location = models.ForeignKey(Location, on_delete=models.PROTECT, db_index=False)
 
-    province_state = models.CharField(max_length=1000)
-    country_region = models.CharField(max_length=1000)
     lat = models.FloatField()
     long = models.FloatField()
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['dataset', 'data_type', 'location'], name='timeseries_natural_key'),
+        ]
+
     def __str__(self):
-        return "timeseries_name: {}, data_type: {}, province_state: {}, country_region: {}"\
-            .format(self.timeseries_name, self.data_type, self.province_state, self.country_region)
+        return "dataset_id: {}, data_type: {}, location_id: {}".format(self.dataset_id, self.data_type,
+                                                                       self.location_id)
 
 
 class TimeSeriesData(models.Model):
-    timeseries = models.ForeignKey(TimeSeries, on_delete=models.CASCADE)
+    # Partition key on PostgreSQL, the dataset of the series
+    dataset = models.ForeignKey(Dataset, on_delete=models.CASCADE, db_index=False)
+    # Indexed through timeseriesdata_dataset_timeseries_date
+    timeseries = models.ForeignKey(TimeSeries, on_delete=models.CASCADE, db_index=False)
     date = models.DateField()
     cases = models.IntegerField()
 
+    class Meta:
+        constraints = [
+            # Unique keys of a partitioned table must contain the partition key
+            models.UniqueConstraint(fields=['dataset', 'timeseries', 'date'],
+                                    name='timeseriesdata_dataset_timeseries_date'),
+        ]
+        indexes = [
+            # Only the few negative points, active reads look for one in their range without reading the others
+            models.Index(fields=['dataset', 'timeseries', 'date'], condition=models.Q(cases__lt=0),
+                         name='timeseriesdata_negative'),
+        ]
+
+    def save(self, *args, **kwargs):
+        # Uploads set the dataset in bulk, single rows copy it from their series
+        if self.dataset_id is None:
+            self.dataset_id = self.timeseries.dataset_id
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return "date: {}, cases: {}".format(self.date, self.cases)
+
+
+class TimeSeriesArray(models.Model):
+    # Alternative to TimeSeriesData holding every case count of a series in one row, selected by TIME_SERIES_STORAGE
+    # Days without a value
+    MISSING = -2 ** 31
+
+    timeseries = models.OneToOneField(TimeSeries, on_delete=models.CASCADE, primary_key=True)
+    # cases holds one little-endian int32 per day starting at start_date
+    start_date = models.DateField()
+    cases = models.BinaryField()
+
+    def __str__(self):
+        return "start_date: {}, days: {}".format(self.start_date, len(self.cases) // 4)
@@ -0,0 +1,112 @@
+import numpy as np
+
+from covidAPI.streaming import batched
+from datasets.models import Location
+from time_series.models import TimeSeries
+
+# Values of the group_by parameter of GET
+GROUP_BYS = ["country"]
+
+# Values of the interval parameter of GET, day leaves dates as they are
+INTERVALS = ["day", "week", "month"]
+
+# Values of the metric parameter of GET, cases are the stored cumulative counts
+METRICS = ["cases", "new", "rolling7", "growth"]
+
+# Days before start_date a metric reads to have a value on start_date
+METRIC_LOOK_BACK = {
+    "new": 1,
+    "rolling7": 7,
+    "growth": 1,
+}
+
+# Sums copied into numpy at a time by group_by_country
+SUM_CHUNK_SIZE = 10000
+
+# Multiplier of series ids in the sort keys of derive, above any date ordinal
+SERIES_STRIDE = 1 << 22
+
+
+def bucket_ends(interval):
+    # select function of a storage read keeping the last date of each week (ISO, Monday to Sunday) or month. Series
+    # are cumulative, their value on that date is the value of the bucket
+    def select(dates):
+        ends = {}
+        for day in dates:
+            key = day.isocalendar()[:2] if interval == "week" else (day.year, day.month)
+            ends[key] = day
+        return sorted(ends.values())
+
+    return select
+
+
+def group_by_country(timeseries_list, dates, sums):
+    # (groups, points) of the sums of the series of each country on each date. groups are unsaved TimeSeries ordered
+    # by country, with the mean position of their series, and points are ordered like a read. sums are the
+    # (country_region, date, cases) of Storage.sum_by_country, copied into numpy a chunk at a time so only one cell
+    # per country and date is held
+    timeseries_list = list(timeseries_list)
+    dates = sorted(dates)
+    countries, group_of_series = np.unique([timeseries.location.country_region for timeseries in timeseries_list],
+                                           return_inverse=True)
+    lats = np.bincount(group_of_series, weights=[timeseries.lat for timeseries in timeseries_list]) / \
+        np.bincount(group_of_series)
+    longs = np.bincount(group_of_series, weights=[timeseries.long for timeseries in timeseries_list]) / \
+        np.bincount(group_of_series)
+    groups = [
+        TimeSeries(id=index, location=Location(province_state='', country_region=country),
+                   lat=float(lats[index]), long=float(longs[index]))
+        for index, country in enumerate(countries.tolist())
+    ]
+
+    # One cell per country and date
+    group_of_country = {country: index for index, country in enumerate(countries.tolist())}
+    date_index = {day: index for index, day in enumerate(dates)}
+    totals = np.zeros(len(groups) * len(dates), dtype=np.int64)
+    present = np.zeros(len(totals), dtype=bool)
+    for chunk in batched(sums, SUM_CHUNK_SIZE):
+        country_regions, sum_dates, cases = zip(*chunk)
+        cells = np.fromiter((group_of_country[country] * len(dates) + date_index[day]
+                             for country, day in zip(country_regions, sum_dates)), dtype=np.int64, count=len(chunk))
+        np.add.at(totals, cells, np.array(cases, dtype=np.int64))
+        present[cells] = True
+
+    return groups, [(int(cell // len(dates)), dates[cell % len(dates)], int(totals[cell]))
+                    for cell in np.flatnonzero(present).tolist()]
+
+
+def derive(metric, dates, timeseriesdata_list, start_date):
+    # (dates, points) of metric computed from cumulative points ordered by series then date, points before
+    # start_date are only read as the look-back of the first ones. Dates without a value on the day the metric looks
+    # back to have no value either:
+    # - new: cases - cases of the day before
+    # - rolling7: mean of new over the last 7 days, (cases - cases 7 days before) / 7
+    # - growth: new / cases of the day before, none when those are 0
+    first = start_date.toordinal()
+    dates = [day for day in dates if day.toordinal() >= first]
+
+    points = list(timeseriesdata_list)
+    if not points:
+        return dates, []
+    timeseries_ids, point_dates, cases = zip(*points)
+    ordinals = np.fromiter((day.toordinal() for day in point_dates), dtype=np.int64, count=len(points))
+    keys = np.array(timeseries_ids, dtype=np.int64) * SERIES_STRIDE + ordinals
+    cases = np.array(cases, dtype=np.int64)
+
+    # Cases of the same series look_back days earlier, found by binary search over the sorted keys
+    look_back = METRIC_LOOK_BACK[metric]
+    earlier = np.minimum(np.searchsorted(keys, keys - look_back), len(keys) - 1)
+    found = keys[earlier] == keys - look_back
+    previous = cases[earlier]
+
+    if metric == "new":
+        values = cases - previous
+    elif metric == "rolling7":
+        values = (cases - previous) / look_back
+    else:
+        found &= previous != 0
+        values = (cases - previous) / np.where(previous != 0, previous, 1)
+
+    kept = np.flatnonzero(found & (ordinals >= first)).tolist()
+    values = values[kept].tolist()
+    return dates, [(timeseries_ids[index], point_dates[index], value) for index, value in zip(kept, values)]
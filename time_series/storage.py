@@ -0,0 +1,281 @@
+from contextlib import contextmanager
+from datetime import date
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Sum
+
+from covidAPI.bulk import bulk_loader
+from datasets.models import Dataset
+from datasets.partitions import drop_partition, partitioned
+from time_series.models import TimeSeriesArray, TimeSeriesData
+
+# Rows fetched per round trip when streaming responses
+STREAM_CHUNK_SIZE = 2000
+
+# Packed case counts are little-endian int32
+CASES_DTYPE = np.dtype('<i4')
+
+
+def get_storage():
+    return STORAGES[settings.TIME_SERIES_STORAGE]
+
+
+class RowStorage:
+    # One TimeSeriesData row per series and date, filtered on the dataset so PostgreSQL reads only its partition
+
+    def write(self, dataset_id, timeseries_ids, rows):
+        # rows maps the same keys as timeseries_ids to {date: cases}
+        with self.writer(dataset_id) as write:
+            write(timeseries_ids, rows)
+
+    @contextmanager
+    def writer(self, dataset_id):
+        # Yields write(timeseries_ids, rows) for each batch of an upload, on PostgreSQL the batches are copied into a
+        # temporary table and merged in one statement when the block exits
+        with bulk_loader(TimeSeriesData, ['dataset', 'timeseries', 'date', 'cases'],
+                         unique_fields=['dataset', 'timeseries', 'date'], update_fields=['cases']) as load:
+            yield lambda timeseries_ids, rows: load(
+                (dataset_id, timeseries_ids[key], date, cases)
+                for key, cases_by_date in rows.items()
+                for date, cases in cases_by_date.items())
+
+    def read(self, dataset_id, timeseries_list, start_date, end_date, select=None):
+        # (dates, points), points as (timeseries_id, date, cases) ordered by series then date, both read lazily.
+        # select, if given, maps the sorted dates in range to the only ones points are read on
+        dates, points = self.points(dataset_id, timeseries_list, start_date, end_date, select)
+        points = points.order_by('timeseries_id', 'date').values_list('timeseries_id', 'date', 'cases')
+        return dates, points.iterator(chunk_size=STREAM_CHUNK_SIZE)
+
+    def sum_by_country(self, dataset_id, timeseries_list, start_date, end_date, select=None):
+        # Same dates as read, sums as (country_region, date, cases) of the series of each country, one per country and
+        # date in no particular order. Summed by the database, only the sums are fetched
+        dates, points = self.points(dataset_id, timeseries_list, start_date, end_date, select)
+        sums = points.values('timeseries__location__country_region', 'date').annotate(
+            total=Sum('cases')).order_by().values_list('timeseries__location__country_region', 'date', 'total')
+        return dates, sums.iterator(chunk_size=STREAM_CHUNK_SIZE)
+
+    def points(self, dataset_id, timeseries_list, start_date, end_date, select):
+        # (dates, points) of read before the points are ordered and their columns picked
+        points = TimeSeriesData.objects.filter(
+            dataset_id=dataset_id,
+            timeseries__in=timeseries_list,
+            date__range=[start_date, end_date])
+        dates = points.order_by('date').values_list('date', flat=True).distinct()
+        if select is not None:
+            dates = select(list(dates))
+            points = points.filter(date__in=dates)
+        return dates, points
+
+    def negative(self, dataset_id, timeseries_list, start_date, end_date):
+        # True if a series has a negative point between start_date and end_date, answered from timeseriesdata_negative
+        return TimeSeriesData.objects.filter(
+            dataset_id=dataset_id,
+            timeseries__in=timeseries_list,
+            date__range=[start_date, end_date],
+            cases__lt=0).exists()
+
+    def overlaps(self, dataset_id, timeseries_ids, dates):
+        # True if any series in timeseries_ids has a point on one of dates, one index probe per series and date
+        return TimeSeriesData.objects.filter(
+            dataset_id=dataset_id,
+            timeseries__in=timeseries_ids,
+            date__in=dates).exists()
+
+    def load(self, dataset_id, timeseries_ids, dates=None):
+        # {timeseries_id: {date: cases}} of every series in timeseries_ids, on dates only if given
+        points = TimeSeriesData.objects.filter(dataset_id=dataset_id, timeseries__in=timeseries_ids)
+        if dates is not None:
+            points = points.filter(date__in=dates)
+
+        rows = {}
+        for timeseries_id, day, cases in points.values_list('timeseries_id', 'date', 'cases').iterator():
+            rows.setdefault(timeseries_id, {})[day] = cases
+        return rows
+
+    def delete(self, dataset_id, timeseries_list):
+        # The dataset partition is dropped, otherwise a single DELETE, no row is loaded to emulate the cascade
+        if partitioned():
+            drop_partition(Dataset.KindChoice.TIME_SERIES, dataset_id)
+            return
+        points = TimeSeriesData.objects.filter(dataset_id=dataset_id)
+        points._raw_delete(points.db)
+
+    def clear(self):
+        TimeSeriesData.objects.all().delete()
+
+
+class ArrayStorage:
+    # One TimeSeriesArray row per series, ranges are read by slicing the packed cases
+
+    def write(self, dataset_id, timeseries_ids, rows):
+        # Merged with what is already stored, uploaded dates overwrite stored ones
+        stored = {
+            timeseries_id: (start_date.toordinal(), np.frombuffer(cases, dtype=CASES_DTYPE))
+            for timeseries_id, start_date, cases in TimeSeriesArray.objects.filter(
+                timeseries__in=list(timeseries_ids.values())).values_list('timeseries_id', 'start_date', 'cases')
+        }
+
+        arrays = []
+        for key, cases_by_date in rows.items():
+            timeseries_id = timeseries_ids[key]
+            ordinals = np.fromiter((date.toordinal() for date in cases_by_date), dtype=np.int64,
+                                   count=len(cases_by_date))
+            first, last = ordinals.min(), ordinals.max()
+
+            if timeseries_id in stored:
+                stored_first, stored_cases = stored[timeseries_id]
+                first = min(first, stored_first)
+                last = max(last, stored_first + len(stored_cases) - 1)
+
+            cases = np.full(last - first + 1, TimeSeriesArray.MISSING, dtype=CASES_DTYPE)
+            if timeseries_id in stored:
+                cases[stored_first - first:stored_first - first + len(stored_cases)] = stored_cases
+            cases[ordinals - first] = np.fromiter(cases_by_date.values(), dtype=np.int64, count=len(cases_by_date))
+
+            arrays.append(TimeSeriesArray(timeseries_id=timeseries_id, start_date=date.fromordinal(int(first)),
+                                          cases=cases.tobytes()))
+
+        TimeSeriesArray.objects.bulk_create(
+            arrays,
+            update_conflicts=True,
+            unique_fields=['timeseries'],
+            update_fields=['start_date', 'cases'],
+        )
+
+    @contextmanager
+    def writer(self, dataset_id):
+        # Batches are merged with the stored arrays as they come
+        yield lambda timeseries_ids, rows: self.write(dataset_id, timeseries_ids, rows)
+
+    def read(self, dataset_id, timeseries_list, start_date, end_date, select=None):
+        # Same (dates, points) as RowStorage.read from one row per series
+        windows = [
+            (timeseries_id,) + window(start, cases, start_date, end_date)
+            for timeseries_id, start, cases in self.arrays(timeseries_list)
+        ]
+
+        present = [first + np.flatnonzero(cases != TimeSeriesArray.MISSING) for _, first, cases in windows]
+        dates = [date.fromordinal(ordinal) for ordinal in np.unique(np.concatenate(present)).tolist()] \
+            if present else []
+
+        # Selected dates as ordinals, matched against the offsets of each window
+        if select is not None:
+            dates = select(dates)
+            ordinals = np.array([day.toordinal() for day in dates], dtype=np.int64)
+
+        def points():
+            for timeseries_id, first, cases in windows:
+                offsets = np.flatnonzero(cases != TimeSeriesArray.MISSING)
+                if select is not None:
+                    offsets = offsets[np.isin(first + offsets, ordinals)]
+                for offset in offsets.tolist():
+                    yield timeseries_id, date.fromordinal(first + offset), int(cases[offset])
+
+        return dates, points()
+
+    def sum_by_country(self, dataset_id, timeseries_list, start_date, end_date, select=None):
+        # Same as RowStorage.sum_by_country, arrays are added to one per country as they are fetched so only those
+        # are held
+        totals = {}
+        for country_region, start, cases in TimeSeriesArray.objects.filter(timeseries__in=timeseries_list).values_list(
+                'timeseries__location__country_region', 'start_date', 'cases').iterator(chunk_size=STREAM_CHUNK_SIZE):
+            first, cases = window(start.toordinal(), np.frombuffer(cases, dtype=CASES_DTYPE), start_date, end_date)
+            present = cases != TimeSeriesArray.MISSING
+            if present.any():
+                totals[country_region] = add_window(totals.get(country_region), first,
+                                                    np.where(present, cases, 0), present)
+
+        present = [first + np.flatnonzero(present) for first, _, present in totals.values()]
+        dates = [date.fromordinal(ordinal) for ordinal in np.unique(np.concatenate(present)).tolist()] \
+            if present else []
+        if select is not None:
+            dates = select(dates)
+        ordinals = np.array([day.toordinal() for day in dates], dtype=np.int64)
+
+        def sums():
+            for country_region, (first, total, present) in totals.items():
+                offsets = ordinals - first
+                inside = np.flatnonzero((offsets >= 0) & (offsets < len(total)))
+                for index in inside[present[offsets[inside]]].tolist():
+                    yield country_region, dates[index], int(total[offsets[index]])
+
+        return dates, sums()
+
+    def negative(self, dataset_id, timeseries_list, start_date, end_date):
+        # Same as RowStorage.negative, days without a value are the lowest int32
+        for _, start, cases in self.arrays(timeseries_list):
+            _, cases = window(start, cases, start_date, end_date)
+            if ((cases < 0) & (cases != TimeSeriesArray.MISSING)).any():
+                return True
+        return False
+
+    def arrays(self, timeseries_list):
+        # (timeseries_id, start ordinal, cases) ordered by series, the cases buffer is not copied
+        return [
+            (timeseries_id, start_date.toordinal(), np.frombuffer(cases, dtype=CASES_DTYPE))
+            for timeseries_id, start_date, cases in TimeSeriesArray.objects.filter(
+                timeseries__in=timeseries_list).order_by('timeseries_id').values_list(
+                'timeseries_id', 'start_date', 'cases')
+        ]
+
+    def overlaps(self, dataset_id, timeseries_ids, dates):
+        # Same as RowStorage.overlaps, looked up in the arrays of the series
+        ordinals = np.array([date.toordinal() for date in dates], dtype=np.int64)
+        for _, start, cases in self.arrays(timeseries_ids):
+            offsets = ordinals[(ordinals >= start) & (ordinals < start + len(cases))] - start
+            if (cases[offsets] != TimeSeriesArray.MISSING).any():
+                return True
+        return False
+
+    def load(self, dataset_id, timeseries_ids, dates=None):
+        rows = {}
+        for timeseries_id, start, cases in self.arrays(timeseries_ids):
+            present = np.flatnonzero(cases != TimeSeriesArray.MISSING).tolist()
+            rows[timeseries_id] = {date.fromordinal(start + offset): int(cases[offset]) for offset in present}
+            if dates is not None:
+                rows[timeseries_id] = {day: rows[timeseries_id][day] for day in dates if day in rows[timeseries_id]}
+        return rows
+
+    def delete(self, dataset_id, timeseries_list):
+        arrays = TimeSeriesArray.objects.filter(timeseries__in=timeseries_list)
+        arrays._raw_delete(arrays.db)
+
+    def clear(self):
+        TimeSeriesArray.objects.all().delete()
+
+
+STORAGES = {
+    'rows': RowStorage(),
+    'array': ArrayStorage(),
+}
+
+
+# **************************************************************************************************** HELPER FUNCTIONS
+
+def window(start, cases, start_date, end_date):
+    # (first ordinal, slice of cases) between start_date and end_date inclusive
+    first = max(start, start_date.toordinal())
+    last = min(start + len(cases) - 1, end_date.toordinal())
+    if last < first:
+        return first, cases[:0]
+    return first, cases[first - start:last - start + 1]
+
+
+def add_window(total, first, cases, present):
+    # (first ordinal, sums, present) of total, None for an empty one, with cases starting at first added to it. The
+    # sums are widened to int64 and grow to span both
+    if total is None:
+        return first, cases.astype(np.int64), present.copy()
+    total_first, sums, total_present = total
+
+    start = min(total_first, first)
+    end = max(total_first + len(sums), first + len(cases))
+    if start != total_first or end != total_first + len(sums):
+        before, after = total_first - start, end - total_first - len(sums)
+        sums = np.pad(sums, (before, after))
+        total_present = np.pad(total_present, (before, after))
+
+    sums[first - start:first - start + len(cases)] += cases
+    total_present[first - start:first - start + len(cases)] |= present
+    return start, sums, total_present
@@ -1,8 +1,26 @@
+import gzip
+import json
+from io import StringIO
 from datetime import datetime
+from unittest import mock
 
-from django.test import TestCase
-from .models import TimeSeries, TimeSeriesData
-from .views import parse_post_header, gen_response_csv, gen_response_json, parse_post_row, parse_post_params
+import msgpack
+import pyarrow as pa
+import pyarrow.parquet as pq
+import zstandard
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from covidAPI.pagination import encode_cursor
+from covidAPI.testing import QueryPlanMixin
+from datasets.locations import ensure_location
+from datasets.models import Dataset, Location
+from datasets.versions import ensure_dataset
+from .active import materialize_active
+from .models import TimeSeries, TimeSeriesArray, TimeSeriesData
+from .views import parse_post_header, gen_response_csv, gen_response_json, gen_response_json_columnar, \
+    parse_post_row, parse_post_rows, parse_post_params
 
 
 class TimeSeriesViewsPost(TestCase):
@@ -28,8 +46,9 @@ class TimeSeriesViewsPost(TestCase):
         self.assertEqual(response.status_code, 200)
 
         response = self.client.get('/time_series/' + name + '/' + type)
-        self.assertIs(b"999999" in response.content, True)
-        self.assertIs(b"999998" in response.content, True)
+        content = response.getvalue()
+        self.assertIs(b"999999" in content, True)
+        self.assertIs(b"999998" in content, True)
 
     def test_post_invalid_header(self):
         name = "abc"
@@ -51,6 +70,129 @@ class TimeSeriesViewsPost(TestCase):
         response = self.client.post('/time_series/' + name + '/' + type, body, content_type='application/csv')
         self.assertEqual(response.status_code, 400)
 
+    def test_post_duplicate_rows(self):
+        name = "abc"
+        type = "deaths"
+        body = """Province/State,Country/Region,Lat,Long,1/22/20,1/23/20
+                  ,Afghanistan,33.93911,67.709953,1,2
+                  ,Afghanistan,33.93911,67.709953,3,4"""
+
+        response = self.client.post('/time_series/' + name + '/' + type, body, content_type='application/csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(TimeSeries.objects.filter(dataset__name=name, data_type='D').count(), 1)
+        self.assertEqual(list(TimeSeriesData.objects.filter(timeseries__data_type='D').order_by('date').values_list(
+            'cases', flat=True)), [3, 4])
+
+    def test_post_duplicate_across_batches(self):
+        body = """Province/State,Country/Region,Lat,Long,1/22/20,1/23/20
+                  ,Afghanistan,33.93911,67.709953,1,2
+                  ,Afghanistan,33.93911,67.709953,3,4"""
+
+        with mock.patch('time_series.views.UPSERT_BATCH_SIZE', 2):
+            response = self.client.post('/time_series/abc/deaths', body, content_type='application/csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(TimeSeriesData.objects.filter(timeseries__data_type='D').order_by('date').values_list(
+            'cases', flat=True)), [3, 4])
+
+    def test_post_locations_shared(self):
+        # every dataset and data type references the same location rows
+        body = """Province/State,Country/Region,Lat,Long,1/22/20
+                  BC,Canada,49.2827,123.1207,1
+                  ON,Canada,25.1227,122.9807,2"""
+
+        for name, type in [("abc", "deaths"), ("abc", "confirmed"), ("def", "deaths")]:
+            response = self.client.post('/time_series/' + name + '/' + type, body, content_type='application/csv')
+            self.assertEqual(response.status_code, 200)
+        # with the active series of both datasets
+        self.assertEqual(TimeSeries.objects.count(), 10)
+        self.assertEqual(Location.objects.count(), 2)
+
+    def test_post_constant_queries(self):
+        # number of queries must not grow with the number of rows or dates, each upload creates a new dataset
+        def count_queries(rows, dates):
+            header = 'Province/State,Country/Region,Lat,Long,' + ','.join(
+                '1/{}/20'.format(day + 1) for day in range(dates))
+            body = '\n'.join([header] + [
+                'Region{},Country,10.0,10.0,'.format(index) + ','.join(['1'] * dates) for index in range(rows)])
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.post('/time_series/count{}/deaths'.format(rows), body,
+                                            content_type='application/csv')
+            self.assertEqual(response.status_code, 200)
+            return len(context.captured_queries)
+
+        self.assertEqual(count_queries(2, 2), count_queries(40, 30))
+
+    def test_post_compressed(self):
+        body = """Province/State,Country/Region,Lat,Long,1/22/20,1/23/20
+                  ,Afghanistan,33.93911,67.709953,0,0
+                  Australian Capital Territory,Australia,-35.4735,149.0124,0,0""".encode()
+
+        for encoding, compressed in [('gzip', gzip.compress(body)), ('zstd', zstandard.ZstdCompressor().compress(body))]:
+            response = self.client.post('/time_series/' + encoding + '/deaths', compressed,
+                                        content_type='application/csv', HTTP_CONTENT_ENCODING=encoding)
+            self.assertEqual(response.status_code, 200, encoding)
+            self.assertEqual(TimeSeriesData.objects.filter(timeseries__dataset__name=encoding,
+                                                           timeseries__data_type='D').count(), 4)
+
+    def test_post_compressed_invalid(self):
+        body = b"Province/State,Country/Region,Lat,Long,1/22/20\nBC,Canada,49.2827,123.1207,5"
+
+        response = self.client.post('/time_series/abc/deaths', body, content_type='application/csv',
+                                    HTTP_CONTENT_ENCODING='br')
+        self.assertEqual(response.status_code, 415)
+
+        # a truncated body fails instead of loading the rows read so far
+        response = self.client.post('/time_series/abc/deaths', zstandard.ZstdCompressor().compress(body)[:-4],
+                                    content_type='application/csv', HTTP_CONTENT_ENCODING='zstd')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(TimeSeriesData.objects.count(), 0)
+
+    def test_post_append(self):
+        body = """Province/State,Country/Region,Lat,Long,1/22/20
+                  BC,Canada,49.2827,123.1207,5"""
+        self.assertEqual(self.client.post('/time_series/abc/deaths', body, content_type='application/csv').status_code,
+                         200)
+
+        # a new date and a new location are added
+        body = """Province/State,Country/Region,Lat,Long,1/23/20
+                  BC,Canada,49.2827,123.1207,6
+                  ON,Canada,25.1227,122.9807,7"""
+        response = self.client.post('/time_series/abc/deaths?mode=append', body, content_type='application/csv')
+        self.assertEqual(response.status_code, 200)
+        # and the active points of the same dates
+        self.assertEqual(TimeSeriesData.objects.count(), 6)
+
+        # one stored point rejects the whole upload, the new location of the same upload is not kept either
+        body = """Province/State,Country/Region,Lat,Long,1/23/20,1/24/20
+                  QC,Canada,46.8139,71.2080,1,1
+                  ON,Canada,25.1227,122.9807,7,8"""
+        response = self.client.post('/time_series/abc/deaths?mode=append', body, content_type='application/csv')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(TimeSeriesData.objects.count(), 6)
+        self.assertEqual(TimeSeries.objects.count(), 4)
+
+        # the same dates of another data type are new
+        response = self.client.post('/time_series/abc/confirmed?mode=append', body, content_type='application/csv')
+        self.assertEqual(response.status_code, 200)
+
+    def test_post_invalid_mode(self):
+        body = """Province/State,Country/Region,Lat,Long,1/22/20
+                  BC,Canada,49.2827,123.1207,5"""
+        response = self.client.post('/time_series/abc/deaths?mode=replace', body, content_type='application/csv')
+        self.assertEqual(response.status_code, 400)
+
+    def test_post_invalid_row_rolls_back(self):
+        # the invalid row is in the last batch, earlier batches must not be kept
+        body = """Province/State,Country/Region,Lat,Long,1/22/20,1/23/20
+                  A,Canada,10.0,10.0,1,1
+                  B,Canada,10.0,10.0,1,1
+                  C,Canada,10.0,10.0,1,abc"""
+
+        with mock.patch('time_series.views.UPSERT_BATCH_SIZE', 2):
+            response = self.client.post('/time_series/abc/deaths', body, content_type='application/csv')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(TimeSeries.objects.count(), 0)
+
 
 class TimeSeriesViewsGet(TestCase):
 
@@ -58,10 +200,9 @@ class TimeSeriesViewsGet(TestCase):
     def setUpTestData(cls):
         # Row 1
         params_1 = {
-            "timeseries_name": "test1",
+            "dataset_id": ensure_dataset(Dataset.KindChoice.TIME_SERIES, "test1"),
             "data_type": TimeSeries.TypeChoice["deaths".upper()],
-            "province_state": "BC",
-            "country_region": "Canada",
+            "location_id": ensure_location("Canada", "BC"),
             "lat": 49.2827,
             "long": 123.1207,
         }
@@ -84,10 +225,9 @@ class TimeSeriesViewsGet(TestCase):
 
         # Row 2
         params_2 = {
-            "timeseries_name": "test1",
+            "dataset_id": ensure_dataset(Dataset.KindChoice.TIME_SERIES, "test1"),
             "data_type": TimeSeries.TypeChoice["deaths".upper()],
-            "province_state": "ON",
-            "country_region": "Canada",
+            "location_id": ensure_location("Canada", "ON"),
             "lat": 25.1227,
             "long": 122.9807,
         }
@@ -111,7 +251,7 @@ class TimeSeriesViewsGet(TestCase):
     def test_get_available(self):
         response = self.client.get('/time_series/test1/deaths')
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(response.content.strip(),
+        self.assertEqual(response.getvalue().strip(),
                          b'Province/State,'
                          b'Country/Region,'
                          b'Lat,'
@@ -129,7 +269,7 @@ class TimeSeriesViewsGet(TestCase):
             'regions': ['BC'],
         })
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(response.content.strip(),
+        self.assertEqual(response.getvalue().strip(),
                          b'Province/State,'
                          b'Country/Region,'
                          b'Lat,'
@@ -141,48 +281,537 @@ class TimeSeriesViewsGet(TestCase):
     def test_get_available_json(self):
         response = self.client.get('/time_series/test1/deaths', {'format': 'json'})
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(response.content.strip(),
+        self.assertEqual(response.getvalue().strip(),
                          b'{'
-                         b'"0": {'
-                         b'"Province/State": "BC", '
-                         b'"Country/Region": "Canada", '
-                         b'"Lat": 49.2827, '
-                         b'"Long": 123.1207, '
-                         b'"01/22/20": 100, '
-                         b'"01/23/20": 100}, '
-                         b'"1": {'
-                         b'"Province/State": "ON", '
-                         b'"Country/Region": "Canada", '
-                         b'"Lat": 25.1227, '
-                         b'"Long": 122.9807, '
-                         b'"01/22/20": 200, '
-                         b'"01/23/20": 200}'
+                         b'"0":{'
+                         b'"Province/State":"BC",'
+                         b'"Country/Region":"Canada",'
+                         b'"Lat":49.2827,'
+                         b'"Long":123.1207,'
+                         b'"01/22/20":100,'
+                         b'"01/23/20":100},'
+                         b'"1":{'
+                         b'"Province/State":"ON",'
+                         b'"Country/Region":"Canada",'
+                         b'"Lat":25.1227,'
+                         b'"Long":122.9807,'
+                         b'"01/22/20":200,'
+                         b'"01/23/20":200}'
                          b'}')
 
+    def test_get_available_json_columnar(self):
+        # ON has no data for 01/24/20
+        timeseries = TimeSeries.objects.get(location__province_state="BC")
+        TimeSeriesData.objects.create(timeseries=timeseries, date=datetime(2020, 1, 24), cases=150)
+
+        response = self.client.get('/time_series/test1/deaths', {'format': 'json-columnar'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(response.getvalue().strip(),
+                         b'{"columns":["Province/State","Country/Region","Lat","Long"],'
+                         b'"dates":["01/22/20","01/23/20","01/24/20"],'
+                         b'"rows":['
+                         b'["BC","Canada",49.2827,123.1207,100,100,150],'
+                         b'["ON","Canada",25.1227,122.9807,200,200,null]]}')
+
+    def test_get_available_binary(self):
+        # one row per location and date in every binary format, with the filters applied
+        expected = {
+            'Province/State': ['ON', 'ON'],
+            'Country/Region': ['Canada', 'Canada'],
+            'Lat': [25.1227, 25.1227],
+            'Long': [122.9807, 122.9807],
+            'Date': ['2020-01-22', '2020-01-23'],
+            'Cases': [200, 200],
+        }
+        query = {'regions': 'ON', 'start_date': '2020-01-01'}
+
+        response = self.client.get('/time_series/test1/deaths', {**query, 'format': 'msgpack'})
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertEqual(msgpack.unpackb(response.content), expected)
+
+        for format, read in [('parquet', lambda body: pq.read_table(pa.BufferReader(body))),
+                             ('arrow', lambda body: pa.ipc.open_stream(body).read_all())]:
+            response = self.client.get('/time_series/test1/deaths', {**query, 'format': format})
+            self.assertEqual(response.status_code, 200)
+            table = read(response.content)
+            self.assertEqual(table.column('Date').to_pylist(), [datetime(2020, 1, 22).date(),
+                                                                datetime(2020, 1, 23).date()])
+            self.assertEqual({name: values for name, values in table.to_pydict().items() if name != 'Date'},
+                             {name: values for name, values in expected.items() if name != 'Date'})
+
+    def test_get_unavailable_binary(self):
+        response = self.client.get('/time_series/sdgdsgdgsg/deaths', {'format': 'parquet'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(pq.read_table(pa.BufferReader(response.content)).column_names,
+                         ['Province/State', 'Country/Region', 'Lat', 'Long', 'Date', 'Cases'])
+
+    def test_get_constant_queries(self):
+        # dataset version, series, dates for the CSV header and the streamed points
+        with self.assertNumQueries(4):
+            self.client.get('/time_series/test1/deaths').getvalue()
+        with self.assertNumQueries(3):
+            self.client.get('/time_series/test1/deaths', {'format': 'json'}).getvalue()
+
+    def test_get_filters_resolved_once(self):
+        # dataset version, matching locations, series filtered on their ids and the streamed points
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/time_series/test1/deaths', {'countries': 'Canada', 'regions': 'ON',
+                                                                     'format': 'json'})
+            self.assertEqual(json.loads(response.getvalue())['0']['Province/State'], 'ON')
+        self.assertEqual(len(context.captured_queries), 4)
+        self.assertEqual([query['sql'] for query in context.captured_queries
+                          if '"province_state" IN' in query['sql'] and 'time_series_' in query['sql']], [])
+
+    @override_settings(COMPRESSION_MIN_SIZE=1)
+    def test_get_compressed(self):
+        # streamed responses are compressed as they are sent, the ETag becomes weak
+        plain = self.client.get('/time_series/test1/deaths', {'format': 'json'}).getvalue()
+        response = self.client.get('/time_series/test1/deaths', {'format': 'json'}, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(gzip.decompress(response.getvalue()), plain)
+
+    def test_get_streaming(self):
+        response = self.client.get('/time_series/test1/deaths')
+        self.assertTrue(response.streaming)
+        response = self.client.get('/time_series/test1/deaths', {'format': 'json'})
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/json')
+
+    def test_get_missing_dates(self):
+        # ON has no data for 01/24/20, its cell must stay empty instead of shifting columns
+        timeseries = TimeSeries.objects.get(location__province_state="BC")
+        TimeSeriesData.objects.create(timeseries=timeseries, date=datetime(2020, 1, 24), cases=150)
+
+        response = self.client.get('/time_series/test1/deaths')
+        self.assertEqual(response.getvalue().strip(),
+                         b'Province/State,'
+                         b'Country/Region,'
+                         b'Lat,'
+                         b'Long,'
+                         b'01/22/20,'
+                         b'01/23/20,'
+                         b'01/24/20\r\n'
+                         b'BC,Canada,49.2827,123.1207,100,100,150\r\n'
+                         b'ON,Canada,25.1227,122.9807,200,200,')
+
     def test_get_unavailable(self):
         response = self.client.get('/time_series/sdgdsgdgsg/deaths')
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(response.content.strip(), b'Province/State,Country/Region,Lat,Long')
+        self.assertEqual(response.getvalue().strip(), b'Province/State,Country/Region,Lat,Long')
 
     def test_get_unavailable_json(self):
         response = self.client.get('/time_series/sdgdsgdgsg/deaths', {'format': 'json'})
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(response.content.strip(), b'{}')
+        self.assertEqual(response.getvalue().strip(), b'{}')
+
+    def test_get_paginated(self):
+        # one location per page in location order, the last page has no cursor
+        response = self.client.get('/time_series/test1/deaths', {'limit': 1})
+        self.assertEqual(response.getvalue().strip().split(b'\r\n')[1:], [b'BC,Canada,49.2827,123.1207,100,100'])
+
+        response = self.client.get('/time_series/test1/deaths', {'limit': 1, 'after': response['X-Next-Cursor']})
+        self.assertEqual(response.getvalue().strip().split(b'\r\n')[1:], [b'ON,Canada,25.1227,122.9807,200,200'])
+        self.assertFalse(response.has_header('X-Next-Cursor'))
+
+    def test_get_paginated_constant_queries(self):
+        # the page edge on top of the queries of test_get_constant_queries, whatever the page
+        cursor = self.client.get('/time_series/test1/deaths', {'limit': 1})['X-Next-Cursor']
+        with self.assertNumQueries(5):
+            self.client.get('/time_series/test1/deaths', {'limit': 1, 'after': cursor}).getvalue()
+
+    def test_get_invalid_pagination(self):
+        for params in [{'limit': -1}, {'limit': 1, 'after': 'not a cursor'}, {'after': 'WzFd'}]:
+            response = self.client.get('/time_series/test1/deaths', params)
+            self.assertEqual(response.status_code, 400, params)
 
     def test_get_invalid_params(self):
         response = self.client.get('/time_series/test1/asfasfsafsafasfa')
         self.assertEqual(response.status_code, 400)
 
 
+class TimeSeriesViewsActive(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        # confirmed and deaths for two locations over two dates
+        cls.timeseries = {}
+        for data_type, cases in [("confirmed", 100), ("deaths", 10)]:
+            for province_state, lat, long in [("BC", 49.2827, 123.1207), ("ON", 25.1227, 122.9807)]:
+                timeseries = TimeSeries.objects.create(
+                    dataset_id=ensure_dataset(Dataset.KindChoice.TIME_SERIES, "test1"),
+                    data_type=TimeSeries.TypeChoice[data_type.upper()],
+                    location_id=ensure_location("Canada", province_state),
+                    lat=lat,
+                    long=long,
+                )
+                cls.timeseries[(data_type, province_state)] = timeseries
+                TimeSeriesData.objects.create(timeseries=timeseries, date=datetime(2020, 1, 22), cases=cases)
+                TimeSeriesData.objects.create(timeseries=timeseries, date=datetime(2020, 1, 23), cases=cases * 2)
+        materialize_active(ensure_dataset(Dataset.KindChoice.TIME_SERIES, "test1"))
+
+    def test_get_active(self):
+        response = self.client.get('/time_series/test1/active')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.getvalue().strip(),
+                         b'Province/State,'
+                         b'Country/Region,'
+                         b'Lat,'
+                         b'Long,'
+                         b'01/22/20,'
+                         b'01/23/20\r\n'
+                         b'BC,Canada,49.2827,123.1207,90,180\r\n'
+                         b'ON,Canada,25.1227,122.9807,90,180')
+
+    def test_get_active_specific(self):
+        response = self.client.get('/time_series/test1/active', {
+            'start_date': '2020-01-23',
+            'regions': 'ON',
+            'format': 'json',
+        })
+        self.assertEqual(json.loads(response.getvalue()), {'0': {
+            'Province/State': 'ON', 'Country/Region': 'Canada', 'Lat': 25.1227, 'Long': 122.9807, '01/23/20': 180}})
+
+    def test_get_active_json_columnar(self):
+        response = self.client.get('/time_series/test1/active', {'format': 'json-columnar', 'regions': 'BC'})
+        self.assertEqual(json.loads(response.getvalue()), {
+            'columns': ['Province/State', 'Country/Region', 'Lat', 'Long'],
+            'dates': ['01/22/20', '01/23/20'],
+            'rows': [['BC', 'Canada', 49.2827, 123.1207, 90, 180]]})
+
+    def test_get_active_msgpack(self):
+        response = self.client.get('/time_series/test1/active', {'format': 'msgpack', 'end_date': '2020-01-22'})
+        self.assertEqual(msgpack.unpackb(response.content), {
+            'Province/State': ['BC', 'ON'], 'Country/Region': ['Canada', 'Canada'], 'Lat': [49.2827, 25.1227],
+            'Long': [123.1207, 122.9807], 'Date': ['2020-01-22', '2020-01-22'], 'Cases': [90, 90]})
+
+    def test_get_active_paginated(self):
+        response = self.client.get('/time_series/test1/active', {'limit': 1, 'format': 'json-columnar'})
+        self.assertEqual(json.loads(response.getvalue())['rows'], [['BC', 'Canada', 49.2827, 123.1207, 90, 180]])
+
+        response = self.client.get('/time_series/test1/active', {'limit': 1, 'format': 'json-columnar',
+                                                                 'after': response['X-Next-Cursor']})
+        self.assertEqual(json.loads(response.getvalue())['rows'], [['ON', 'Canada', 25.1227, 122.9807, 90, 180]])
+        self.assertFalse(response.has_header('X-Next-Cursor'))
+
+    def test_get_active_constant_queries(self):
+        # dataset version, negative points, series, dates for the CSV header and the streamed points
+        with self.assertNumQueries(5):
+            self.client.get('/time_series/test1/active').getvalue()
+
+    def test_get_active_missing_deaths_date(self):
+        TimeSeriesData.objects.filter(timeseries=self.timeseries[("deaths", "ON")], date=datetime(2020, 1, 23)).delete()
+        materialize_active(self.timeseries[("deaths", "ON")].dataset_id)
+        response = self.client.get('/time_series/test1/active')
+        self.assertEqual(response.getvalue().strip(), b'Province/State,Country/Region,Lat,Long')
+
+    def test_get_active_missing_deaths_location(self):
+        self.timeseries[("deaths", "ON")].delete()
+        materialize_active(self.timeseries[("confirmed", "ON")].dataset_id)
+        response = self.client.get('/time_series/test1/active')
+        self.assertEqual(response.getvalue().strip(), b'Province/State,Country/Region,Lat,Long')
+
+    def test_get_active_negative(self):
+        TimeSeriesData.objects.filter(timeseries=self.timeseries[("deaths", "BC")]).update(cases=1000)
+        materialize_active(self.timeseries[("deaths", "BC")].dataset_id)
+        response = self.client.get('/time_series/test1/active')
+        self.assertEqual(response.getvalue().strip(), b'Province/State,Country/Region,Lat,Long')
+
+    def test_get_active_maintained_on_post(self):
+        # active points are written with the confirmed and deaths points, whichever is uploaded last
+        def post(data_type, body, mode='merge'):
+            response = self.client.post('/time_series/posted/{}?mode={}'.format(data_type, mode), body,
+                                        content_type='application/csv')
+            self.assertEqual(response.status_code, 200)
+
+        def get():
+            return json.loads(self.client.get('/time_series/posted/active', {'format': 'json-columnar'}).getvalue())
+
+        post('deaths', "Province/State,Country/Region,Lat,Long,1/22/20\nBC,Canada,49.2827,123.1207,10")
+        self.assertEqual(get()['rows'], [])
+
+        post('confirmed', "Province/State,Country/Region,Lat,Long,1/22/20\nBC,Canada,49.2827,123.1207,100")
+        self.assertEqual(get()['rows'], [['BC', 'Canada', 49.2827, 123.1207, 90]])
+
+        # a date appended to deaths only is not matched until confirmed has it too
+        post('deaths', "Province/State,Country/Region,Lat,Long,1/23/20\nBC,Canada,49.2827,123.1207,20", 'append')
+        self.assertEqual(get()['rows'], [])
+        post('confirmed', "Province/State,Country/Region,Lat,Long,1/23/20\nBC,Canada,49.2827,123.1207,150", 'append')
+        self.assertEqual(get(), {'columns': ['Province/State', 'Country/Region', 'Lat', 'Long'],
+                                 'dates': ['01/22/20', '01/23/20'],
+                                 'rows': [['BC', 'Canada', 49.2827, 123.1207, 90, 130]]})
+
+        # merging new values recomputes the dates they cover
+        post('deaths', "Province/State,Country/Region,Lat,Long,1/23/20\nBC,Canada,49.2827,123.1207,50")
+        self.assertEqual(get()['rows'], [['BC', 'Canada', 49.2827, 123.1207, 90, 100]])
+
+
+class TimeSeriesViewsRollups(TestCase):
+    body = """Province/State,Country/Region,Lat,Long,1/24/20,1/26/20,1/27/20,2/1/20,2/3/20
+BC,Canada,49.2827,123.1207,1,2,3,4,5
+ON,Canada,25.1227,122.9807,10,20,30,40,50
+,Afghanistan,33.93911,67.709953,100,200,300,400,500"""
+
+    def setUp(self):
+        response = self.client.post('/time_series/test1/confirmed', self.body, content_type='application/csv')
+        self.assertEqual(response.status_code, 200)
+
+    def get(self, query):
+        return self.client.get('/time_series/test1/confirmed', query)
+
+    def test_get_group_by_country(self):
+        response = self.get({'group_by': 'country'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.getvalue().strip(),
+                         b'Province/State,Country/Region,Lat,Long,01/24/20,01/26/20,01/27/20,02/01/20,02/03/20\r\n'
+                         b',Afghanistan,49.2827,123.1207,100,200,300,400,500\r\n'
+                         b',Canada,49.2827,123.1207,11,22,33,44,55')
+
+    def test_get_group_by_country_summed_in_database(self):
+        # the rows layout fetches one sum per country and date instead of every point
+        with CaptureQueriesContext(connection) as context:
+            self.get({'group_by': 'country'}).getvalue()
+        self.assertTrue(any('SUM(' in query['sql'] and 'GROUP BY' in query['sql']
+                            for query in context.captured_queries))
+
+    def test_get_interval(self):
+        # weeks end on Sunday, each holds the cases of its last date
+        response = self.get({'interval': 'week', 'regions': 'BC', 'format': 'json-columnar'})
+        self.assertEqual(json.loads(response.getvalue()), {
+            'columns': ['Province/State', 'Country/Region', 'Lat', 'Long'],
+            'dates': ['01/26/20', '02/01/20', '02/03/20'],
+            'rows': [['BC', 'Canada', 49.2827, 123.1207, 2, 4, 5]]})
+
+        response = self.get({'interval': 'month', 'start_date': '2020-01-25', 'end_date': '2020-02-02',
+                             'regions': 'BC', 'format': 'json'})
+        self.assertEqual(json.loads(response.getvalue()), {'0': {
+            'Province/State': 'BC', 'Country/Region': 'Canada', 'Lat': 49.2827, 'Long': 123.1207,
+            '01/27/20': 3, '02/01/20': 4}})
+
+    def test_get_group_by_country_interval(self):
+        response = self.get({'group_by': 'country', 'interval': 'month', 'format': 'msgpack'})
+        self.assertEqual(msgpack.unpackb(response.content), {
+            'Province/State': ['', '', '', ''], 'Country/Region': ['Afghanistan', 'Afghanistan', 'Canada', 'Canada'],
+            'Lat': [49.2827] * 4, 'Long': [123.1207] * 4, 'Date': ['2020-01-27', '2020-02-03'] * 2,
+            'Cases': [300, 500, 33, 55]})
+
+    def test_get_rollups_array(self):
+        queries = [{'group_by': 'country'}, {'interval': 'week'}, {'group_by': 'country', 'interval': 'month'},
+                   {'group_by': 'country', 'interval': 'week', 'start_date': '2020-01-27', 'format': 'json'}]
+        expected = [self.get(query).getvalue() for query in queries]
+
+        with self.settings(TIME_SERIES_STORAGE='array'):
+            response = self.client.post('/time_series/test2/confirmed', self.body, content_type='application/csv')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual([self.client.get('/time_series/test2/confirmed', query).getvalue() for query in queries],
+                             expected)
+
+    def test_get_rollups_cached(self):
+        # streamed responses are stored once sent
+        response = self.get({'group_by': 'country', 'interval': 'week'})
+        self.assertEqual(response['X-Cache'], 'MISS')
+        response.getvalue()
+        self.assertEqual(self.get({'interval': 'week', 'group_by': 'country'})['X-Cache'], 'HIT')
+        self.assertEqual(self.get({'group_by': 'country', 'interval': 'month'})['X-Cache'], 'MISS')
+
+    def test_get_rollups_invalid(self):
+        for query in [{'group_by': 'province'}, {'interval': 'year'}, {'group_by': 'country', 'limit': 10}]:
+            self.assertEqual(self.get(query).status_code, 400, query)
+
+
+class TimeSeriesViewsMetrics(TestCase):
+    # BC on 01/20 to 01/29, ON on the same days but 01/25
+    uploads = [
+        """Province/State,Country/Region,Lat,Long,1/20/20,1/21/20,1/22/20,1/23/20,1/24/20,1/25/20,1/26/20,1/27/20,1/28/20,1/29/20
+BC,Canada,49.2827,123.1207,0,1,3,6,10,15,21,28,36,45""",
+        """Province/State,Country/Region,Lat,Long,1/20/20,1/21/20,1/22/20,1/23/20,1/24/20,1/26/20,1/27/20,1/28/20,1/29/20
+ON,Canada,25.1227,122.9807,10,20,30,40,50,70,80,90,100""",
+    ]
+
+    def post_all(self, name):
+        for body in self.uploads:
+            response = self.client.post('/time_series/{}/confirmed'.format(name), body,
+                                        content_type='application/csv')
+            self.assertEqual(response.status_code, 200)
+
+    def setUp(self):
+        self.post_all('test1')
+
+    def get(self, query, name='test1'):
+        return self.client.get('/time_series/{}/confirmed'.format(name), {'format': 'json-columnar', **query})
+
+    def test_get_new(self):
+        rows = json.loads(self.get({'metric': 'new'}).getvalue())['rows']
+        self.assertEqual(rows, [['BC', 'Canada', 49.2827, 123.1207, None, 1, 2, 3, 4, 5, 6, 7, 8, 9],
+                                ['ON', 'Canada', 49.2827, 123.1207, None, 10, 10, 10, 10, None, None, 10, 10, 10]])
+
+    def test_get_new_look_back(self):
+        # the day before start_date is read so start_date has a value
+        response = self.get({'metric': 'new', 'start_date': '2020-01-27', 'regions': 'BC', 'format': 'csv'})
+        self.assertEqual(response.getvalue().strip(),
+                         b'Province/State,Country/Region,Lat,Long,01/27/20,01/28/20,01/29/20\r\n'
+                         b'BC,Canada,49.2827,123.1207,7,8,9')
+
+    def test_get_look_back_before_min_date(self):
+        # the look back of the first dates stops at the first representable date
+        response = self.get({'metric': 'rolling7', 'start_date': '0001-01-02', 'regions': 'ON'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.getvalue())['rows'][0][4:],
+                         [None, None, None, None, None, None, 10.0, 10.0, 10.0])
+
+    def test_get_rolling7(self):
+        response = self.get({'metric': 'rolling7', 'start_date': '2020-01-27', 'regions': 'BC', 'format': 'json'})
+        self.assertEqual(json.loads(response.getvalue()), {'0': {
+            'Province/State': 'BC', 'Country/Region': 'Canada', 'Lat': 49.2827, 'Long': 123.1207,
+            '01/27/20': 4.0, '01/28/20': 5.0, '01/29/20': 6.0}})
+
+        # the first week has nothing to look back to, the gap on 01/25 is spanned
+        response = self.get({'metric': 'rolling7', 'regions': 'ON'})
+        self.assertEqual(json.loads(response.getvalue())['rows'][0][4:],
+                         [None, None, None, None, None, None, 10.0, 10.0, 10.0])
+
+    def test_get_growth(self):
+        response = self.get({'metric': 'growth', 'end_date': '2020-01-23'})
+        self.assertEqual(json.loads(response.getvalue())['rows'],
+                         [['BC', 'Canada', 49.2827, 123.1207, None, None, 2.0, 1.0],
+                          ['ON', 'Canada', 49.2827, 123.1207, None, 1.0, 0.5, 1 / 3]])
+
+    def test_get_metric_group_by_country(self):
+        # computed from the summed cases, 01/25 is summed from BC only
+        response = self.get({'metric': 'new', 'group_by': 'country', 'start_date': '2020-01-24'})
+        self.assertEqual(json.loads(response.getvalue())['rows'],
+                         [['', 'Canada', 49.2827, 123.1207, 14, -45, 76, 17, 18, 19]])
+
+    def test_get_metric_binary(self):
+        response = self.get({'metric': 'rolling7', 'start_date': '2020-01-29', 'format': 'parquet'})
+        table = pq.read_table(pa.BufferReader(response.content))
+        self.assertEqual(table.schema.field('Cases').type, pa.float64())
+        self.assertEqual(table.column('Cases').to_pylist(), [6.0, 10.0])
+
+    def test_get_metric_array(self):
+        queries = [{'metric': 'new'}, {'metric': 'rolling7', 'start_date': '2020-01-26'},
+                   {'metric': 'growth', 'group_by': 'country', 'format': 'csv'}]
+        expected = [self.get(query).getvalue() for query in queries]
+
+        with self.settings(TIME_SERIES_STORAGE='array'):
+            self.post_all('test2')
+            self.assertEqual([self.get(query, 'test2').getvalue() for query in queries], expected)
+
+    def test_get_metric_invalid(self):
+        for query in [{'metric': 'total'}, {'metric': 'new', 'interval': 'week'}]:
+            self.assertEqual(self.get(query).status_code, 400, query)
+
+
+class TimeSeriesArrayStorage(TestCase):
+    uploads = [
+        ('deaths', """Province/State,Country/Region,Lat,Long,1/22/20,1/23/20
+                      BC,Canada,49.2827,123.1207,1,2
+                      ON,Canada,25.1227,122.9807,3,4"""),
+        # later dates, one location only and a date before the stored ones
+        ('deaths', """Province/State,Country/Region,Lat,Long,1/20/20,1/25/20,1/26/20
+                      BC,Canada,49.2827,123.1207,7,5,6"""),
+        ('confirmed', """Province/State,Country/Region,Lat,Long,1/20/20,1/22/20,1/23/20,1/25/20,1/26/20
+                         BC,Canada,49.2827,123.1207,70,10,20,50,60
+                         ON,Canada,25.1227,122.9807,0,30,40,0,0"""),
+    ]
+
+    queries = [
+        ('deaths', {}),
+        ('deaths', {'format': 'json'}),
+        ('deaths', {'start_date': '2020-01-23', 'end_date': '2020-01-25'}),
+        ('deaths', {'start_date': '2020-01-24', 'end_date': '2020-01-24'}),
+        ('deaths', {'start_date': '2019-01-01', 'end_date': '2020-01-20', 'format': 'json'}),
+        ('deaths', {'regions': 'ON'}),
+        ('active', {'start_date': '2020-01-22', 'end_date': '2020-01-23'}),
+        ('active', {'start_date': '2020-01-23', 'end_date': '2020-01-23', 'format': 'json'}),
+        # ON has no deaths on 01/25
+        ('active', {}),
+    ]
+
+    def get_all(self, name):
+        return [self.client.get('/time_series/{}/{}'.format(name, data_type), query).getvalue()
+                for data_type, query in self.queries]
+
+    def post_all(self, name):
+        for data_type, body in self.uploads:
+            body = '\n'.join(line.strip() for line in body.splitlines())
+            response = self.client.post('/time_series/{}/{}'.format(name, data_type), body,
+                                        content_type='application/csv')
+            self.assertEqual(response.status_code, 200)
+
+    def test_same_responses(self):
+        self.post_all('rows')
+        expected = self.get_all('rows')
+        with self.settings(TIME_SERIES_STORAGE='array'):
+            self.post_all('array')
+            self.assertEqual(self.get_all('array'), expected)
+
+    def test_append(self):
+        # both layouts accept new dates and reject stored ones the same way
+        appended = """Province/State,Country/Region,Lat,Long,1/24/20
+BC,Canada,49.2827,123.1207,9"""
+        overlapping = """Province/State,Country/Region,Lat,Long,1/24/20,1/26/20
+ON,Canada,25.1227,122.9807,8,9
+BC,Canada,49.2827,123.1207,9,10"""
+        responses = {}
+        for storage in ['rows', 'array']:
+            with self.settings(TIME_SERIES_STORAGE=storage):
+                self.post_all(storage)
+                statuses = [self.client.post('/time_series/{}/deaths?mode=append'.format(storage), body,
+                                             content_type='application/csv').status_code
+                            for body in [appended, overlapping]]
+                self.assertEqual(statuses, [200, 409])
+                responses[storage] = self.get_all(storage)
+        self.assertEqual(responses['array'], responses['rows'])
+        self.assertIn(b'BC,Canada,49.2827,123.1207,7,1,2,9,5,6', responses['rows'][0])
+
+    @override_settings(TIME_SERIES_STORAGE='array')
+    def test_one_row_per_series(self):
+        self.post_all('test1')
+        self.assertEqual(TimeSeriesData.objects.count(), 0)
+        # deaths, confirmed and active of both locations
+        self.assertEqual(TimeSeriesArray.objects.count(), 6)
+
+        # 01/20 to 01/26 with 01/21 and 01/24 missing
+        array = TimeSeriesArray.objects.get(timeseries__location__province_state='BC', timeseries__data_type='D')
+        self.assertEqual(array.start_date, datetime(2020, 1, 20).date())
+        self.assertEqual(len(array.cases), 7 * 4)
+
+    @override_settings(TIME_SERIES_STORAGE='array')
+    def test_get_constant_queries(self):
+        self.post_all('test1')
+        # dataset version, series and one row of cases per series
+        with self.assertNumQueries(3):
+            self.client.get('/time_series/test1/deaths').getvalue()
+        # ON has no deaths on 01/25, the negative points check voids the read before the series are loaded
+        with self.assertNumQueries(2):
+            self.client.get('/time_series/test1/active').getvalue()
+
+    def test_convert(self):
+        self.post_all('test1')
+        expected = self.get_all('test1')
+
+        call_command('convert_timeseries_storage', 'array', stdout=StringIO())
+        self.assertEqual(TimeSeriesData.objects.count(), 0)
+        self.assertEqual(TimeSeriesArray.objects.count(), 6)
+        with self.settings(TIME_SERIES_STORAGE='array'):
+            self.assertEqual(self.get_all('test1'), expected)
+
+        call_command('convert_timeseries_storage', 'rows', stdout=StringIO())
+        self.assertEqual(TimeSeriesArray.objects.count(), 0)
+        self.assertEqual(TimeSeriesData.objects.filter(timeseries__data_type__in=['C', 'D']).count(), 17)
+        self.assertEqual(self.get_all('test1'), expected)
+
+
 class TimeSeriesViewsDelete(TestCase):
 
     @classmethod
     def setUp(cls):
         params_1 = {
-            "timeseries_name": "test1",
+            "dataset_id": ensure_dataset(Dataset.KindChoice.TIME_SERIES, "test1"),
             "data_type": TimeSeries.TypeChoice["deaths".upper()],
-            "province_state": "BC",
-            "country_region": "Canada",
+            "location_id": ensure_location("Canada", "BC"),
             "lat": 49.2827,
             "long": 123.1207,
         }
@@ -211,14 +840,94 @@ class TimeSeriesViewsDelete(TestCase):
         response = self.client.delete('/time_series/sfafasgasgasgasgagsa')
         self.assertEqual(response.status_code, 404)
 
+    def test_delete_cascades(self):
+        self.client.delete('/time_series/test1')
+        self.assertEqual(TimeSeries.objects.count(), 0)
+        self.assertEqual(TimeSeriesData.objects.count(), 0)
+
+    def test_delete_set_based(self):
+        # the cases go with their partition or in one DELETE, no row is selected to emulate the cascade
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.delete('/time_series/test1')
+        self.assertEqual(response.status_code, 200)
+        statements = [query['sql'] for query in context.captured_queries]
+        self.assertEqual([sql for sql in statements if sql.startswith('SELECT') and '"time_series_' in sql], [])
+        if connection.vendor == 'postgresql':
+            self.assertTrue([sql for sql in statements if sql.startswith('DROP TABLE')])
+
+    @override_settings(TIME_SERIES_STORAGE='array')
+    def test_delete_array(self):
+        self.client.post('/time_series/test2/deaths', 'Province/State,Country/Region,Lat,Long,1/22/20\nBC,Canada,1,1,5',
+                         content_type='application/csv')
+        response = self.client.delete('/time_series/test2')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(TimeSeriesArray.objects.count(), 0)
+
+
+class TimeSeriesQueryPlans(QueryPlanMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for data_type in ["deaths", "confirmed"]:
+            timeseries = TimeSeries.objects.create(
+                dataset_id=ensure_dataset(Dataset.KindChoice.TIME_SERIES, "test1"),
+                data_type=TimeSeries.TypeChoice[data_type.upper()],
+                location_id=ensure_location("Canada", "BC"),
+                lat=49.2827,
+                long=123.1207,
+            )
+            TimeSeriesData.objects.create(timeseries=timeseries, date=datetime(2020, 1, 22), cases=100)
+        materialize_active(ensure_dataset(Dataset.KindChoice.TIME_SERIES, "test1"))
+
+    def test_get_plan(self):
+        self.assertNoSeqScan(lambda: self.client.get('/time_series/test1/deaths'))
+
+    def test_get_specific_plan(self):
+        self.assertNoSeqScan(lambda: self.client.get('/time_series/test1/deaths', {
+            'start_date': '2020-01-22',
+            'end_date': '2020-01-23',
+            'countries': 'Canada',
+            'regions': 'BC',
+            'format': 'json',
+        }))
+
+    def test_get_paginated_plan(self):
+        self.assertNoSeqScan(lambda: self.client.get('/time_series/test1/deaths', {
+            'limit': 1,
+            'after': encode_cursor([0]),
+        }))
+
+    def test_get_active_plan(self):
+        self.assertNoSeqScan(lambda: self.client.get('/time_series/test1/active'))
+
+    def test_get_rollup_plan(self):
+        self.assertNoSeqScan(lambda: self.client.get('/time_series/test1/deaths', {
+            'group_by': 'country',
+            'interval': 'week',
+        }).getvalue())
+
+    def test_post_plan(self):
+        body = """Province/State,Country/Region,Lat,Long,1/22/20
+                  BC,Canada,49.2827,123.1207,5"""
+        self.assertNoSeqScan(lambda: self.client.post('/time_series/test1/deaths', body,
+                                                      content_type='application/csv'))
+
+    def test_post_append_plan(self):
+        body = """Province/State,Country/Region,Lat,Long,1/23/20
+                  BC,Canada,49.2827,123.1207,5"""
+        self.assertNoSeqScan(lambda: self.client.post('/time_series/test1/deaths?mode=append', body,
+                                                      content_type='application/csv'))
+
+    def test_delete_plan(self):
+        self.assertNoSeqScan(lambda: self.client.delete('/time_series/test1'))
+
 
 class TimeSeriesViewsHelpersExport(TestCase):
     def test_export_csv(self):
         params_1 = {
-            "timeseries_name": "test1",
+            "dataset_id": ensure_dataset(Dataset.KindChoice.TIME_SERIES, "test1"),
             "data_type": TimeSeries.TypeChoice["deaths".upper()],
-            "province_state": "BC",
-            "country_region": "Canada",
+            "location_id": ensure_location("Canada", "BC"),
             "lat": 49.2827,
             "long": 123.1207,
         }
@@ -237,8 +946,10 @@ class TimeSeriesViewsHelpersExport(TestCase):
         timeseriesdata_1a = TimeSeriesData.objects.create(**data_1_a)
         timeseriesdata_1b = TimeSeriesData.objects.create(**data_1_b)
 
-        response = gen_response_csv([timeseries_1], [timeseriesdata_1a, timeseriesdata_1b])
-        self.assertEqual(response.content.strip(),
+        response = gen_response_csv([timeseries_1], [
+            (timeseries_1.id, timeseriesdata_1a.date, timeseriesdata_1a.cases),
+            (timeseries_1.id, timeseriesdata_1b.date, timeseriesdata_1b.cases)])
+        self.assertEqual(response.getvalue().strip(),
                          b'Province/State,'
                          b'Country/Region,'
                          b'Lat,'
@@ -254,7 +965,7 @@ class TimeSeriesViewsHelpersExport(TestCase):
 
     def test_export_csv_empty(self):
         response = gen_response_csv([], [])
-        self.assertEqual(response.content.strip(),
+        self.assertEqual(response.getvalue().strip(),
                          b'Province/State,'
                          b'Country/Region,'
                          b'Lat,'
@@ -262,10 +973,9 @@ class TimeSeriesViewsHelpersExport(TestCase):
 
     def test_export_json(self):
         params_1 = {
-            "timeseries_name": "test1",
+            "dataset_id": ensure_dataset(Dataset.KindChoice.TIME_SERIES, "test1"),
             "data_type": TimeSeries.TypeChoice["deaths".upper()],
-            "province_state": "BC",
-            "country_region": "Canada",
+            "location_id": ensure_location("Canada", "BC"),
             "lat": 49.2827,
             "long": 123.1207,
         }
@@ -284,21 +994,28 @@ class TimeSeriesViewsHelpersExport(TestCase):
         timeseriesdata_1a = TimeSeriesData.objects.create(**data_1_a)
         timeseriesdata_1b = TimeSeriesData.objects.create(**data_1_b)
 
-        response = gen_response_json([timeseries_1], [timeseriesdata_1a, timeseriesdata_1b])
-        self.assertEqual(response.content.strip(),
+        response = gen_response_json([timeseries_1], [
+            (timeseries_1.id, timeseriesdata_1a.date, timeseriesdata_1a.cases),
+            (timeseries_1.id, timeseriesdata_1b.date, timeseriesdata_1b.cases)])
+        self.assertEqual(response.getvalue().strip(),
                          b'{'
-                         b'"0": {'
-                         b'"Province/State": "BC", '
-                         b'"Country/Region": "Canada", '
-                         b'"Lat": 49.2827, '
-                         b'"Long": 123.1207, '
-                         b'"01/22/20": 100, '
-                         b'"01/23/20": 100}'
+                         b'"0":{'
+                         b'"Province/State":"BC",'
+                         b'"Country/Region":"Canada",'
+                         b'"Lat":49.2827,'
+                         b'"Long":123.1207,'
+                         b'"01/22/20":100,'
+                         b'"01/23/20":100}'
                          b'}')
 
+    def test_export_json_columnar_empty(self):
+        response = gen_response_json_columnar([], [])
+        self.assertEqual(response.getvalue().strip(),
+                         b'{"columns":["Province/State","Country/Region","Lat","Long"],"dates":[],"rows":[]}')
+
     def test_export_json_empty(self):
         response = gen_response_json([], [])
-        self.assertEqual(response.content.strip(), b'{}')
+        self.assertEqual(response.getvalue().strip(), b'{}')
 
 
 class TimeSeriesViewsPostHelpers(TestCase):
@@ -355,6 +1072,46 @@ class TimeSeriesViewsPostHelpers(TestCase):
         row = 'BC, Canada, 49.2827, 123.1207, asfasga, -30'.split(',')
         self.assertEqual(parse_post_row(header, row), None)
 
+    def test_parse_post_rows_valid(self):
+        header = 'Province/State,Country/Region,Lat,Long,1/22/20,1/23/20'.split(',')
+        rows = ['BC, Canada, 49.2827, 123.1207, 100, 100'.split(','),
+                ',Canada,,, 5,-30'.split(',')]
+        parsed = parse_post_rows(header, rows)
+        self.assertEqual(parsed['Province/State'], ['BC', ''])
+        self.assertEqual(parsed['Country/Region'], [' Canada', 'Canada'])
+        self.assertEqual(parsed['Lat'].tolist(), [49.2827, 0.0])
+        self.assertEqual(parsed['Long'].tolist(), [123.1207, 0.0])
+        self.assertEqual(parsed['CASES'].tolist(), [[100, 100], [5, -30]])
+
+    def test_parse_post_rows_matches_parse_post_row(self):
+        # every row rejected by parse_post_row must reject the whole batch
+        header = 'Province/State,Country/Region,Lat,Long,1/22/20,1/23/20'.split(',')
+        valid = 'BC,Canada,49.2827,123.1207,100,100'.split(',')
+        for invalid in ['BC, Canada', 'BC,, 49.2827, 123.1207, 100, 100', 'BC, Canada, 9999, 9999, 100, 100',
+                        'BC, Canada, 49.2827, abc, 100, 100', 'BC, Canada, 49.2827, 123.1207, asfasga, -30',
+                        'BC, Canada, 49.2827, 123.1207, 100,', 'BC, Canada, 49.2827, 123.1207, 100, ',
+                        'BC, Canada, 49.2827, 123.1207, 1.5, 100', 'BC, Canada, 49.2827, 123.1207, 100, -',
+                        'BC, Canada, 49.2827, 123.1207, +, 100']:
+            row = invalid.split(',')
+            self.assertEqual(parse_post_row(header, row), None)
+            self.assertEqual(parse_post_rows(header, [valid, row]), None)
+
+        # and every row it accepts is read the same
+        for accepted in ['BC,Canada,49.2827,123.1207,1_000, 7 ', 'BC,Canada,49.2827,123.1207,+5,-0',
+                         'BC,Canada,49.2827,123.1207,\u0663,7']:
+            row = accepted.split(',')
+            self.assertEqual(parse_post_rows(header, [valid, row])['CASES'].tolist(),
+                             [[100, 100], parse_post_row(header, row)['CASES']])
+
+    def test_parse_post_rows_out_of_range(self):
+        header = 'Province/State,Country/Region,Lat,Long,1/22/20'.split(',')
+        rows = ['BC,Canada,49.2827,123.1207,99999999999'.split(',')]
+        self.assertEqual(parse_post_rows(header, rows), None)
+
+        # reserved for days without a value in array storage
+        rows = ['BC,Canada,49.2827,123.1207,-2147483648'.split(',')]
+        self.assertEqual(parse_post_rows(header, rows), None)
+
     def test_parse_post_params_valid(self):
         timeseries_name = 'abc'
         data_type = 'deaths'
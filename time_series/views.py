@@ -1,11 +1,46 @@
 from io import StringIO
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
-from django.http import JsonResponse
+from django.db import transaction
+from functools import lru_cache
+from itertools import groupby
+from operator import itemgetter
 import csv
-
-from time_series.models import TimeSeries, TimeSeriesData
-from datetime import date, datetime
+import numpy as np
+import orjson
+import pandas as pd
+import pyarrow as pa
+
+from covidAPI.exports import TABLE_FORMATS, dictionary_column, table_response
+from covidAPI.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor, paginate, parse_limit
+from covidAPI.streaming import CorruptUpload, Echo, batched, buffered, csv_reader, decompressed
+from datasets.cache import cache_response
+from datasets.conditional import conditional_get
+from datasets.models import Dataset
+from datasets.deletion import delete_dataset, open_dataset, write_dataset
+from datasets.locations import ensure_locations, resolve_locations
+from datasets.versions import bump_version, is_deleted, request_dataset_id
+from jobs.models import Job
+from jobs.worker import queue_upload
+from time_series.active import ACTIVE_SOURCES, series_by_location, write_active
+from time_series.models import TimeSeries, TimeSeriesArray
+from time_series.rollups import GROUP_BYS, INTERVALS, METRIC_LOOK_BACK, METRICS, bucket_ends, derive, \
+    group_by_country
+from time_series.storage import STORAGES, get_storage
+from datetime import date, datetime, timedelta
+
+# Rows per INSERT ... ON CONFLICT statement
+UPSERT_BATCH_SIZE = 5000
+
+# Bounds of the cases IntegerField, the lowest int32 marks days without a value in packed arrays
+CASES_MIN = TimeSeriesArray.MISSING + 1
+CASES_MAX = 2 ** 31 - 1
+
+# Upload modes of POST, see timeseries_post
+UPLOAD_MODES = ["merge", "append"]
+
+# Order of paginated series, unique per data type within a dataset and indexed through timeseries_natural_key
+PAGE_KEYS = ["location_id"]
 
 
 # TODO Probably need a try catch block when saving to database due to character count or database errors
@@ -32,125 +67,122 @@ def timeseries_post(request, timeseries_name, data_type):
     if params is None:
         return HttpResponse('Malformed request', status=400)
 
-    # Processing body
-    body = request.body.decode('utf-8')
-
-    reader = csv.reader(body.split('\n'), delimiter=',')
-
-    # Array of header titles and date objects
-    parsed_header = parse_post_header(next(reader, None))
-    if parsed_header is None:
+    # merge overwrites stored points with uploaded ones, append only adds points and rejects the upload if any of
+    # them is already stored, so a daily refresh sends and checks one date column
+    params["mode"] = request.GET.get('mode', 'merge')
+    if params["mode"] not in UPLOAD_MODES:
         return HttpResponse('Malformed request', status=400)
 
-    # Array of row data objects
-    parsed_rows = []
-
-    # May be less memory efficient to do it this way but its a lot cleaner
-    for row in reader:
-        parsed_row = parse_post_row(parsed_header, row)
-        if parsed_row is None:
-            return HttpResponse('Malformed request', status=400)
-        parsed_rows.append(parsed_row)
-
-    for row in parsed_rows:
-        # Writing TimeSeries
-        data = {
-            "timeseries_name": params["timeseries_name"],
-            "data_type": params["data_type"],
-            "province_state": row['Province/State'],
-            "country_region": row['Country/Region'],
-            "lat": 49.2827,
-            "long": 123.1207,
-        }
-
-        timeseries_entry, created = TimeSeries.objects.update_or_create(
-            timeseries_name=data["timeseries_name"],
-            data_type=data["data_type"],
-            province_state=data["province_state"],
-            country_region=data["country_region"],
-            defaults=data,
-        )
+    # gzip and zstd bodies are decompressed while they are parsed
+    body = decompressed(request, request.headers.get('Content-Encoding'))
+    if body is None:
+        return HttpResponse('Unsupported content encoding', status=415)
 
-        to_create = []
-        to_update = []
-
-        timeseries_data_entry_all = TimeSeriesData.objects.filter(
-            timeseries=timeseries_entry
-        )
+    try:
+        # Large uploads can be processed in the background, progress is reported under /jobs
+        if request.GET.get('async') == 'true':
+            return queue_upload(body, Job.KindChoice.TIME_SERIES, timeseries_name, params["data_type"],
+                                lambda header: parse_post_header(header) is not None,
+                                lambda stream, progress: ingest_timeseries(stream, params, progress))
+
+        return ingest_timeseries(body, params)
+    except CorruptUpload:
+        return HttpResponse('Malformed request', status=400)
 
-        # Writing TimeSeriesData
-        for index, date in enumerate(parsed_header[4:]):
-            data = {
-                "timeseries": timeseries_entry,
-                "date": date,
-                "cases": row['CASES'][index],
-            }
 
-            # Search for TimeSeriesData by timeseries and date and create it if it does not exist
-            timeseries_data_entry = timeseries_data_entry_all.filter(date=data["date"]).first()
-            if not timeseries_data_entry:
-                timeseries_data_entry = TimeSeriesData(**data)
-                to_create.append(timeseries_data_entry)
-            else:
-                timeseries_data_entry.cases = data["cases"]
-                to_update.append(timeseries_data_entry)
+def ingest_timeseries(stream, params, progress=None):
+    # Processing body as a stream so memory stays flat regardless of upload size
+    reader = csv_reader(stream)
 
-        # Update or Create all TimeSeriesData each iteration. **Tried updating all at once but incremental update still has fastest speed
-        TimeSeriesData.objects.bulk_create(to_create)
-        TimeSeriesData.objects.bulk_update(to_update, ['cases'])
+    # Array of header titles and date objects
+    parsed_header = parse_post_header(next(reader, None))
+    if parsed_header is None:
+        return HttpResponse('Malformed request', status=400)
 
-    return HttpResponse('Upload successful', status=200)
+    # Partitions are created outside the upload transaction, see prepare_dataset
+    return write_dataset(Dataset.KindChoice.TIME_SERIES, params["timeseries_name"], purge_timeseries,
+                         lambda: write_timeseries(reader, parsed_header, params, progress))
 
 
+@conditional_get(Dataset.KindChoice.TIME_SERIES)
+@cache_response(Dataset.KindChoice.TIME_SERIES)
 def timeseries_get(request, timeseries_name, data_type):
     # Getting and verifying parameters
     params = parse_get_params(request, timeseries_name, data_type)
     if params is None:
         return HttpResponse('Malformed request', status=400)
 
-    # Creating query
+    # Every row references its dataset, soft deleted datasets read as empty until their rows are purged
+    dataset_id = request_dataset_id(request, Dataset.KindChoice.TIME_SERIES, timeseries_name)
+    if dataset_id is None or is_deleted(request, Dataset.KindChoice.TIME_SERIES, timeseries_name):
+        return gen_response(params["format"], [], [])
+
+    # Creating query, location filters are resolved to ids once so series are filtered on integers
     query = {
-        "timeseries_name": params["timeseries_name"],
+        "dataset_id": dataset_id,
     }
 
-    if params["countries"] is not None:
-        query["country_region__in"] = params["countries"]
-    if params["regions"] is not None:
-        query["province_state__in"] = params["regions"]
+    location_ids = resolve_locations(params["countries"], params["regions"])
+    if location_ids is not None:
+        query["location__in"] = location_ids
 
-    if params["data_type"] is not None:
-        query["data_type"] = params["data_type"]
-        timeseries_list = TimeSeries.objects.filter(**query)
+    # Pages hold a range of locations, the cursor of the next one is sent in a header
+    cursor = None
+    if params["limit"] is not None:
+        cursor = paginate_locations(query, params)
 
-        if timeseries_list:
-            timeseriesdata_list = TimeSeriesData.objects.filter(
-                timeseries__in=timeseries_list,
-                date__range=[params["start_date"],
-                             params["end_date"]])
-            if params["format"] == "json":
-                return gen_response_json(timeseries_list, timeseriesdata_list)
-            return gen_response_csv(timeseries_list, timeseriesdata_list)
+    query["data_type"] = params["data_type"]
+    timeseries_list = TimeSeries.objects.filter(**query).select_related('location').order_by('id')
 
-    else:
-        # This block is specifically for calculating active cases
-        response = calculate_active(query, params)
-        if response:
-            return response
+    # Metrics looking back from start_date read the days before it too
+    start_date = params["start_date"]
+    if params["metric"] != "cases" and start_date != date.min:
+        try:
+            start_date = start_date - timedelta(days=METRIC_LOOK_BACK[params["metric"]])
+        except OverflowError:
+            start_date = date.min
+
+    # Active series hold a negative point where confirmed and deaths do not match, which voids the whole read
+    if params["data_type"] == TimeSeries.TypeChoice.ACTIVE and get_storage().negative(
+            dataset_id, timeseries_list, start_date, params["end_date"]):
+        timeseries_list = []
+
+    if timeseries_list:
+        # Points as (timeseries_id, date, cases) so serializing does not load model instances, weeks and months are
+        # read on their last date only
+        select = bucket_ends(params["interval"]) if params["interval"] != "day" else None
+        if params["group_by"] == "country":
+            # Rows are summed into one per country by the storage, the response then scales with the number of
+            # countries
+            dates, sums = get_storage().sum_by_country(dataset_id, timeseries_list, start_date, params["end_date"],
+                                                       select)
+            dates = list(dates)
+            timeseries_list, timeseriesdata_list = group_by_country(timeseries_list, dates, sums)
+        else:
+            dates, timeseriesdata_list = get_storage().read(dataset_id, timeseries_list, start_date,
+                                                            params["end_date"], select)
+
+        # Derived from the cumulative cases of each row, summed ones included
+        if params["metric"] != "cases":
+            dates, timeseriesdata_list = derive(params["metric"], dates, timeseriesdata_list, params["start_date"])
+
+        # The CSV header and the columnar dates need every date before the first row is sent
+        response = gen_response(params["format"], timeseries_list, timeseriesdata_list, dates,
+                                pa.int32() if params["metric"] in ["cases", "new"] else pa.float64())
+        if cursor is not None:
+            response[NEXT_CURSOR_HEADER] = cursor
+        return response
 
     # return empty arrays if data not available
-    if params["format"] == "json":
-        return gen_response_json([], [])
-    return gen_response_csv([], [])
+    return gen_response(params["format"], [], [])
 
 
 def timeseries_delete(request, timeseries_name):
-    # Getting associated data entries
-    timeseries_entries = TimeSeries.objects.filter(
-        timeseries_name=timeseries_name)
-
     # Deleting entries
-    if timeseries_entries:
-        timeseries_entries.delete()
+    if delete_dataset(Dataset.KindChoice.TIME_SERIES, timeseries_name,
+                      lambda name: TimeSeries.objects.filter(dataset__kind=Dataset.KindChoice.TIME_SERIES,
+                                                             dataset__name=name).exists(),
+                      purge_timeseries):
         return HttpResponse('Successfully deleted', status=200)
 
     return HttpResponse('Timeseries not found', status=404)
@@ -158,9 +190,114 @@ def timeseries_delete(request, timeseries_name):
 
 # **************************************************************************************************** HELPER FUNCTIONS
 
+def write_timeseries(reader, parsed_header, params, progress):
+    dates = parsed_header[4:]
+
+    # Rows are flushed in batches of roughly UPSERT_BATCH_SIZE data points, any bad row rolls back the whole upload
+    with transaction.atomic():
+        dataset_id = open_dataset(Dataset.KindChoice.TIME_SERIES, params["timeseries_name"], purge_timeseries)
+
+        with get_storage().writer(dataset_id) as write:
+            for rows in batched(reader, max(1, UPSERT_BATCH_SIZE // len(dates))):
+                parsed_rows = parse_post_rows(parsed_header, rows)
+                if parsed_rows is None:
+                    transaction.set_rollback(True)
+                    return HttpResponse('Malformed request', status=400)
+
+                if not upsert_timeseries(params, dates, parsed_rows, dataset_id, write):
+                    transaction.set_rollback(True)
+                    return HttpResponse('Dates already uploaded', status=409)
+
+                if progress:
+                    progress(len(rows))
+
+        bump_version(Dataset.KindChoice.TIME_SERIES, params["timeseries_name"])
+
+    return HttpResponse('Upload successful', status=200)
+
+
+def purge_timeseries(timeseries_name):
+    # Set-based deletes with the cascade done by hand, QuerySet.delete() would load every related row first
+    dataset_id = Dataset.objects.filter(kind=Dataset.KindChoice.TIME_SERIES, name=timeseries_name).values_list(
+        'id', flat=True).first()
+    if dataset_id is None:
+        return 0
+
+    timeseries_entries = TimeSeries.objects.filter(dataset_id=dataset_id)
+    for storage in STORAGES.values():
+        storage.delete(dataset_id, timeseries_entries)
+    return timeseries_entries._raw_delete(timeseries_entries.db)
+
+
+def upsert_timeseries(params, dates, parsed_rows, dataset_id, write=None):
+    # Later rows and columns win on duplicates, ON CONFLICT cannot touch a row twice in one statement.
+    # False without writing any point when appending to dates already stored for one of the series
+    rows = {}
+    for province_state, country_region, cases in zip(parsed_rows['Province/State'],
+                                                     parsed_rows['Country/Region'],
+                                                     parsed_rows['CASES'].tolist()):
+        rows[(province_state, country_region)] = dict(zip(dates, cases))
+
+    with transaction.atomic():
+        # Location ids of the batch, new locations are created
+        location_ids = ensure_locations((country_region, province_state, '', '')
+                                        for province_state, country_region in rows)
+        location_ids = {
+            (province_state, country_region): location_ids[(country_region, province_state, '', '')]
+            for province_state, country_region in rows
+        }
+
+        # Confirmed and deaths uploads also keep the active series of their locations up to date
+        data_types = [params["data_type"]]
+        other_type = ACTIVE_SOURCES.get(params["data_type"])
+        if other_type is not None:
+            data_types.append(TimeSeries.TypeChoice.ACTIVE)
+
+        # Writing TimeSeries, one INSERT ... ON CONFLICT DO UPDATE per batch
+        TimeSeries.objects.bulk_create(
+            [TimeSeries(dataset_id=dataset_id,
+                        data_type=data_type,
+                        location_id=location_id,
+                        lat=49.2827,
+                        long=123.1207)
+             for data_type in data_types
+             for location_id in location_ids.values()],
+            batch_size=UPSERT_BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=['dataset', 'data_type', 'location'],
+            update_fields=['lat', 'long'],
+        )
+
+        # bulk_create does not return ids on conflict so they are fetched in one query
+        series = series_by_location(dataset_id, list(location_ids.values()),
+                                    data_types + ([other_type] if other_type is not None else []))
+        timeseries_ids = {key: series[params["data_type"]][location_id] for key, location_id in location_ids.items()}
+
+        # Appended points must be new, checked on the uploaded series and dates only
+        if params.get("mode") == "append" and get_storage().overlaps(dataset_id, list(timeseries_ids.values()),
+                                                                     dates):
+            return False
+
+        # Writing cases in the configured storage layout, through the writer of the upload when there is one
+        if write is None:
+            get_storage().write(dataset_id, timeseries_ids, rows)
+        else:
+            write(timeseries_ids, rows)
+
+        # Active points of the uploaded dates, paired with the stored cases of the other type
+        if other_type is not None:
+            write_active(dataset_id, params["data_type"], rows,
+                         {key: series[other_type][location_id] for key, location_id in location_ids.items()
+                          if location_id in series[other_type]},
+                         {key: series[TimeSeries.TypeChoice.ACTIVE][location_id]
+                          for key, location_id in location_ids.items()},
+                         write)
+    return True
+
+
 def parse_post_header(header):
     # Not enough columns
-    if len(header) < 5:
+    if header is None or len(header) < 5:
         return None
 
     # Invalid columns headers
@@ -173,16 +310,12 @@ def parse_post_header(header):
     if header[3] != 'Long':
         return None
 
-    # Invalid column dates
-    dates = []
-    for date in header[4:]:
-        try:
-            date_obj = datetime.strptime(date, "%m/%d/%y")
-            dates.append(date_obj)
-        except ValueError:
-            return None
+    # Invalid column dates, parsed in one vectorized call
+    dates = pd.to_datetime(header[4:], format="%m/%d/%y", errors='coerce')
+    if dates.hasnans:
+        return None
 
-    return header[:4] + dates
+    return header[:4] + list(dates.to_pydatetime())
 
 
 def parse_post_row(header, row):
@@ -225,6 +358,52 @@ def parse_post_row(header, row):
     return params
 
 
+def parse_post_rows(header, rows):
+    # Vectorized equivalent of parse_post_row over a batch of rows, returns columns instead of one dict per row
+
+    # Not enough columns
+    for row in rows:
+        if len(row) != len(header):
+            return None
+
+    params = {
+        'Province/State': [row[0] for row in rows],
+        'Country/Region': [row[1] for row in rows],
+        'Lat': np.array(['0.0' if row[2] == '' else row[2] for row in rows]),
+        'Long': np.array(['0.0' if row[3] == '' else row[3] for row in rows]),
+        'CASES': None,
+    }
+
+    # Country cannot be empty
+    if '' in params['Country/Region']:
+        return None
+
+    # Latitude or longitude must be floats and within valid bounds
+    try:
+        params['Lat'] = params['Lat'].astype(np.float64)
+        params['Long'] = params['Long'].astype(np.float64)
+    except ValueError:
+        return None
+
+    if ((params['Lat'] < -90) | (params['Lat'] > 90) | (params['Long'] < -180) | (params['Long'] > 180)).any():
+        return None
+
+    # Cases must be integers, numpy converts each cell like int() so the same cells are rejected, blank ones and lone
+    # signs included. Values beyond int64 overflow
+    try:
+        cases = np.array([row[4:] for row in rows], dtype=np.int64).reshape(len(rows), len(header) - 4)
+    except (ValueError, OverflowError):
+        return None
+
+    # Out of the cases column bounds
+    if ((cases < CASES_MIN) | (cases > CASES_MAX)).any():
+        return None
+
+    params['CASES'] = cases
+
+    return params
+
+
 def parse_post_params(timeseries_name, data_type):
     params = {
         "timeseries_name": None,
@@ -257,6 +436,11 @@ def parse_get_params(request, timeseries_name, data_type):
         "start_date": None,
         "end_date": None,
         "format": None,
+        "limit": None,
+        "after": None,
+        "group_by": None,
+        "interval": None,
+        "metric": None,
     }
 
     # timeseries_name
@@ -269,8 +453,7 @@ def parse_get_params(request, timeseries_name, data_type):
     if data_type:
         if data_type.upper() not in ["DEATHS", "CONFIRMED", "RECOVERED", "ACTIVE"]:
             return None
-        if data_type.upper() != "ACTIVE":
-            params["data_type"] = TimeSeries.TypeChoice[data_type.upper()]
+        params["data_type"] = TimeSeries.TypeChoice[data_type.upper()]
     else:
         return None
 
@@ -302,128 +485,181 @@ def parse_get_params(request, timeseries_name, data_type):
 
     # format
     if 'format' in request.GET:
-        if request.GET['format'] not in ["csv", "json"]:
+        if request.GET['format'] not in ["csv", "json", "json-columnar"] + list(TABLE_FORMATS):
             return None
         params["format"] = request.GET['format']
     else:
         params["format"] = 'csv'
 
-    return params
+    # limit
+    if 'limit' in request.GET:
+        params["limit"] = parse_limit(request.GET['limit'])
+        if params["limit"] is None:
+            return None
 
+    # after, a cursor continuing a paginated query
+    if 'after' in request.GET:
+        params["after"] = decode_cursor(request.GET['after'], TimeSeries, PAGE_KEYS)
+        if params["after"] is None or params["limit"] is None:
+            return None
 
-def gen_response_json(timeseries_list, timeseriesdata_list):
-    # response = JsonResponse({'foo': 'bar'})
+    # group_by, pages hold a range of locations and would split the rows of a country
+    if 'group_by' in request.GET:
+        if request.GET['group_by'] not in GROUP_BYS or params["limit"] is not None:
+            return None
+        params["group_by"] = request.GET['group_by']
 
-    data = {}
+    # interval
+    params["interval"] = request.GET.get('interval', 'day')
+    if params["interval"] not in INTERVALS:
+        return None
 
-    for index, timeseries in enumerate(timeseries_list):
-        row = {
-            "Province/State": timeseries.province_state,
-            "Country/Region": timeseries.country_region,
-            "Lat": timeseries.lat,
-            "Long": timeseries.long,
-        }
+    # metric, computed over daily values so only without an interval
+    params["metric"] = request.GET.get('metric', 'cases')
+    if params["metric"] not in METRICS or (params["metric"] != "cases" and params["interval"] != "day"):
+        return None
 
-        for timeseriesdata in timeseriesdata_list:
-            if timeseriesdata.timeseries == timeseries:
-                date = timeseriesdata.date.strftime("%m/%d/%y")
-                cases = timeseriesdata.cases
-                row[date] = cases
+    return params
 
-        data[index] = row
 
-    return JsonResponse(data)
+def paginate_locations(query, params):
+    # Narrows query to the locations of one page, returns the cursor of the next page, None on the last one
+    if params["after"] is not None:
+        query["location__gt"] = params["after"][0]
 
+    _, last = paginate(TimeSeries.objects.filter(**query, data_type=params["data_type"]), PAGE_KEYS, params["limit"])
+    if last is None:
+        return None
 
-def gen_response_csv(timeseries_list, timeseriesdata_list):
-    # https://docs.djangoproject.com/en/4.0/ref/models/querysets/
-    # https://docs.djangoproject.com/en/4.0/howto/outputting-csv/
-    response = HttpResponse(content_type='application/csv')
+    query["location__lte"] = last[0]
+    return encode_cursor(last)
 
-    dates = []
-    for timeseriesdata in timeseriesdata_list:
-        date_obj = timeseriesdata.date
-        date_str = date_obj.strftime("%m/%d/%y")
-        if date_str not in dates:
-            dates.append(date_str)
 
-    writer = csv.writer(response)
-    writer.writerow(
-        ['Province/State', 'Country/Region', 'Lat', 'Long'] + dates)
+def group_cases(timeseries_list, timeseriesdata_list):
+    # Pairs each series with its {date: cases} in one pass, both inputs must be ordered by timeseries id
+    points = groupby(timeseriesdata_list, key=itemgetter(0))
+    timeseries_id, group = next(points, (None, None))
 
     for timeseries in timeseries_list:
-        prefix = [
-            timeseries.province_state,
-            timeseries.country_region,
-            timeseries.lat,
-            timeseries.long,
-        ]
-
-        cases = []
-        for timeseriesdata in timeseriesdata_list:
-            if timeseriesdata.timeseries == timeseries:
-                cases.append(timeseriesdata.cases)
-
-        writer.writerow(prefix + cases)
-
-    return response
-
-
-def calculate_active(query, params):
-    # getting row prefix
-    timeseries_list_confirmed = TimeSeries.objects.filter(
-        **query,
-        data_type=TimeSeries.TypeChoice["confirmed".upper()])
-    timeseries_list_deaths = TimeSeries.objects.filter(
-        **query,
-        data_type=TimeSeries.TypeChoice["deaths".upper()])
-
-    # datasets must exist
-    if not timeseries_list_confirmed or not timeseries_list_deaths:
-        return None
+        while timeseries_id is not None and timeseries_id < timeseries.id:
+            timeseries_id, group = next(points, (None, None))
 
-    # datasets must match
-    if timeseries_list_confirmed.count() != timeseries_list_deaths.count():
-        return None
+        cases = {}
+        if timeseries_id == timeseries.id:
+            cases = {date: point_cases for _, date, point_cases in group}
+        yield timeseries, cases
 
-    for entry in timeseries_list_confirmed:
-        if not timeseries_list_deaths.filter(
-                timeseries_name=entry.timeseries_name,
-                province_state=entry.province_state,
-                country_region=entry.country_region,
-                lat=entry.lat,
-                long=entry.long):
-            return None
 
-    # getting row suffix
-    timeseriesdata_list_confirmed = TimeSeriesData.objects.filter(
-        timeseries__in=timeseries_list_confirmed,
-        date__range=[params["start_date"], params["end_date"]])
-    timeseriesdata_list_deaths = TimeSeriesData.objects.filter(
-        timeseries__in=timeseries_list_deaths,
-        date__range=[params["start_date"], params["end_date"]])
+@lru_cache(maxsize=4096)
+def date_label(date):
+    # Column name of a date, every location repeats the same few
+    return date.strftime("%m/%d/%y")
 
-    # datasets must exist
-    if not timeseriesdata_list_confirmed or not timeseriesdata_list_deaths:
-        return None
 
-    # datasets must match
-    if timeseriesdata_list_confirmed.count() != timeseriesdata_list_deaths.count():
-        return None
+def gen_response(format, timeseries_list, timeseriesdata_list, dates=None, cases_type=pa.int32()):
+    # dates are computed from the points when not given, cases_type is the arrow type of their cases
+    if format == "json":
+        return gen_response_json(timeseries_list, timeseriesdata_list)
+    if format == "json-columnar":
+        return gen_response_json_columnar(timeseries_list, timeseriesdata_list, dates)
+    if format in TABLE_FORMATS:
+        return gen_response_table(format, timeseries_list, timeseriesdata_list, cases_type)
+    return gen_response_csv(timeseries_list, timeseriesdata_list, dates)
 
-    for confirmed in timeseriesdata_list_confirmed:
-        death = timeseriesdata_list_deaths.filter(date=confirmed.date).first()
-        if not death:
-            return None
 
-        # calculating active cases
-        confirmed.cases = confirmed.cases - death.cases
+def gen_response_json(timeseries_list, timeseriesdata_list):
+    # Streams the same document orjson would build, one location at a time
+    def fragments():
+        yield '{'
+        for index, (timeseries, cases) in enumerate(group_cases(timeseries_list, timeseriesdata_list)):
+            row = {
+                "Province/State": timeseries.location.province_state,
+                "Country/Region": timeseries.location.country_region,
+                "Lat": timeseries.lat,
+                "Long": timeseries.long,
+            }
 
-        # value must be > 0
-        if confirmed.cases < 0:
-            return None
+            for day in sorted(cases):
+                row[date_label(day)] = cases[day]
+
+            yield '{}"{}":{}'.format(',' if index else '', index, orjson.dumps(row).decode())
+        yield '}'
+
+    return StreamingHttpResponse(buffered(fragments()), content_type='application/json')
+
+
+def gen_response_json_columnar(timeseries_list, timeseriesdata_list, dates=None):
+    # Column names and dates are sent once, then one array per location holding its columns followed by its cases
+    # on each date, null where it has none
+    if dates is None:
+        timeseriesdata_list = list(timeseriesdata_list)
+        dates = {date for _, date, _ in timeseriesdata_list}
+    dates = sorted(dates)
+
+    def fragments():
+        yield '{{"columns":{},"dates":{},"rows":['.format(
+            orjson.dumps(['Province/State', 'Country/Region', 'Lat', 'Long']).decode(),
+            orjson.dumps([date_label(date) for date in dates]).decode())
+
+        for index, (timeseries, cases) in enumerate(group_cases(timeseries_list, timeseriesdata_list)):
+            row = [
+                timeseries.location.province_state,
+                timeseries.location.country_region,
+                timeseries.lat,
+                timeseries.long,
+            ]
+            yield (',' if index else '') + orjson.dumps(row + [cases.get(date) for date in dates]).decode()
+        yield ']}'
+
+    return StreamingHttpResponse(buffered(fragments()), content_type='application/json')
+
+
+def gen_response_table(format, timeseries_list, timeseriesdata_list, cases_type=pa.int32()):
+    # One row per location and date built column by column from the points, locations are dictionary encoded
+    timeseries_list = list(timeseries_list)
+    points = list(timeseriesdata_list)
+    timeseries_ids, dates, cases = zip(*points) if points else ((), (), ())
+
+    # Position of each point's series, timeseries_list is ordered by id
+    positions = np.searchsorted(np.array([timeseries.id for timeseries in timeseries_list], dtype=np.int64),
+                                np.array(timeseries_ids, dtype=np.int64))
+
+    table = pa.table({
+        'Province/State': dictionary_column(positions, [timeseries.location.province_state
+                                                        for timeseries in timeseries_list]),
+        'Country/Region': dictionary_column(positions, [timeseries.location.country_region
+                                                        for timeseries in timeseries_list]),
+        'Lat': pa.array(np.array([timeseries.lat for timeseries in timeseries_list], dtype=np.float64)[positions]),
+        'Long': pa.array(np.array([timeseries.long for timeseries in timeseries_list], dtype=np.float64)[positions]),
+        'Date': pa.array(dates, type=pa.date32()),
+        'Cases': pa.array(cases, type=cases_type),
+    })
+    return table_response(format, table)
+
+
+def gen_response_csv(timeseries_list, timeseriesdata_list, dates=None):
+    # https://docs.djangoproject.com/en/4.0/ref/models/querysets/
+    # https://docs.djangoproject.com/en/4.0/howto/outputting-csv/
+    if dates is None:
+        timeseriesdata_list = list(timeseriesdata_list)
+        dates = {date for _, date, _ in timeseriesdata_list}
+    dates = sorted(dates)
+
+    writer = csv.writer(Echo())
+
+    def fragments():
+        yield writer.writerow(
+            ['Province/State', 'Country/Region', 'Lat', 'Long'] + [date_label(date) for date in dates])
+
+        for timeseries, cases in group_cases(timeseries_list, timeseriesdata_list):
+            prefix = [
+                timeseries.location.province_state,
+                timeseries.location.country_region,
+                timeseries.lat,
+                timeseries.long,
+            ]
+
+            # Dates missing for this location are left empty so columns stay aligned
+            yield writer.writerow(prefix + [cases.get(date, '') for date in dates])
 
-    # generating response
-    if params["format"] == "json":
-        return gen_response_json(timeseries_list_confirmed, timeseriesdata_list_confirmed)
-    return gen_response_csv(timeseries_list_confirmed, timeseriesdata_list_confirmed)
+    return StreamingHttpResponse(buffered(fragments()), content_type='application/csv')